@@ -0,0 +1,81 @@
+import random
+import uuid
+
+from tests.models import LEA, School, Teacher, Subject, Class, Student, Assignment, AssignmentStudent
+
+SCHOOLS_PER_LEA = 4
+TEACHERS_PER_SCHOOL = 5
+CLASSES_PER_TEACHER = 3
+STUDENTS_PER_SCHOOL = 60
+CLASSES_PER_STUDENT = 3
+ASSIGNMENTS_PER_CLASS = 4
+SUBJECTS = ['Maths', 'English', 'Science', 'French', 'History', 'Art']
+
+
+def make_id(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def build_dataset(scale=1, seed=0):
+    """
+    Create a school schema dataset whose row counts grow linearly with `scale`:
+    each LEA has SCHOOLS_PER_LEA schools, and everything beneath them is a fixed size
+    """
+    rng = random.Random(seed)
+
+    subjects = Subject.objects.bulk_create(Subject(id=make_id(rng), name=name) for name in SUBJECTS)
+    leas = LEA.objects.bulk_create(LEA(id=make_id(rng), name='LEA %d' % idx) for idx in range(scale))
+    schools = School.objects.bulk_create(
+        School(id=make_id(rng), name='School %d-%d' % (lea_idx, idx), lea=lea)
+        for lea_idx, lea in enumerate(leas) for idx in range(SCHOOLS_PER_LEA)
+    )
+    teachers = Teacher.objects.bulk_create(
+        Teacher(id=make_id(rng), name='Teacher %s %d' % (school.name, idx), school=school)
+        for school in schools for idx in range(TEACHERS_PER_SCHOOL)
+    )
+    classes = Class.objects.bulk_create(
+        Class(id=make_id(rng), name='Class %s %d' % (teacher.name, idx), teacher=teacher, subject=rng.choice(subjects))
+        for teacher in teachers for idx in range(CLASSES_PER_TEACHER)
+    )
+    assignments = Assignment.objects.bulk_create(
+        Assignment(id=make_id(rng), name='Assignment %s %d' % (clasz.name, idx), clasz=clasz)
+        for clasz in classes for idx in range(ASSIGNMENTS_PER_CLASS)
+    )
+    students = Student.objects.bulk_create(
+        Student(id=make_id(rng), name='Student %s %d' % (school.name, idx), school=school)
+        for school in schools for idx in range(STUDENTS_PER_SCHOOL)
+    )
+
+    classes_by_school = {}  # type: dict
+    for clasz in classes:
+        classes_by_school.setdefault(clasz.teacher.school_id, []).append(clasz)
+    assignments_by_class = {}  # type: dict
+    for assignment in assignments:
+        assignments_by_class.setdefault(assignment.clasz_id, []).append(assignment)
+
+    student_classes = []
+    assignment_students = []
+    for student in students:
+        for clasz in rng.sample(classes_by_school[student.school_id], CLASSES_PER_STUDENT):
+            student_classes.append(Student.classes.through(student_id=student.id, class_id=clasz.id))
+            assignment_students += [
+                AssignmentStudent(id=make_id(rng), assignment=assignment, student=student, is_complete=rng.random() < 0.5)
+                for assignment in assignments_by_class[clasz.id]
+            ]
+    Student.classes.through.objects.bulk_create(student_classes)
+    AssignmentStudent.objects.bulk_create(assignment_students)
+
+    return {
+        'leas': len(leas),
+        'schools': len(schools),
+        'teachers': len(teachers),
+        'classes': len(classes),
+        'students': len(students),
+        'assignments': len(assignments),
+        'assignment_students': len(assignment_students),
+    }
+
+
+def clear_dataset():
+    for model in [AssignmentStudent, Student.classes.through, Student, Assignment, Class, Teacher, Subject, School, LEA]:
+        model.objects.all().delete()
@@ -0,0 +1,242 @@
+"""
+Benchmark the serialization spec views over synthetic school datasets of increasing size.
+
+    python -m benchmarks.run --scale 1 2 4 --repeat 5 --output results.json
+
+For each scale a fresh in-memory SQLite dataset is built (see `benchmarks.dataset`), then every
+scenario is run: each view in `tests/views.py`, plus synthetic specs of increasing nesting depth
+and width. Each scenario reports its number of queries, the median wall time of the plan, fetch,
+serialize and render stages, and peak memory (measured in a separate, traced run). The time to
+serialize and render in one step with `SpecJSONRenderer` is reported as `direct_render`, outside
+the total.
+"""
+from time import perf_counter
+import argparse
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import tracemalloc
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+    import django
+    django.setup()
+
+
+def make_view(view_class, kwargs):
+    from rest_framework.test import APIRequestFactory
+
+    view = view_class()
+    request = APIRequestFactory().get('/')
+    view.setup(request, **kwargs)
+    view.request = view.initialize_request(request)
+    view.format_kwarg = None
+    return view
+
+
+def run_stages(view_class, kwargs, detail):
+    from rest_framework.renderers import JSONRenderer
+    from serialization_spec.rendering import EncodedSerializer, SpecJSONRenderer, compile_encoder
+
+    view = make_view(view_class, kwargs)
+    timings = {}
+
+    start = perf_counter()
+    if detail:
+        view.use_select_related = True
+    queryset = view.filter_queryset(view.get_queryset())
+    timings['plan'] = perf_counter() - start
+
+    start = perf_counter()
+    if detail:
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        instance = queryset.get(**{view.lookup_field: kwargs[lookup_url_kwarg]})
+    else:
+        instance = list(queryset)
+    timings['fetch'] = perf_counter() - start
+
+    start = perf_counter()
+    data = view.get_serializer(instance, many=not detail).data
+    timings['serialize'] = perf_counter() - start
+
+    start = perf_counter()
+    content = JSONRenderer().render(data)
+    timings['render'] = perf_counter() - start
+
+    timings['total'] = sum(timings.values())
+
+    # serializing and rendering in one step, straight to bytes, for comparison with the two above
+    start = perf_counter()
+    direct_content = SpecJSONRenderer().render(
+        EncodedSerializer(compile_encoder(view.queryset.model, view.serialization_spec), instance, many=not detail).data
+    )
+    timings['direct_render'] = perf_counter() - start
+    assert direct_content == content
+    return timings, len(instance) if not detail else 1, len(content)
+
+
+def clear_caches():
+    from serialization_spec import rendering, serialization
+    serialization.invalidate_compiled_specs()
+    serialization.bound_spec_cache.clear()
+    serialization.serializer_class_cache.clear()
+    serialization.compiled_serializer_cache.clear()
+    rendering.encoder_cache.clear()
+
+
+def measure(scenario, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    view_class, kwargs, detail = scenario['view_class'], scenario['kwargs'], scenario['detail']
+
+    clear_caches()
+    with CaptureQueriesContext(connection) as capture:
+        cold, rows, size = run_stages(view_class, kwargs, detail)
+
+    runs = [run_stages(view_class, kwargs, detail)[0] for _ in range(repeat)]
+
+    tracemalloc.start()
+    run_stages(view_class, kwargs, detail)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'scenario': scenario['name'],
+        'depth': scenario.get('depth'),
+        'width': scenario.get('width'),
+        'rows': rows,
+        'bytes': size,
+        'queries': len(capture.captured_queries),
+        'cold_plan': cold['plan'],
+        'timings': {stage: statistics.median(run[stage] for run in runs) for stage in runs[0]},
+        'peak_memory_kb': peak // 1024,
+    }
+
+
+DEPTH_CHAIN = ['school_set', 'teacher_set', 'class_set', 'student_set', 'assignments']
+
+
+def deep_spec(depth):
+    spec = ['id', 'name']  # type: list
+    for relation in reversed(DEPTH_CHAIN[:depth]):
+        spec = ['id', 'name', {relation: spec}]
+    return spec
+
+
+def wide_spec(width):
+    from serialization_spec.plugins import CountOf, Exists
+
+    items = [
+        'id',
+        'name',
+        {'teacher': ['id', 'name']},
+        {'subject': ['id', 'name']},
+        {'student_set': ['id', 'name']},
+        {'assignment_set': ['id', 'name']},
+        {'num_students': CountOf('student')},
+        {'has_assignments': Exists('assignment')},
+        'created',
+        'modified',
+        {'teacher': [{'school': ['id', 'name']}]},
+        'student_set',
+    ]
+    return items[:width]
+
+
+def list_view(model, spec):
+    from rest_framework import generics
+    from serialization_spec.serialization import SerializationSpecMixin
+
+    return type('%sBenchmarkView' % model.__name__, (SerializationSpecMixin, generics.ListAPIView), {
+        'queryset': model.objects.all(),
+        'serialization_spec': spec,
+        'pagination_class': None,
+    })
+
+
+def get_scenarios():
+    from rest_framework import generics
+    from serialization_spec.serialization import SerializationSpecMixin
+    from tests import views
+    from tests.models import LEA, Class
+
+    scenarios = []
+    for name, view_class in inspect.getmembers(views, inspect.isclass):
+        if not issubclass(view_class, SerializationSpecMixin) or view_class.serialization_spec is None:
+            continue
+        if issubclass(view_class, generics.RetrieveAPIView):
+            instance = view_class.queryset.order_by('pk').first()
+            scenarios.append({'name': name, 'view_class': view_class, 'kwargs': {view_class.lookup_field: str(instance.pk)}, 'detail': True})
+        else:
+            unpaginated = type(name, (view_class,), {'pagination_class': None})
+            scenarios.append({'name': name, 'view_class': unpaginated, 'kwargs': {}, 'detail': False})
+
+    for depth in range(1, len(DEPTH_CHAIN) + 1):
+        scenarios.append({'name': 'deep', 'depth': depth, 'view_class': list_view(LEA, deep_spec(depth)), 'kwargs': {}, 'detail': False})
+
+    for width in range(2, len(wide_spec(100)) + 1, 2):
+        scenarios.append({'name': 'wide', 'width': width, 'view_class': list_view(Class, wide_spec(width)), 'kwargs': {}, 'detail': False})
+
+    return scenarios
+
+
+def run(scales, repeat=5, only=None):
+    from django.db import transaction
+    from benchmarks.dataset import build_dataset, clear_dataset
+
+    results = []
+    for scale in scales:
+        with transaction.atomic():
+            counts = build_dataset(scale)
+        for scenario in get_scenarios():
+            if only and only not in scenario['name']:
+                continue
+            result = measure(scenario, repeat)
+            result['scale'] = scale
+            result['dataset'] = counts
+            results.append(result)
+        clear_dataset()
+    return results
+
+
+def get_meta():
+    import django
+    import rest_framework
+    import serialization_spec
+
+    return {
+        'serialization_spec': serialization_spec.__version__,
+        'django': django.get_version(),
+        'djangorestframework': rest_framework.VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--scale', type=int, nargs='+', default=[1], help='dataset sizes, in LEAs of %d schools' % 4)
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per scenario, the median is reported')
+    parser.add_argument('--only', help='only run scenarios whose name contains this')
+    parser.add_argument('--output', help='write JSON results here rather than to stdout')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+    output = json.dumps({'meta': get_meta(), 'results': run(args.scale, args.repeat, args.only)}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,7 @@
+import django
+
 __version__ = '0.0.7'
+
+if django.VERSION < (3, 2):
+    # found by Django itself from 3.2, which warns if it is given
+    default_app_config = 'serialization_spec.apps.SerializationSpecConfig'
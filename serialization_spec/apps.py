@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class SerializationSpecConfig(AppConfig):
+    name = 'serialization_spec'
+    verbose_name = 'Serialization spec'
+
+    def ready(self):
+        from .checks import warm_up_views  # noqa: registers the system check
+        from .relations import build_model_indexes
+        build_model_indexes()
+        if getattr(settings, 'SERIALIZATION_SPEC_WARM_UP', False):
+            warm_up_views()
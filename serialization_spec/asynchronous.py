@@ -0,0 +1,158 @@
+"""
+Serve spec views from async code under ASGI.
+
+DRF's `APIView.dispatch()` is synchronous, so `AsyncSerializationSpecMixin` provides its own:
+authentication, permissions and throttling run on Django's sync thread, as they may query the
+database, while the spec's root query and each prefetch level are awaited through Django's async
+ORM where it has one (async iteration from Django 4.1, `aprefetch_related_objects()` from 5.0),
+falling back to `sync_to_async()` on older versions. Serialization, which makes no queries, and
+rendering run on a worker thread so the event loop is not blocked while they do.
+
+A view with `max_queries` set fetches through the sync path on Django's sync thread instead, as that
+is where its queries are made, and so where they can be counted.
+"""
+from functools import wraps
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db.models import QuerySet, prefetch_related_objects
+from django.http import Http404
+from rest_framework.response import Response
+
+from .identity import using_identity_map
+from .serialization import SerializationSpecMixin, prefetch_plugins
+
+try:
+    from django.db.models.query import aprefetch_related_objects  # type: ignore
+except ImportError:  # Django < 5.0
+    aprefetch_related_objects = sync_to_async(prefetch_related_objects)
+
+
+async def alist(queryset):
+    if hasattr(queryset, '__aiter__'):  # Django >= 4.1
+        return [each async for each in queryset]
+    return await sync_to_async(list)(queryset)
+
+
+async def aget(queryset, **kwargs):
+    if hasattr(queryset, 'aget'):  # Django >= 4.1
+        return await queryset.aget(**kwargs)
+    return await sync_to_async(queryset.get)(**kwargs)
+
+
+class AsyncSerializationSpecMixin(SerializationSpecMixin):
+    """
+    An async `SerializationSpecMixin`, for use with `ListAPIView` and `RetrieveAPIView`.
+    Only GET requests are handled asynchronously; other handlers are run on Django's sync thread.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        @wraps(view)
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        return async_view
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        with self.binding_request_user():
+            try:
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+
+                if request.method.lower() in self.http_method_names:
+                    handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+                else:
+                    handler = self.http_method_not_allowed
+
+                if request.method == 'GET':
+                    response = handler(request, *args, **kwargs)
+                    if inspect.isawaitable(response):
+                        response = await response
+                else:
+                    response = await sync_to_async(handler)(request, *args, **kwargs)
+
+            except Exception as exc:
+                response = self.handle_exception(exc)
+
+            self.response = await sync_to_async(self.finalize_and_render, thread_sensitive=False)(request, response, *args, **kwargs)
+            return self.response
+
+    def finalize_and_render(self, request, response, *args, **kwargs):
+        response = self.finalize_response(request, response, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        return response
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if queryset._prefetch_related_lookups:
+            # awaited in `afetch_instances()` once the root instances have been fetched
+            self.deferred_prefetches = queryset._prefetch_related_lookups
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+    async def aget_object(self):
+        self.use_select_related = True
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+
+        try:
+            with self.timer.stage('fetch'), using_identity_map(self.identity_map):
+                instance = await aget(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+
+        await sync_to_async(self.check_object_permissions)(self.request, instance)
+        return instance
+
+    async def afetch_instances(self, instance, many):
+        if self.max_queries is not None:
+            return await sync_to_async(SerializationSpecMixin.fetch_instances)(self, instance, many)
+
+        with using_identity_map(self.identity_map):
+            if isinstance(instance, QuerySet):
+                with self.timer.stage('fetch'):
+                    instance = await alist(instance)
+
+            instances = instance if many else [instance]
+            if self.identity_map is not None:
+                self.identity_map.resolve(instances, self.deferred_prefetches)
+
+            for lookup in self.deferred_prefetches:
+                with self.timer.stage('prefetch.%s' % getattr(lookup, 'prefetch_through', lookup)):
+                    await aprefetch_related_objects(instances, lookup)
+
+            await sync_to_async(prefetch_plugins)(instances, self.get_compiled_spec().serialization_spec)
+        return instance
+
+    def fetch_instances(self, instance, many):
+        # everything has already been fetched by `afetch_instances()`
+        return instance
+
+    async def aserialize(self, instance, many=False):
+        """ Fetch everything the spec needs for `instance`, then serialize it on a worker thread """
+        instance = await self.afetch_instances(instance, many)
+        serializer = self.get_serializer(instance, many=many)
+        return await sync_to_async(lambda: serializer.data, thread_sensitive=False)()
+
+    async def retrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(await self.aserialize(instance))
+
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = await sync_to_async(self.paginate_queryset)(queryset)
+        if page is not None:
+            return self.get_paginated_response(await self.aserialize(page, many=True))
+
+        return Response(await self.aserialize(queryset, many=True))
@@ -0,0 +1,59 @@
+"""
+Hold a view to a number of queries, set by `max_queries` on `SerializationSpecMixin`.
+
+The budget is checked twice: against the planned queries, once each time a spec is compiled,
+and against those actually made while fetching each request, which also counts any a plugin
+makes for itself. Going over it raises `QueryBudgetExceeded` when `DEBUG` is on (or when the
+`SERIALIZATION_SPEC_STRICT_QUERY_BUDGET` setting says so, as in tests), and is logged otherwise.
+"""
+from contextlib import contextmanager
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger('serialization_spec')
+
+# how the queries which are not made for a lookup are named
+ROOT_PATH = '(root)'
+PLUGINS_PATH = '(plugins)'
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def ordinal(n):
+    suffix = 'th' if 10 <= n % 100 < 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return '%d%s' % (n, suffix)
+
+
+def enforce_query_budget(view_name, paths, max_queries, planned=False):
+    """ Raise or log if the queries fetching `paths`, in order, are more than `max_queries` """
+    if len(paths) <= max_queries:
+        return
+    message = '%s %s %d queries, over its max_queries of %d: the %s is for %s' % (
+        view_name, 'plans' if planned else 'made', len(paths), max_queries, ordinal(max_queries + 1), paths[max_queries],
+    )
+    if getattr(settings, 'SERIALIZATION_SPEC_STRICT_QUERY_BUDGET', settings.DEBUG):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class QueryCounter:
+    """ A database execute wrapper which records the lookup path being fetched by each query """
+
+    def __init__(self):
+        self.paths = []  # type: list
+        self.path = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.paths.append(self.path)
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def fetching(self, path):
+        previous, self.path = self.path, path
+        try:
+            yield
+        finally:
+            self.path = previous
@@ -0,0 +1,155 @@
+"""
+Compile every spec view in the URLconf ahead of its first request.
+
+`check_serialization_specs()` is a system check, so a spec which refers to a field or relation
+its models do not have fails `manage.py check` (and so `runserver`, `migrate` and deploys which
+run checks) rather than the first request to it. With the `SERIALIZATION_SPEC_WARM_UP` setting,
+`warm_up_views()` also runs when the app registry is ready, filling the compiled spec and
+serializer class caches so that workers start with them built, and logging how many queries
+each view will make. Specs are compiled for an anonymous user, unless the function named by the
+`SERIALIZATION_SPEC_CHECK_USER` setting returns another for plugins which need one.
+"""
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import URLResolver, get_resolver
+from django.utils.module_loading import import_string
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from .explain import explain_compiled_spec
+from .serialization import (
+    SerializationSpecMixin, bind_spec, compile_serializer, compile_spec, make_serializer_class,
+)
+from .values import ValuesLevel, ValuesSerializationSpecMixin
+
+logger = logging.getLogger('serialization_spec')
+
+
+def get_view_class(callback):
+    return getattr(callback, 'view_class', None) or getattr(callback, 'cls', None)
+
+
+def iter_spec_views(patterns, prefix=''):
+    """ Yield the route, view class, init kwargs and actions of each spec view in a list of URL patterns """
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_spec_views(pattern.url_patterns, prefix + str(pattern.pattern))
+            continue
+        view_class = get_view_class(pattern.callback)
+        if view_class is not None and issubclass(view_class, SerializationSpecMixin):
+            initkwargs = getattr(pattern.callback, 'view_initkwargs', None) or getattr(pattern.callback, 'initkwargs', {})
+            actions = getattr(pattern.callback, 'actions', None)
+            yield prefix + str(pattern.pattern), view_class, initkwargs, actions
+
+
+def get_fetch_modes(view_class, actions):
+    """ Whether the view fetches a single object, with select_related, or a list, or both """
+    handlers = set(actions.values()) if actions else {name for name in ('retrieve', 'list') if hasattr(view_class, name)}
+    return [use_select_related for name, use_select_related in [('list', False), ('retrieve', True)] if name in handlers]
+
+
+def varies_by_request(view_class):
+    has_variants = view_class.get_serialization_spec_variant is not SerializationSpecMixin.get_serialization_spec_variant
+    return hasattr(view_class, 'get_serialization_spec') or has_variants
+
+
+def get_anonymous_user():
+    """ Who specs are compiled for ahead of a request, as DRF would authenticate them without credentials """
+    if not apps.is_installed('django.contrib.auth'):
+        return None
+    from django.contrib.auth.models import AnonymousUser
+    return AnonymousUser()
+
+
+def get_check_user():
+    """ Who specs are compiled for ahead of a request: the user returned by the `SERIALIZATION_SPEC_CHECK_USER` function, if any """
+    check_user = getattr(settings, 'SERIALIZATION_SPEC_CHECK_USER', None)
+    if check_user:
+        return import_string(check_user)()
+    return get_anonymous_user()
+
+
+def build_fields(serializer):
+    """ Build a serializer's fields and those of the serializers nested in it, which checks they exist """
+    for field in serializer.fields.values():
+        if isinstance(field, ListSerializer):
+            field = field.child
+        if isinstance(field, BaseSerializer):
+            build_fields(field)
+
+
+def warm_up_view(view, modes):
+    """
+    Compile a view's spec for each way it is fetched and build its serializer, returning the number
+    of queries each will make. Views whose spec depends on the request are compiled without caching.
+    """
+    model = view.queryset.model
+    if isinstance(view, ValuesSerializationSpecMixin):
+        ValuesLevel(model, view.serialization_spec)
+        return {}
+
+    # bound as `resolve_serialization_spec()` binds it, so requests find what is cached here
+    view.serialization_spec = bind_spec(model, view.serialization_spec)
+    user = get_check_user()
+    queries = {}
+    for use_select_related in modes:
+        if varies_by_request(type(view)):
+            compiled = compile_spec(model, view.serialization_spec, user, use_select_related)
+        else:
+            compiled = view.compile_serialization_spec(use_select_related, user)
+        queries['retrieve' if use_select_related else 'list'] = explain_compiled_spec(view.queryset.all(), compiled, user)['queries']
+
+    build_fields(make_serializer_class(model, view.serialization_spec)())
+    if view.use_compiled_serializer:
+        compile_serializer(model, view.serialization_spec)
+    return queries
+
+
+def get_spec_views():
+    seen = set()
+    for route, view_class, initkwargs, actions in iter_spec_views(get_resolver().url_patterns):
+        view = view_class(**initkwargs)
+        if hasattr(view_class, 'get_serialization_spec') or view.serialization_spec is None:
+            # left to `get_queryset()` to raise ImproperlyConfigured if it has neither
+            continue
+        if view.queryset is None or (view_class, id(view.serialization_spec)) in seen:
+            continue
+        seen.add((view_class, id(view.serialization_spec)))
+        yield route, view, get_fetch_modes(view_class, actions)
+
+
+def describe_view(route, view):
+    return '%s.%s (%s)' % (type(view).__module__, type(view).__qualname__, route)
+
+
+@checks.register(checks.Tags.urls)
+def check_serialization_specs(app_configs=None, **kwargs):
+    errors = []
+    for route, view, modes in get_spec_views():
+        try:
+            warm_up_view(view, modes)
+        except Exception as e:
+            errors.append(checks.Error(
+                'The serialization_spec of %s cannot be fetched: %s: %s' % (describe_view(route, view), type(e).__name__, e),
+                hint=None if getattr(settings, 'SERIALIZATION_SPEC_CHECK_USER', None) else (
+                    'Specs are checked for an anonymous user. If a plugin needs a signed in one, set '
+                    'SERIALIZATION_SPEC_CHECK_USER to a function returning a user to check them for.'
+                ),
+                obj=type(view),
+                id='serialization_spec.E001',
+            ))
+    return errors
+
+
+def warm_up_views():
+    """ Compile and cache every spec view's plan and serializer, raising ImproperlyConfigured for any which cannot be """
+    for route, view, modes in get_spec_views():
+        try:
+            queries = warm_up_view(view, modes)
+        except Exception as e:
+            raise ImproperlyConfigured('The serialization_spec of %s cannot be fetched: %s' % (describe_view(route, view), e)) from e
+        for mode, count in queries.items():
+            logger.info('%s %s will make %d queries', describe_view(route, view), mode, count)
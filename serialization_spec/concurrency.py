@@ -0,0 +1,51 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from django.db import connections
+from django.db.models import prefetch_related_objects
+
+
+def get_lookup_path(lookup):
+    return getattr(lookup, 'prefetch_through', lookup)
+
+
+def group_lookups(lookups):
+    """
+    Group prefetch lookups by the relation they start from. Lookups in different groups set
+    different attributes on the root instances and so can run at the same time, while those
+    within a group run one after another, as later ones may traverse what earlier ones fetched
+    """
+    groups = OrderedDict()  # type: OrderedDict
+    for lookup in lookups:
+        groups.setdefault(get_lookup_path(lookup).split('__')[0], []).append(lookup)
+    return list(groups.values())
+
+
+def prefetch_in_thread(instances, lookups):
+    try:
+        prefetch_related_objects(instances, *lookups)
+    finally:
+        # each worker thread has its own connections, which are not closed at the end of the request
+        connections.close_all()
+
+
+def prefetch_concurrently(instances, lookups, max_workers):
+    """
+    Run `lookups` on `instances` as `prefetch_related_objects()` would, but with sibling branches
+    on up to `max_workers` threads, each with its own database connection. Inside a transaction
+    the lookups run serially on this thread, as other connections would not see its writes
+    """
+    groups = group_lookups(lookups)
+    if not instances or len(groups) < 2 or max_workers < 2 or connections[instances[0]._state.db].in_atomic_block:
+        prefetch_related_objects(instances, *lookups)
+        return
+
+    for instance in instances:
+        # set up front, so that threads don't race to create it
+        if not hasattr(instance, '_prefetched_objects_cache'):
+            instance._prefetched_objects_cache = {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as executor:
+        for future in [executor.submit(copy_context().run, prefetch_in_thread, instances, group) for group in groups]:
+            future.result()
@@ -0,0 +1,96 @@
+from django.db.models import Prefetch, QuerySet
+
+from .relations import get_model_index
+from .serialization import Filtered, ManyToManyIDsPlugin, SerializationSpecPlugin, compile_spec, get_childspecs, get_id_pairs
+
+
+def get_select_related_paths(select_related, prefix=''):
+    if not isinstance(select_related, dict):
+        return []
+    paths = []
+    for key, nested in select_related.items():
+        paths.append(prefix + key)
+        paths += get_select_related_paths(nested, prefix + key + '__')
+    return paths
+
+
+def describe_queryset(queryset):
+    query = queryset.query
+    fields, defer = query.deferred_loading
+    return {
+        'model': queryset.model._meta.label,
+        'only': sorted(fields) if not defer else None,
+        'defer': sorted(fields) if defer else [],
+        'select_related': get_select_related_paths(query.select_related),
+        'annotations': list(query.annotations.keys()),
+        'distinct': query.distinct,
+        'sql': str(query),
+        'prefetches': [
+            describe_prefetch(lookup)
+            for lookup in queryset._prefetch_related_lookups
+        ],
+    }
+
+
+def describe_prefetch(lookup):
+    if not isinstance(lookup, Prefetch):
+        lookup = Prefetch(lookup)
+    description = {
+        'lookup': lookup.prefetch_through,
+        'to_attr': lookup.to_attr,
+    }
+    if lookup.queryset is not None:
+        description.update(describe_queryset(lookup.queryset))
+    else:
+        description['prefetches'] = []
+    return description
+
+
+def describe_id_fetches(model, serialization_spec, prefix=''):
+    """ The queries `ManyToManyIDsPlugin`s make for raw to-many fields, once the instances holding them are fetched """
+    relations = get_model_index(model).relations
+    fetches = []
+    for each in get_childspecs(serialization_spec):
+        for key, childspec in each.items():
+            if isinstance(childspec, ManyToManyIDsPlugin):
+                pairs, _ = get_id_pairs(model, key)
+                fetches.append({'lookup': prefix + key, 'model': pairs.model._meta.label, 'sql': str(pairs.query)})
+            elif not isinstance(childspec, SerializationSpecPlugin):
+                field_name = key
+                if isinstance(childspec, Filtered):
+                    field_name = childspec.field_name or key
+                    childspec = childspec.serialization_spec
+                if childspec:
+                    fetches += describe_id_fetches(relations[field_name].related_model, childspec, prefix + key + '__')
+    return fetches
+
+
+def count_queries(description):
+    """ The number of queries a described plan will make, or of one prefetch level and those nested beneath it """
+    return 1 + sum(count_queries(prefetch) for prefetch in description['prefetches']) + len(description.get('id_fetches', []))
+
+
+def get_query_paths(description, path=''):
+    """ The lookup path fetched by each query a described plan will make, in order, with '' for the root """
+    paths = [path]
+    for prefetch in description['prefetches']:
+        paths += get_query_paths(prefetch, path + '__' + prefetch['lookup'] if path else prefetch['lookup'])
+    return paths + [fetch['lookup'] for fetch in description.get('id_fetches', [])]
+
+
+def explain_spec(model_or_queryset, serialization_spec, user=None, use_select_related=False):
+    """
+    Describe the queries which will be made to fetch `serialization_spec`, without running them:
+    the root query's columns, joins and annotations, and each prefetch level beneath it, along
+    with the SQL Django will generate for each (without the filter on the parent ids for prefetches)
+    """
+    queryset = model_or_queryset if isinstance(model_or_queryset, QuerySet) else model_or_queryset._default_manager.all()
+    return explain_compiled_spec(queryset, compile_spec(queryset.model, serialization_spec, user, use_select_related), user)
+
+
+def explain_compiled_spec(queryset, compiled, user=None):
+    """ As `explain_spec()`, for a spec which has already been compiled """
+    description = describe_queryset(compiled.apply(queryset, user))
+    description['id_fetches'] = describe_id_fetches(queryset.model, compiled.serialization_spec)
+    description['queries'] = count_queries(description)
+    return description
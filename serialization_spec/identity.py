@@ -0,0 +1,138 @@
+"""
+A per-request identity map, so instances reached through more than one branch of a spec are shared.
+
+While an `IdentityMap` is active, every instance fetched for the spec is recorded by (model, pk).
+A level of the spec which only loads plain columns reuses a recorded instance for each row it
+fetches, as long as that instance already has all the level's columns loaded, so duplicates can be
+freed at once; and a foreign key prefetch is skipped for any instances whose related instance has
+already been fetched, leaving no query at all if every one of them has.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.query import ModelIterable
+
+
+current_identity_map = ContextVar('serialization_spec_identity_map', default=None)
+
+
+def get_loaded_attnames(instance):
+    return {field.attname for field in instance._meta.concrete_fields if field.attname in instance.__dict__}
+
+
+def get_required_attnames(queryset):
+    """ The columns a queryset loads into each instance """
+    opts = queryset.model._meta
+    names, defer = queryset.query.deferred_loading
+    if defer:
+        return {field.attname for field in opts.concrete_fields if field.name not in names and field.attname not in names}
+    return {opts.pk.attname} | {opts.get_field(name).attname for name in names}
+
+
+def is_flat(queryset):
+    """ Whether a queryset's instances have nothing loaded onto them besides their own columns """
+    query = queryset.query
+    return not (queryset._prefetch_related_lookups or query.select_related or query.annotations or query.extra)
+
+
+class IdentityMap:
+
+    def __init__(self):
+        self.instances = {}  # type: dict
+        self.lock = threading.Lock()
+        self.reused = 0
+        self.resolved = 0
+
+    def add(self, instance):
+        key = (instance._meta.concrete_model, instance.pk)
+        with self.lock:
+            self.instances.setdefault(key, instance)
+
+    def find(self, model, pk, attnames):
+        """ An instance of `model` already fetched with at least `attnames` loaded, if any """
+        instance = self.instances.get((model._meta.concrete_model, pk))
+        if instance is None or type(instance) is not model or not attnames <= get_loaded_attnames(instance):
+            return None
+        return instance
+
+    def reuse(self, instances, queryset):
+        """ Swap in already fetched instances for those just fetched by a flat `queryset` """
+        attnames = get_required_attnames(queryset)
+        for idx, instance in enumerate(instances):
+            existing = self.find(type(instance), instance.pk, attnames)
+            if existing is None:
+                self.add(instance)
+            elif existing is not instance:
+                instances[idx] = existing
+                self.reused += 1
+
+    def resolve(self, instances, lookups):
+        """
+        Set the related instance on `instances` for each foreign key lookup which is to be prefetched
+        with a flat queryset, wherever it has already been fetched, so that Django skips fetching it
+        """
+        if not instances:
+            return
+        opts = instances[0]._meta
+        for lookup in lookups:
+            if not isinstance(lookup, Prefetch) or lookup.to_attr or lookup.queryset is None or '__' in lookup.prefetch_through:
+                continue
+            try:
+                field = opts.get_field(lookup.prefetch_through)
+            except FieldDoesNotExist:
+                continue
+            if not (field.many_to_one or field.one_to_one) or not field.concrete or not field.target_field.primary_key:
+                continue
+            if not is_flat(lookup.queryset):
+                continue
+
+            attnames = get_required_attnames(lookup.queryset)
+            for instance in instances:
+                value = getattr(instance, field.attname)
+                if value is None or field.is_cached(instance):
+                    continue
+                existing = self.find(field.related_model, value, attnames)
+                if existing is not None:
+                    field.set_cached_value(instance, existing)
+                    self.resolved += 1
+
+
+class IdentityMapIterable(ModelIterable):
+    """ Yields model instances as `ModelIterable` does, sharing them through the active identity map """
+
+    def __iter__(self):
+        identity_map = current_identity_map.get()
+        if identity_map is None or self.chunked_fetch:
+            yield from super().__iter__()
+            return
+
+        instances = list(super().__iter__())
+        if is_flat(self.queryset):
+            identity_map.reuse(instances, self.queryset)
+        else:
+            for instance in instances:
+                identity_map.add(instance)
+        # runs before the queryset's own prefetches
+        identity_map.resolve(instances, self.queryset._prefetch_related_lookups)
+        yield from instances
+
+
+def with_identity_map(queryset):
+    if queryset._iterable_class is ModelIterable:
+        queryset._iterable_class = IdentityMapIterable
+    return queryset
+
+
+@contextmanager
+def using_identity_map(identity_map):
+    if identity_map is None:
+        yield
+        return
+    token = current_identity_map.set(identity_map)
+    try:
+        yield
+    finally:
+        current_identity_map.reset(token)
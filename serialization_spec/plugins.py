@@ -1,33 +1,109 @@
 from typing import Dict, Any
-from django.db.models import Count
-from .serialization import SerializationSpecPlugin
-from .utils import extend_queryset
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, IntegerField, ManyToManyField, OuterRef, Subquery
+from django.db.models.fields.reverse_related import ForeignObjectRel
+from django.db.models import Exists as ExistsExpression
+from django.db.models.functions import Coalesce
+from .serialization import SerializationSpecPlugin, get_joined_model, has_only_attrs, joined_name
+from .utils import extend_joined_queryset, extend_queryset, prefixed
 
 
 class SerializationSpecPluginModel(SerializationSpecPlugin):
-    """ Derive from this if you want to apply model a function """
+    """
+    Derive from this if you want to apply model a function.
+
+    By default the function is computed in a correlated subquery, so that several of these on
+    one spec don't multiply each other's joined rows; pass `use_subquery=False` to annotate
+    the function directly onto the queryset instead.
+    """
     kwargs = {}  # type: Dict[str, Any]
+    use_subquery = True
 
-    def __init__(self, relation):
+    def __init__(self, relation, use_subquery=None):
         self.relation = relation
+        if use_subquery is not None:
+            self.use_subquery = use_subquery
 
     def get_name(self):
         return '%s_%s' % (self.relation, self.name)
 
     def modify_queryset(self, queryset):
-        return queryset.annotate(**{self.get_name(): self.model_function(self.relation, **self.kwargs)})
+        return queryset.annotate(**{self.get_name(): self.get_expression(queryset.model)})
+
+    def modify_joined_queryset(self, queryset, path):
+        expression = self.get_expression(get_joined_model(queryset.model, path), path)
+        return queryset.annotate(**{joined_name(path, self.get_name()): expression})
+
+    def get_expression(self, model, path=''):
+        """ The function for `model`, annotated onto a queryset which reaches it through the lookup `path` """
+        if self.use_subquery:
+            return self.get_subquery(model, prefixed(path, 'pk'))
+        return self.model_function(prefixed(path, self.relation), **self.kwargs)
+
+    def get_subquery(self, model, outer='pk'):
+        aggregated = model._base_manager.filter(pk=OuterRef(outer)).order_by().values('pk').annotate(
+            **{self.get_name(): self.model_function(self.relation, **self.kwargs)}
+        )
+        # given explicitly, as before Django 3.0 a subquery takes the type of its first column, the pk
+        output_field = aggregated.query.annotations[self.get_name()].output_field
+        return Subquery(aggregated.values(self.get_name()), output_field=output_field)
 
     def get_value(self, instance):
         return getattr(instance, self.get_name())
 
+    def get_identity(self):
+        return (self.relation, self.use_subquery) if has_only_attrs(self, ['relation', 'use_subquery']) else None
+
+
+def get_related_rows(model, relation):
+    """
+    The model whose rows `relation` joins to from `model`, the lookup on it which refers back
+    to `model` and the column identifying the related instance, or None if `relation` is not
+    a single to-many relation. Many to many relations are read from the through table alone.
+    """
+    try:
+        field = model._meta.get_field(relation)
+    except FieldDoesNotExist:
+        return None
+
+    if isinstance(field, ManyToManyField):
+        return field.remote_field.through, field.m2m_field_name(), field.m2m_reverse_field_name()
+    if isinstance(field, ForeignObjectRel) and field.many_to_many:
+        return field.through, field.field.m2m_reverse_field_name(), field.field.m2m_field_name()
+    if isinstance(field, ForeignObjectRel) and field.one_to_many:
+        return field.related_model, field.field.name, 'pk'
+    return None
+
 
 class CountOf(SerializationSpecPluginModel):
     name = 'count'
     model_function = Count
     kwargs = {'distinct': True}  # To prevent counts clashing with each other
 
+    def get_subquery(self, model, outer='pk'):
+        related = get_related_rows(model, self.relation)
+        if related is None:
+            return super().get_subquery(model, outer)
+
+        related_model, lookup, column = related
+        counted = related_model._base_manager.filter(**{lookup: OuterRef(outer)}).order_by().values(lookup).annotate(
+            **{self.get_name(): Count(column, **self.kwargs)}
+        )
+        return Coalesce(Subquery(counted.values(self.get_name()), output_field=IntegerField()), 0, output_field=IntegerField())
+
 
 class Exists(CountOf):
+    name = 'exists'
+
+    def get_subquery(self, model, outer='pk'):
+        related = get_related_rows(model, self.relation)
+        if related is None:
+            rows = model._base_manager.filter(pk=OuterRef(outer), **{'%s__isnull' % self.relation: False})
+        else:
+            related_model, lookup, column = related
+            rows = related_model._base_manager.filter(**{lookup: OuterRef(outer)})
+        return ExistsExpression(rows)
+
     def get_value(self, instance):
         return super().get_value(instance) > 0
 
@@ -42,9 +118,16 @@ class Requires(SerializationSpecPlugin):
         extend_queryset(queryset, self.fields)
         return queryset
 
+    def modify_joined_queryset(self, queryset, path):
+        extend_joined_queryset(queryset, path, self.fields)
+        return queryset
+
     def get_value(self, instance):
         return getattr(instance, self.key)
 
+    def get_identity(self):
+        return tuple(sorted(self.fields)) if has_only_attrs(self, ['fields']) else None
+
 
 class Transform(SerializationSpecPlugin):
     """ Derive from this if you want to transform underlying data """
@@ -53,6 +136,10 @@ class Transform(SerializationSpecPlugin):
         extend_queryset(queryset, {self.key})
         return queryset
 
+    def modify_joined_queryset(self, queryset, path):
+        extend_joined_queryset(queryset, path, {self.key})
+        return queryset
+
     def get_value(self, instance):
         return self.transform(getattr(instance, self.key))
 
@@ -69,5 +156,14 @@ class MethodCall(SerializationSpecPlugin):
         extend_queryset(queryset, self.required_fields)
         return queryset
 
+    def modify_joined_queryset(self, queryset, path):
+        extend_joined_queryset(queryset, path, self.required_fields)
+        return queryset
+
     def get_value(self, instance):
         return getattr(instance, self.name)()
+
+    def get_identity(self):
+        if not has_only_attrs(self, ['name', 'required_fields']):
+            return None
+        return (self.name, tuple(sorted(self.required_fields)))
@@ -0,0 +1,82 @@
+"""
+An index of each model's fields and relations, built once per model, for planning specs.
+
+DRF's `model_meta.get_field_info()` walks a model's `_meta` afresh on every call, and what it
+returns leaves out the details of reverse relations which planning needs, so finding those meant
+a further scan of `_meta.related_objects`. `get_model_index()` does all of that once per model:
+indexes for every installed model are built when the app registry is ready if `serialization_spec`
+is in `INSTALLED_APPS`, and any other model's is built the first time it is asked for.
+"""
+from collections import OrderedDict, namedtuple
+
+from django.apps import apps
+from rest_framework.utils import model_meta
+
+from typing import Dict
+
+
+RelationInfo = namedtuple('RelationInfo', [
+    'model_field',
+    'related_model',
+    'to_many',
+    'to_field',
+    'has_through_model',
+    'reverse',
+    'through_model',  # the many to many through model, if any
+    'query_name',  # the name to use for the relation in lookups
+    'remote_name',  # the name of the relation from the related model back to this one
+    'reverse_fk',  # the foreign key on the related model which a reverse relation is keyed by
+])
+
+
+class ModelIndex:
+    """ A model's fields and relations, keyed by the names a spec uses for them """
+
+    def __init__(self, model):
+        field_info = model_meta.get_field_info(model)
+        reverse_rels = {rel.get_accessor_name(): rel for rel in model._meta.related_objects}
+
+        # the fields which can be passed to `.only()`
+        self.fields = frozenset(field_info.fields_and_pk) | frozenset(field_info.forward_relations)
+        self.relations = OrderedDict()  # type: OrderedDict
+        for name, relation in field_info.relations.items():
+            rel = reverse_rels.get(name) if relation.reverse else None
+            self.relations[name] = RelationInfo(
+                *relation,
+                through_model=self.get_through_model(relation, rel),
+                query_name=rel.name if rel else name,
+                remote_name=rel.field.name if rel else relation.model_field.related_query_name(),
+                reverse_fk=self.get_reverse_fk(relation, rel),
+            )
+        self.to_many = OrderedDict(
+            (name, relation.related_model) for name, relation in self.relations.items() if relation.to_many
+        )
+
+    @staticmethod
+    def get_through_model(relation, rel):
+        if rel is not None:
+            return rel.through if rel.many_to_many else None
+        return relation.model_field.remote_field.through if relation.model_field.many_to_many else None
+
+    @staticmethod
+    def get_reverse_fk(relation, rel):
+        if rel is None or relation.has_through_model or rel.many_to_many:
+            return None
+        if not any(field.name == rel.field.name for field in relation.related_model._meta.fields):
+            return None
+        return rel.field.name
+
+
+model_indexes = {}  # type: Dict[type, ModelIndex]
+
+
+def get_model_index(model):
+    index = model_indexes.get(model)
+    if index is None:
+        index = model_indexes[model] = ModelIndex(model)
+    return index
+
+
+def build_model_indexes():
+    for model in apps.get_models():
+        get_model_index(model)
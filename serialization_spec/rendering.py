@@ -0,0 +1,273 @@
+"""
+Render spec output as JSON straight from the fetched instances.
+
+`SpecJSONRenderer` produces the same bytes as DRF's `JSONRenderer` with its default settings.
+For a `SerializationSpecMixin` view it is rendering, the view encodes each instance with a
+function compiled from its spec by `compile_encoder()`, which writes JSON text field by field
+without building the intermediate dicts or passing them through the stdlib encoder, and formats
+UUIDs, datetimes, strings and numbers itself rather than through each field's `to_representation()`.
+Decimals coerced to strings are still quantized by the field's `to_representation()`, then written
+as strings directly; those which are not are left to the generic encoding.
+Any other data is rendered as it would be by `JSONRenderer`.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+from json.encoder import encode_basestring  # type: ignore
+from operator import attrgetter
+import datetime
+import json
+import uuid
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Manager
+from rest_framework import fields
+from rest_framework.relations import RelatedField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import BaseSerializer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from zen_queries import queries_disabled
+
+from .cache import LRUCache
+from .relations import get_model_index
+from .serialization import (
+    SERIALIZER_CLASS_CACHE_SIZE, CompiledSerializer, SerializationSpecPlugin, bind_spec, get_childspecs,
+    get_field_getter, get_plugin_getter, handle_filtered, make_serializer_class, spec_fingerprint,
+)
+
+INFINITY = float('inf')
+
+
+class RawJSON:
+    """ Output which has already been encoded as JSON """
+
+    def __init__(self, text):
+        self.text = text
+
+    @property
+    def data(self):
+        """ The output decoded again, for anything which needs it as Python data """
+        return json.loads(self.text, object_pairs_hook=OrderedDict)
+
+
+def encode_float(value):
+    if value != value or value in (INFINITY, -INFINITY):
+        raise ValueError('Out of range float values are not JSON compliant: ' + repr(value))
+    return float.__repr__(value)
+
+
+def encode_datetime(value):
+    representation = value.isoformat()
+    if representation.endswith('+00:00'):
+        representation = representation[:-6] + 'Z'
+    return '"%s"' % representation
+
+
+def encode_value(value):
+    """ Encode `value` as `JSONRenderer` would """
+    kind = type(value)
+    if kind is str:
+        return encode_basestring(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if kind is int:
+        return int.__repr__(value)
+    if kind is float:
+        return encode_float(value)
+    if kind is RawJSON:
+        return value.text
+    if kind is uuid.UUID:
+        return '"%s"' % value
+    if kind is datetime.datetime:
+        return encode_datetime(value)
+    if isinstance(value, dict) and all(type(key) is str for key in value):
+        return '{' + ','.join(encode_basestring(key) + ':' + encode_value(each) for key, each in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(encode_value(each) for each in value) + ']'
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+
+
+def materialize(data):
+    """ Replace any `RawJSON` within `data` with the data it encodes """
+    if isinstance(data, RawJSON):
+        return data.data
+    if isinstance(data, dict):
+        return OrderedDict((key, materialize(value)) for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return [materialize(each) for each in data]
+    return data
+
+
+def get_fast_format(field):
+    """
+    A function formatting a model attribute as JSON as `field` would represent it, which returns None
+    for any value it does not handle, or None if the field has no such function
+    """
+    field_class = type(field)
+    if field_class.to_representation is fields.UUIDField.to_representation and field.uuid_format == 'hex_verbose':
+        return lambda value: '"%s"' % value if type(value) is uuid.UUID else None
+
+    if field_class.to_representation is fields.DateTimeField.to_representation:
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if not isinstance(output_format, str) or output_format.lower() != fields.ISO_8601:
+            return None
+
+        def format_datetime(value):
+            if type(value) is not datetime.datetime:
+                return None
+            if value.tzinfo is None and field.default_timezone() is None and getattr(field, 'timezone', None) is None:
+                return encode_datetime(value)
+            return encode_datetime(field.enforce_timezone(value))
+        return format_datetime
+
+    if field_class.to_representation is fields.CharField.to_representation:
+        return lambda value: encode_basestring(value) if type(value) is str else None
+    if field_class.to_representation is fields.IntegerField.to_representation:
+        return lambda value: int.__repr__(value) if type(value) is int else None
+    if field_class.to_representation is fields.BooleanField.to_representation:
+        return lambda value: ('true' if value else 'false') if type(value) is bool else None
+    if field_class.to_representation is fields.DecimalField.to_representation:
+
+        def format_decimal(value):
+            if type(value) is not Decimal:
+                return None
+            # quantized by the field itself, and only a string if coerced to one
+            represented = field.to_representation(value)
+            return encode_basestring(represented) if type(represented) is str else None
+        return format_decimal
+    return None
+
+
+def get_field_encoder(field):
+    """ Mirror `get_field_getter()`, encoding the value as JSON """
+    get_value = get_field_getter(field)
+
+    def encode_field(instance):
+        return encode_value(get_value(instance))
+
+    fast_format = get_fast_format(field)
+    if fast_format is None or len(field.source_attrs) != 1 or isinstance(field, RelatedField):
+        return encode_field
+
+    get_attribute = attrgetter(field.source_attrs[0])
+
+    def encode_plain_field(instance):
+        try:
+            attribute = get_attribute(instance)
+        except (AttributeError, KeyError, ObjectDoesNotExist):
+            return encode_field(instance)
+        if attribute is None:
+            return 'null'
+        encoded = fast_format(attribute)
+        return encode_field(instance) if encoded is None else encoded
+
+    return encode_plain_field
+
+
+def get_nested_encoder(source, encode, many):
+    get_attribute = attrgetter(source)
+
+    if many:
+        def encode_nested(instance):
+            related = get_attribute(instance)
+            return '[' + ','.join(encode(each) for each in (related.all() if isinstance(related, Manager) else related)) + ']'
+    else:
+        def encode_nested(instance):
+            try:
+                related = get_attribute(instance)
+            except ObjectDoesNotExist:
+                return 'null'
+            return 'null' if related is None else encode(related)
+
+    return encode_nested
+
+
+encoder_cache = LRUCache(SERIALIZER_CLASS_CACHE_SIZE)
+
+
+def compile_encoder(model, serialization_spec):
+    """
+    Compile a spec into a function which turns an instance straight into JSON text, producing the
+    same output as rendering the data of the class from `make_serializer_class()` with `JSONRenderer`
+    """
+    serialization_spec = bind_spec(model, serialization_spec)
+    key = (model, spec_fingerprint(serialization_spec))
+    encode = encoder_cache.get(key)
+    if encode is None:
+        encode = build_encoder(model, serialization_spec)
+        encoder_cache.set(key, encode)
+    return encode
+
+
+def build_encoder(model, serialization_spec):
+    serializer_class = make_serializer_class(model, serialization_spec)
+    relations = get_model_index(model).relations
+    childspecs = {
+        key: (field_name, values)
+        for key, field_name, values
+        in [handle_filtered(item) for each in get_childspecs(serialization_spec) for item in each.items()]
+    }
+
+    encoders = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+
+        field_name, values = childspecs.get(name, (None, None))
+        if isinstance(values, SerializationSpecPlugin):
+            get_value = get_plugin_getter(serializer_class._declared_fields[name].plugin)
+            encoders.append((encode_basestring(name) + ':', lambda instance, get_value=get_value: encode_value(get_value(instance))))
+        elif isinstance(field, BaseSerializer):
+            relation = relations[field_name]
+            nested = compile_encoder(relation.related_model, values)
+            encoders.append((encode_basestring(name) + ':', get_nested_encoder(field.source, nested, relation.to_many)))
+        else:
+            encoders.append((encode_basestring(name) + ':', get_field_encoder(field)))
+
+    def encode(instance):
+        encoded = []
+        for prefix, encode_field in encoders:
+            try:
+                encoded.append(prefix + encode_field(instance))
+            except fields.SkipField:
+                pass
+        return '{' + ','.join(encoded) + '}'
+
+    return encode
+
+
+class EncodedSerializer(CompiledSerializer):
+    """ Stands in for a serializer instance in a view, with its data already encoded as `RawJSON` """
+
+    @property
+    def data(self):
+        with queries_disabled():
+            if self.many:
+                return RawJSON('[' + ','.join(self.serialize(each) for each in self.instance) + ']')
+            return RawJSON(self.serialize(self.instance))
+
+
+class SpecJSONRenderer(JSONRenderer):
+    """
+    Renders as `JSONRenderer`, encoding spec views' output straight from their instances. Indented,
+    ASCII-only or non-strict output, or a custom encoder class, is left to `JSONRenderer`.
+    """
+
+    def can_encode(self, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return indent is None and self.compact and not self.ensure_ascii and self.strict and self.encoder_class is JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not self.can_encode(accepted_media_type, renderer_context):
+            return super().render(materialize(data), accepted_media_type, renderer_context)
+
+        ret = encode_value(data)
+        # as `JSONRenderer`, so the output is a strict javascript subset
+        ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        return ret.encode()
@@ -0,0 +1,313 @@
+"""
+Cache the serialized output of detail views, keyed on what it was built from.
+
+The key for a response combines the view and the shape of its spec with the root object's pk
+and a version token: the root's version column (`modified` by default) and the latest version
+of the rows reachable through each relation in the spec, read in one query, plus a generation
+for each model the spec touches. Saving or deleting an instance of one of those models, or
+changing a many to many relation between them, moves its generation on, so any response which
+may have included it is no longer found.
+"""
+from collections import OrderedDict
+from hashlib import sha1
+import threading
+import uuid
+import weakref
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.shortcuts import get_object_or_404
+from rest_framework.response import Response
+
+from .cache import LRUCache
+from .plugins import SerializationSpecPluginModel
+from .relations import get_model_index
+from .rendering import materialize
+from .serialization import (
+    COMPILED_SPEC_CACHE_SIZE, Filtered, Limited, ManyToManyIDsPlugin, SerializationSpecMixin, SerializationSpecPlugin,
+    get_childspecs,
+)
+
+from typing import Dict, List
+
+
+class LocalResponseCache:
+    """ Keeps responses in this process, discarding the least recently used """
+
+    def __init__(self, maxsize=1024):
+        self.entries = LRUCache(maxsize)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            value = self.entries.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key, value):
+        self.entries.set(key, value)
+
+
+class DjangoResponseCache:
+    """ Keeps responses in one of the caches configured in Django's `CACHES` setting, shared between processes """
+
+    def __init__(self, alias='default', timeout=DEFAULT_TIMEOUT):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+
+default_response_cache = LocalResponseCache()
+
+
+def get_generation_key(model):
+    return 'serialization_spec:generation:%s' % model._meta.label_lower
+
+
+def get_generations(response_cache, models):
+    """
+    The current generation of each model. A generation which is missing, because it has never been
+    set or has been evicted, is replaced by a new one, so that it can never match an older response
+    """
+    keys = [get_generation_key(model) for model in models]
+    generations = response_cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            generations[key] = uuid.uuid4().hex
+            response_cache.set(key, generations[key])
+    return [generations[key] for key in keys]
+
+
+watched_models = {}  # type: Dict[type, List]
+watched_models_lock = threading.Lock()
+
+
+def model_changed(sender, **kwargs):
+    for response_cache in watched_models.get(sender, []):
+        response_cache.set(get_generation_key(sender), uuid.uuid4().hex)
+
+
+def watch_models(models, response_cache):
+    """ Move on a model's generation in `response_cache` whenever one of its instances changes """
+    with watched_models_lock:
+        for model in models:
+            response_caches = watched_models.setdefault(model, [])
+            if not response_caches:
+                for signal in [post_save, post_delete, m2m_changed]:
+                    signal.connect(model_changed, sender=model, weak=False, dispatch_uid='serialization_spec.response_cache')
+            if not any(each is response_cache for each in response_caches):
+                response_caches.append(response_cache)
+
+
+def get_through_model(field):
+    if field.many_to_many:
+        return field.remote_field.through if field.concrete else field.through
+    return None
+
+
+class SpecDependencies:
+    """
+    The lookups from a root model to each relation a spec reads, with the model at the end of each,
+    and every model, including many to many through models, whose rows the spec's output depends on
+    """
+
+    def __init__(self, model, serialization_spec):
+        self.lookups = []  # type: List[tuple]
+        self.models = [model]
+        self.add_spec(model, serialization_spec, '')
+
+    def add_model(self, model):
+        if model is not None and model not in self.models:
+            self.models.append(model)
+
+    def add_path(self, model, path, prefix):
+        for name in path.split('__'):
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.is_relation:
+                return None
+            self.add_model(get_through_model(field))
+            model = field.related_model
+            self.add_model(model)
+            prefix += name
+            self.lookups.append((prefix, model))
+            prefix += '__'
+        return model
+
+    def add_spec(self, model, serialization_spec, prefix):
+        relations = get_model_index(model).relations
+        for each in get_childspecs(serialization_spec):
+            for key, childspec in each.items():
+                if isinstance(childspec, ManyToManyIDsPlugin):
+                    self.add_path(model, relations[key].query_name, prefix)
+                elif isinstance(childspec, SerializationSpecPluginModel):
+                    self.add_path(model, childspec.relation, prefix)
+                elif not isinstance(childspec, SerializationSpecPlugin):
+                    field_name = key
+                    if isinstance(childspec, Filtered):
+                        field_name = childspec.field_name or key
+                        childspec = childspec.serialization_spec
+                    if childspec and field_name in relations:
+                        query_name = relations[field_name].query_name
+                        related_model = self.add_path(model, query_name, prefix)
+                        self.add_spec(related_model, childspec, prefix + query_name + '__')
+
+
+dependencies_cache = LRUCache(COMPILED_SPEC_CACHE_SIZE)
+
+
+def get_dependencies(compiled_spec):
+    cached = dependencies_cache.get(id(compiled_spec))
+    if cached is not None and cached[0] is compiled_spec:
+        return cached[1]
+    dependencies = SpecDependencies(compiled_spec.model, compiled_spec.serialization_spec)
+    dependencies_cache.set(id(compiled_spec), (compiled_spec, dependencies))
+    return dependencies
+
+
+plugin_token_cache = LRUCache(COMPILED_SPEC_CACHE_SIZE)
+
+
+def get_plugin_token(plugin):
+    """ A random token for a plugin, which no other plugin is given while it is cached """
+    cached = plugin_token_cache.get(id(plugin))
+    if cached is not None and cached[0]() is plugin:
+        return cached[1]
+    token = uuid.uuid4().hex
+    plugin_token_cache.set(id(plugin), (weakref.ref(plugin), token))
+    return token
+
+
+def describe_plugin(plugin):
+    """
+    A plugin's class and `get_identity()`, which are the same for equal plugins in every process, or
+    if it has no identity, a token for the plugin itself, so its responses are only found by its own requests
+    """
+    identity = plugin.get_identity()
+    description = repr(identity) if identity is not None else get_plugin_token(plugin)
+    return (type(plugin).__module__, type(plugin).__qualname__, description)
+
+
+def describe_spec(serialization_spec):
+    """ A description of a spec's shape which is the same in every process """
+    if isinstance(serialization_spec, SerializationSpecPlugin):
+        return describe_plugin(serialization_spec)
+    if isinstance(serialization_spec, Limited):
+        return ('limited', serialization_spec.field_name, serialization_spec.limit, serialization_spec.ordering,
+                repr(serialization_spec.filters), describe_spec(serialization_spec.serialization_spec))
+    if isinstance(serialization_spec, Filtered):
+        return ('filtered', serialization_spec.field_name, repr(serialization_spec.filters), describe_spec(serialization_spec.serialization_spec))
+    if isinstance(serialization_spec, dict):
+        return [(key, describe_spec(childspec)) for key, childspec in serialization_spec.items()]
+    if isinstance(serialization_spec, list):
+        return [describe_spec(each) for each in serialization_spec]
+    return serialization_spec
+
+
+def has_field(model, name):
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+class CachedSerializationSpecMixin(SerializationSpecMixin):
+    """
+    Caches the serialized output of a `RetrieveAPIView`. Each request makes one query, for the root
+    object's version and those of the related rows, which also checks the object exists in the view's
+    `get_queryset()` and that the user may see it, before the full fetch is made only when the response
+    is not already cached.
+
+    Responses are cached for each user, as any plugin may read `request_user`, unless the view
+    overrides `get_serialization_spec_variant()`, when they are shared by all requests with its variant.
+    """
+
+    response_cache = None  # type: ignore
+    cache_version_field = 'modified'
+
+    def get_response_cache(self):
+        return self.response_cache if self.response_cache is not None else default_response_cache
+
+    def get_version_instance(self, dependencies):
+        """ Fetch the root object's pk and version, annotated with the latest version of the rows related to it """
+        model = self.queryset.model
+        version_field = self.cache_version_field
+        only = [model._meta.pk.name]
+        if version_field and has_field(model, version_field):
+            only.append(version_field)
+
+        annotations = OrderedDict()
+        for idx, (lookup, related_model) in enumerate(dependencies.lookups):
+            if version_field and has_field(related_model, version_field):
+                latest = model._base_manager.filter(pk=OuterRef('pk')).order_by().values('pk').annotate(
+                    version=Max('%s__%s' % (lookup, version_field))
+                )
+                annotations['_version_%d' % idx] = Subquery(
+                    latest.values('version'), output_field=related_model._meta.get_field(version_field)
+                )
+
+        # the view's own queryset, so rows it leaves out for this user are not found here either
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).select_related(None)
+        queryset = queryset.only(*only).annotate(**annotations)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        instance = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, instance)
+        return instance, [getattr(instance, name) for name in only + list(annotations)]
+
+    def get_response_variant(self):
+        """ Which requests share a cached response: those with the view's variant if it declares one, else each user's """
+        if type(self).get_serialization_spec_variant is SerializationSpecMixin.get_serialization_spec_variant:
+            return ('user', getattr(self.request.user, 'pk', None))
+        return ('variant', self.get_serialization_spec_variant())
+
+    def get_response_cache_key(self):
+        response_cache = self.get_response_cache()
+        compiled = self.get_compiled_spec()
+        dependencies = get_dependencies(compiled)
+        watch_models(dependencies.models, response_cache)
+
+        instance, versions = self.get_version_instance(dependencies)
+        key = (
+            '%s.%s' % (type(self).__module__, type(self).__qualname__),
+            describe_spec(compiled.serialization_spec),
+            repr(self.get_response_variant()),
+            versions,
+            get_generations(response_cache, dependencies.models),
+        )
+        return 'serialization_spec:response:%s' % sha1(repr(key).encode()).hexdigest()
+
+    def retrieve(self, request, *args, **kwargs):
+        with self.timer.stage('cache'):
+            self.use_select_related = True
+            self.resolve_serialization_spec()
+            key = self.get_response_cache_key()
+            data = self.get_response_cache().get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().retrieve(request, *args, **kwargs)
+        # a plain copy, so the cache does not hold on to the serializer and its instances
+        self.get_response_cache().set(key, materialize(response.data))
+        return response
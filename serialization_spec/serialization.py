@@ -1,12 +1,32 @@
-from django.core.exceptions import ImproperlyConfigured
-from django.db.models import Prefetch
-from rest_framework.utils import model_meta
-from rest_framework.fields import Field, ReadOnlyField
-from rest_framework.serializers import ModelSerializer
+from django.conf import settings
+from django.db import connections
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ObjectDoesNotExist
+from django.db.models import Manager, OuterRef, Prefetch, Q, QuerySet, Subquery, prefetch_related_objects
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.fields.related_descriptors import ManyToManyDescriptor
+from django.db.models.manager import BaseManager
+from django.db.models.query import ModelIterable
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import Field, ReadOnlyField, SkipField
+from rest_framework.relations import PKOnlyObject, RelatedField
+from rest_framework.serializers import BaseSerializer, ModelSerializer
+from zen_queries import queries_disabled
 from zen_queries.rest_framework import QueriesDisabledViewMixin
 
-from typing import List, Dict, Union
+from .budget import PLUGINS_PATH, ROOT_PATH, QueryCounter, enforce_query_budget
+from .cache import LRUCache
+from .concurrency import prefetch_concurrently
+from .identity import IdentityMap, IdentityMapIterable, using_identity_map, with_identity_map
+from .relations import get_model_index
+from .timing import NULL_TIMER, StageTimer
+from .utils import extend_queryset
+
+from typing import Any, List, Dict, Optional, Union
 from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from operator import attrgetter
 import copy
 
 """
@@ -35,29 +55,161 @@ mixin should implement get_queryset() and get_serializer()
 """
 
 
+current_request_user = ContextVar('serialization_spec_request_user', default=None)
+
+
+@contextmanager
+def binding_request_user(get_user):
+    """ Make the user returned by `get_user()` the `request_user` of every plugin used within this """
+    token = current_request_user.set(get_user)
+    try:
+        yield
+    finally:
+        current_request_user.reset(token)
+
+
 class SerializationSpecPlugin:
-    """ These methods can access self.key to get the key """
+    """
+    These methods can access self.key to get the key, and self.request_user to get the user of
+    the request being served. A plugin in a declared spec is never modified: `bind_spec()` gives
+    each key its own copy, and the user is read from the request, so a spec can serve many
+    requests at once.
+    """
+
+    @property
+    def request_user(self):
+        get_user = current_request_user.get()
+        return None if get_user is None else get_user()
 
     def modify_queryset(self, queryset):
         return queryset
 
-    # abstract method
+    def modify_joined_queryset(self, queryset, path):
+        """
+        Called instead of `modify_queryset()` when the instances at this level are joined onto a
+        queryset of another model with `select_related(path)`. Annotations named by `joined_name()`
+        are moved from each fetched instance of that model onto the joined one. Plugins which override
+        `modify_queryset()` but not this are given their own query with a prefetch instead.
+        """
+        return queryset
+
+    def prefetch(self, instances):
+        """ Called with all the fetched instances at this level before they are serialized """
+        pass
+
+    def get_values(self, instances):
+        """
+        Optionally compute the values for all the fetched instances at this level at once, such as
+        with one bulk query, returning them in the same order. This is called after `prefetch()`,
+        before queries are disabled. Returning None leaves `get_value()` to be called for each instance.
+        """
+        return None
+
+    # abstract method, unless get_values() is implemented
     def get_value(self, instance):
-        raise NotImplementedError
+        values = self.get_values([instance])
+        if values is None:
+            raise NotImplementedError
+        return values[0]
+
+    def get_identity(self):
+        """
+        Optionally return a hashable value of plain data, such as the plugin's arguments, which is the
+        same for any two plugins of this class which fetch and serialize alike. Plugins which have one
+        share serializer classes and cached responses even when a spec builds new ones for each request.
+        """
+        return None
+
+
+def has_only_attrs(plugin, names):
+    """ Whether `plugin` has no attributes of its own besides `names` and its key, so they identify it """
+    return set(vars(plugin)) <= set(names) | {'key'}
+
+
+BATCHED_VALUES = '_serialization_spec_values'
+
+
+def store_batched_values(plugin, instances):
+    values = plugin.get_values(instances)
+    if values is None:
+        return
+    for instance, value in zip(instances, values):
+        instance.__dict__.setdefault(BATCHED_VALUES, {})[plugin] = value
+
+
+def get_plugin_value(plugin, instance):
+    """ The value `get_values()` computed for `instance` with the others at its level, or else `get_value()` """
+    batched = instance.__dict__.get(BATCHED_VALUES)
+    if batched is not None and plugin in batched:
+        return batched[plugin]
+    return plugin.get_value(instance)
+
+
+def get_through_ordering(target_field):
+    """ Order rows of a through table as the related model orders itself, without joining to it where possible """
+    ordering = []
+    for each in target_field.related_model._meta.ordering:
+        if not isinstance(each, str):
+            continue
+        descending, name = ('-', each[1:]) if each.startswith('-') else ('', each)
+        if name in ('pk', target_field.target_field.name):
+            ordering.append(descending + target_field.attname)
+        else:
+            ordering.append('%s%s__%s' % (descending, target_field.name, name))
+    return ordering
+
+
+def get_id_pairs(model, key):
+    """
+    A queryset of (parent, related id) pairs for the to-many relation `key` of `model`, read
+    from the through table or the related table alone, and the parent field they are keyed by
+    """
+    descriptor = getattr(model, key)
+    if isinstance(descriptor, ManyToManyDescriptor):
+        field = descriptor.rel.field
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        if descriptor.reverse:
+            source, target = target, source
+        through = descriptor.rel.through
+        source_field, target_field = through._meta.get_field(source), through._meta.get_field(target)
+        pairs = through._base_manager.values_list(source_field.attname, target_field.attname)
+        related_manager = target_field.related_model._default_manager
+        if type(related_manager).get_queryset is not BaseManager.get_queryset:
+            # leave out the related rows which the related manager would, such as soft deleted ones
+            pairs = pairs.filter(**{'%s__in' % target_field.attname: related_manager.values('pk')})
+        return pairs.order_by(*get_through_ordering(target_field)), source_field
+    field = descriptor.field
+    return field.model._default_manager.values_list(field.attname, 'pk'), field
 
 
 class ManyToManyIDsPlugin(SerializationSpecPlugin):
+    """
+    The ids of a raw to-many field, read for all the instances at its level at once by `prefetch()`.
+    An instance it has not been called with, such as one serialized outside a view, has its
+    ids read with a query of its own.
+    """
+
     def __init__(self, related_model, key):
         self.related_model = related_model
         self.to_attr = '_%s_ids' % key
         self.key = key
 
-    def modify_queryset(self, queryset):
-        inner_queryset = self.related_model.objects.only('id')
-        return queryset.prefetch_related(Prefetch(self.key, queryset=inner_queryset))
+    def prefetch(self, instances):
+        pairs, field = get_id_pairs(type(instances[0]), self.key)
+        parent_attname = field.target_field.attname
+        ids = {getattr(instance, parent_attname): [] for instance in instances}  # type: Dict[Any, List[str]]
+        for parent, related in pairs.filter(**{'%s__in' % field.attname: list(ids)}):
+            ids[parent].append(str(related))
+        for instance in instances:
+            setattr(instance, self.to_attr, ids[getattr(instance, parent_attname)])
 
     def get_value(self, instance):
-        return [str(each.id) for each in getattr(instance, self.key).all()]
+        if not hasattr(instance, self.to_attr):
+            self.prefetch([instance])
+        return getattr(instance, self.to_attr)
+
+    def get_identity(self):
+        return self.related_model._meta.label if has_only_attrs(self, ['related_model', 'to_attr']) else None
 
 
 class Filtered:
@@ -71,6 +223,24 @@ class Filtered:
             raise Exception('Specify filters and serialization_spec for Filtered')
 
 
+class Limited(Filtered):
+    """
+    A to-many relation with only the first `limit` related instances for each parent, in
+    `ordering`, which defaults to the related model's own ordering. `filters` may also be given.
+    """
+
+    def __init__(self, *args, ordering=None, filters=None):
+        if len(args) == 2:
+            self.field_name = None
+            self.limit, self.serialization_spec = args
+        elif len(args) == 3:
+            self.field_name, self.limit, self.serialization_spec = args
+        else:
+            raise Exception('Specify limit and serialization_spec for Limited')
+        self.filters = filters
+        self.ordering = list(ordering or [])
+
+
 class Aliased(Filtered):
     def __init__(self, field_name, serialization_spec=None):
         self.filters = None
@@ -83,8 +253,12 @@ class SerializationSpecPluginField(Field):
         self.plugin = plugin
         super().__init__(source='*', read_only=True)
 
+    def __deepcopy__(self, memo):
+        # keep the plugin itself rather than a copy, as it is what values are batched for
+        return SerializationSpecPluginField(self.plugin)
+
     def to_representation(self, value):
-        return self.plugin.get_value(value)
+        return get_plugin_value(self.plugin, value)
 
 
 class AliasedField(ReadOnlyField):
@@ -100,10 +274,14 @@ def get_fields(serialization_spec):
 
 
 def get_only_fields(model, serialization_spec):
-    field_info = model_meta.get_field_info(model)
-    fields = set(field_info.fields_and_pk.keys()) | set(field_info.forward_relations.keys())
+    fields = get_model_index(model).fields
+    aliased = [
+        childspec.field_name
+        for each in get_childspecs(serialization_spec) for childspec in each.values()
+        if isinstance(childspec, Aliased) and childspec.serialization_spec is None
+    ]
     return [
-        field for field in get_fields(serialization_spec)
+        field for field in get_fields(serialization_spec) + aliased
         if field in fields
     ]
 
@@ -119,11 +297,135 @@ def handle_filtered(item):
     return key, key, values
 
 
+def spec_fingerprint(serialization_spec):
+    """ A hashable value identifying the output shape of a spec """
+    if serialization_spec is None or isinstance(serialization_spec, str):
+        return serialization_spec
+    if isinstance(serialization_spec, SerializationSpecPlugin):
+        # bound plugins with equal identities are the same object, see `intern_plugin()`
+        return ('plugin', id(serialization_spec))
+    if isinstance(serialization_spec, Filtered):
+        return ('filtered', serialization_spec.field_name, spec_fingerprint(serialization_spec.serialization_spec))
+    if isinstance(serialization_spec, dict):
+        return tuple((key, spec_fingerprint(childspec)) for key, childspec in serialization_spec.items())
+    return tuple(spec_fingerprint(each) for each in serialization_spec)
+
+
+SERIALIZER_CLASS_CACHE_SIZE = 512
+
+
+class BoundSpec(list):
+    """ A spec as returned by `bind_spec()`, ready to be compiled and serialized """
+
+
+bound_plugin_cache = LRUCache(SERIALIZER_CLASS_CACHE_SIZE)
+
+interned_plugin_cache = LRUCache(SERIALIZER_CLASS_CACHE_SIZE)
+
+
+def intern_plugin(plugin):
+    """
+    The first bound plugin of the same class and key as `plugin` with an equal `get_identity()` which
+    is still cached, so that the serializer classes and batched values found for one are found for the
+    other, even from a new spec each request. A plugin without an identity is returned as it is.
+    """
+    identity = plugin.get_identity()
+    if identity is None:
+        return plugin
+    key = (type(plugin), plugin.key, identity)
+    interned = interned_plugin_cache.get(key)
+    if interned is not None:
+        return interned
+    interned_plugin_cache.set(key, plugin)
+    return plugin
+
+
+def bind_plugin(plugin, key):
+    """
+    The plugin to use under `key`: a copy of `plugin` which knows its key, unless it already does.
+    The same plugin bound to the same key gives the same copy.
+    """
+    if getattr(plugin, 'key', None) == key:
+        return plugin
+
+    cache_key = (id(plugin), key)
+    cached = bound_plugin_cache.get(cache_key)
+    # the declared plugin is held by the entry so its id() cannot be reused while cached
+    if cached is not None and cached[0] is plugin:
+        return cached[1]
+
+    bound = copy.copy(plugin)
+    bound.key = key
+    bound = intern_plugin(bound)
+    bound_plugin_cache.set(cache_key, (plugin, bound))
+    return bound
+
+
+bound_spec_cache = LRUCache(SERIALIZER_CLASS_CACHE_SIZE)
+
+
+def bind_spec(model, serialization_spec):
+    """
+    Bind a declared spec for use: its plugins are copied with their keys, raw to-many fields are
+    replaced with `ManyToManyIDsPlugin`s and `Filtered` relations are copied around their bound
+    specs, leaving the declared spec untouched. The same declared spec gives the same bound one.
+    """
+    if isinstance(serialization_spec, BoundSpec):
+        return serialization_spec
+
+    key = (model, id(serialization_spec))
+    cached = bound_spec_cache.get(key)
+    # the declared spec is held by the entry so its id() cannot be reused while cached
+    if cached is not None and cached[0] is serialization_spec:
+        return cached[1]
+
+    bound = build_bound_spec(model, serialization_spec)
+    bound_spec_cache.set(key, (serialization_spec, bound))
+    return bound
+
+
+def build_bound_spec(model, serialization_spec):
+    index = get_model_index(model)
+    bound = BoundSpec()
+    for each in serialization_spec:
+        if not isinstance(each, dict):
+            bound.append({each: intern_plugin(ManyToManyIDsPlugin(index.to_many[each], each))} if each in index.to_many else each)
+            continue
+
+        bound_dict = {}
+        for key, childspec in each.items():
+            if isinstance(childspec, SerializationSpecPlugin):
+                bound_dict[key] = bind_plugin(childspec, key)
+            elif isinstance(childspec, Filtered):
+                bound_dict[key] = copy.copy(childspec)
+                if childspec.serialization_spec is not None:
+                    related_model = index.relations[childspec.field_name or key].related_model
+                    bound_dict[key].serialization_spec = bind_spec(related_model, childspec.serialization_spec)
+            else:
+                bound_dict[key] = bind_spec(index.relations[key].related_model, childspec)
+        bound.append(bound_dict)
+    return bound
+
+
+serializer_class_cache = LRUCache(SERIALIZER_CLASS_CACHE_SIZE)
+
+
 def make_serializer_class(model, serialization_spec):
-    relations = model_meta.get_field_info(model).relations
+    serialization_spec = bind_spec(model, serialization_spec)
+    # Plugins are fingerprinted by identity, and are kept alive by the cached class's fields
+    key = (model, spec_fingerprint(serialization_spec))
+    serializer_class = serializer_class_cache.get(key)
+    if serializer_class is None:
+        serializer_class = build_serializer_class(model, serialization_spec)
+        serializer_class_cache.set(key, serializer_class)
+    return serializer_class
+
+
+def build_serializer_class(model, serialization_spec):
+    relations = get_model_index(model).relations
 
     return type(
-        'MySerializer',
+        '%sSerializer' % model.__name__,
         (ModelSerializer,),
         {
             'Meta': type(
@@ -147,27 +449,261 @@ def make_serializer_class(model, serialization_spec):
     )
 
 
-def has_plugin(spec):
+def get_field_getter(field):
+    """ Mirror `Serializer.to_representation()` for a single field """
+    def get_value(instance):
+        attribute = field.get_attribute(instance)
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else field.to_representation(attribute)
+
+    if len(field.source_attrs) != 1 or isinstance(field, RelatedField):
+        return get_value
+
+    get_attribute = attrgetter(field.source_attrs[0])
+    to_representation = field.to_representation
+
+    def get_plain_value(instance):
+        try:
+            attribute = get_attribute(instance)
+        except (AttributeError, KeyError, ObjectDoesNotExist):
+            # let the field apply its own defaults and error handling
+            return get_value(instance)
+        if callable(attribute):
+            return get_value(instance)
+        return None if attribute is None else to_representation(attribute)
+
+    return get_plain_value
+
+
+def get_plugin_getter(plugin):
+    def get_value(instance):
+        return get_plugin_value(plugin, instance)
+    return get_value
+
+
+def get_nested_getter(source, serialize, many):
+    get_attribute = attrgetter(source)
+
+    if many:
+        def get_value(instance):
+            related = get_attribute(instance)
+            return [serialize(each) for each in (related.all() if isinstance(related, Manager) else related)]
+    else:
+        def get_value(instance):
+            try:
+                related = get_attribute(instance)
+            except ObjectDoesNotExist:
+                return None
+            return None if related is None else serialize(related)
+
+    return get_value
+
+
+compiled_serializer_cache = LRUCache(SERIALIZER_CLASS_CACHE_SIZE)
+
+
+def compile_serializer(model, serialization_spec):
+    """
+    Compile a spec into a function which turns an instance straight into a dict, producing the
+    same output as the class from `make_serializer_class()` without the per-row serializer machinery
+    """
+    serialization_spec = bind_spec(model, serialization_spec)
+    key = (model, spec_fingerprint(serialization_spec))
+    serialize = compiled_serializer_cache.get(key)
+    if serialize is None:
+        serialize = build_compiled_serializer(model, serialization_spec)
+        compiled_serializer_cache.set(key, serialize)
+    return serialize
+
+
+def build_compiled_serializer(model, serialization_spec):
+    serializer_class = make_serializer_class(model, serialization_spec)
+    relations = get_model_index(model).relations
+    childspecs = {
+        key: (field_name, values)
+        for key, field_name, values
+        in [handle_filtered(item) for each in get_childspecs(serialization_spec) for item in each.items()]
+    }
+
+    getters = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+
+        field_name, values = childspecs.get(name, (None, None))
+        if isinstance(values, SerializationSpecPlugin):
+            # use the bound plugin rather than the per-serializer copy, as that is what values are batched for
+            getters.append((name, get_plugin_getter(serializer_class._declared_fields[name].plugin)))
+        elif isinstance(field, BaseSerializer):
+            relation = relations[field_name]
+            nested = compile_serializer(relation.related_model, values)
+            getters.append((name, get_nested_getter(field.source, nested, relation.to_many)))
+        else:
+            getters.append((name, get_field_getter(field)))
+
+    def serialize(instance):
+        ret = {}
+        for name, get_value in getters:
+            try:
+                ret[name] = get_value(instance)
+            except SkipField:
+                pass
+        return ret
+
+    return serialize
+
+
+class CompiledSerializer:
+    """ Stands in for a serializer instance in a view, using a function from `compile_serializer()` """
+
+    def __init__(self, serialize, instance=None, many=False):
+        self.serialize = serialize
+        self.instance = instance
+        self.many = many
+
+    @property
+    def data(self):
+        with queries_disabled():
+            if self.many:
+                return [self.serialize(each) for each in self.instance]
+            return self.serialize(self.instance)
+
+
+def spans_to_many(model, lookup):
+    """ Whether a lookup such as 'class__student__name__startswith' passes through a to-many relation """
+    for name in lookup.split(LOOKUP_SEP):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        if not field.is_relation:
+            return False
+        if field.one_to_many or field.many_to_many:
+            return True
+        model = field.related_model
+    return False
+
+
+def filters_span_to_many(model, filters):
+    if not isinstance(filters, Q):
+        # an expression, which may join to anything
+        return True
+    for child in filters.children:
+        if isinstance(child, Q):
+            if filters_span_to_many(model, child):
+                return True
+        elif not isinstance(child, tuple) or spans_to_many(model, child[0]):
+            # an expression, which may join to anything
+            return True
+    return False
+
+
+def apply_filters(queryset, filters):
+    """
+    Filter a queryset with a `Filtered`'s Q or expression, without joining in a way which could repeat its rows:
+    filters which span to-many relations are applied in a `pk__in` subquery rather than on the
+    queryset itself, so it never needs a DISTINCT
+    """
+    if not filters_span_to_many(queryset.model, filters):
+        return queryset.filter(filters)
+    return queryset.filter(pk__in=queryset.model._base_manager.filter(filters).values('pk'))
+
+
+def get_limit_ordering(model, ordering):
+    """ A complete ordering, so the same rows are kept each time """
+    ordering = list(ordering) or [each for each in model._meta.ordering if isinstance(each, str)]
+    if not any(each.lstrip('-') in ('pk', model._meta.pk.name) for each in ordering):
+        ordering.append('pk')
+    return ordering
+
+
+def limit_per_parent(queryset, parent_field, ordering, limit):
+    """
+    Keep only the first `limit` rows of a queryset for each value of `parent_field`, in `ordering`,
+    with a subquery correlated on the parent. MySQL does not support LIMIT within such a subquery.
+    """
+    first_rows = queryset.prefetch_related(None).filter(**{parent_field: OuterRef(parent_field)})
+    first_rows = first_rows.order_by(*ordering).values('pk')[:limit]
+    return queryset.filter(pk__in=Subquery(first_rows)).order_by(*ordering)
+
+
+def apply_limit(queryset, relation, limited):
+    """
+    Limit a reverse foreign key's prefetch queryset as `limited` asks, with `limit_per_parent()`. The
+    queryset is not sliced, as Django then cannot filter it for each parent unless given a `to_attr`
+    """
+    if not relation.to_many:
+        raise ImproperlyConfigured('Limited can only be used on a to-many relation')
+    if not relation.reverse_fk:
+        raise ImproperlyConfigured('Limited can only be used on a reverse foreign key')
+    ordering = get_limit_ordering(queryset.model, limited.ordering)
+    return limit_per_parent(queryset, relation.reverse_fk, ordering, limited.limit)
+
+
+def is_joinable(plugin):
+    """ Whether a plugin can be applied to the instances at its level when they are fetched by select_related """
+    plugin_class = type(plugin)
+    modifies_joined = plugin_class.modify_joined_queryset is not SerializationSpecPlugin.modify_joined_queryset
+    return modifies_joined or plugin_class.modify_queryset is SerializationSpecPlugin.modify_queryset
+
+
+def has_unjoinable_plugin(spec):
     return isinstance(spec, list) and any(
-        isinstance(childspec, SerializationSpecPlugin) or has_plugin(childspec)
+        isinstance(childspec, SerializationSpecPlugin) and not is_joinable(childspec)
         for each in spec if isinstance(each, dict)
         for key, childspec in each.items()
     )
 
 
-def prefetch_related(request_user, queryset, model, prefixes, serialization_spec, use_select_related):
-    relations = model_meta.get_field_info(model).relations
+def joined_name(path, name):
+    """ The annotation which a plugin joined by `select_related(path)` gives the root queryset for `name` """
+    return '%s%s%s' % (path, LOOKUP_SEP, name)
+
+
+def get_joined_model(model, path):
+    for key in path.split(LOOKUP_SEP):
+        model = get_model_index(model).relations[key].related_model
+    return model
+
+
+def get_joined_instance(instance, path):
+    for key in path.split(LOOKUP_SEP):
+        # a missing reverse one to one raises an AttributeError subclass
+        instance = getattr(instance, key, None)
+        if instance is None:
+            return None
+    return instance
+
+
+class JoinedValuesIterable(IdentityMapIterable):
+    """ Moves the annotations named by `joined_name()` from each instance onto the one joined at their path """
+
+    def __iter__(self):
+        joined = [(name, name.rsplit(LOOKUP_SEP, 1)) for name in self.queryset.query.annotations if LOOKUP_SEP in name]
+        for instance in super().__iter__():
+            for name, (path, attname) in joined:
+                value = instance.__dict__.pop(name, None)
+                related = get_joined_instance(instance, path)
+                if related is not None:
+                    setattr(related, attname, value)
+            yield instance
+
+
+def plan_prefetch(model, prefixes, serialization_spec, use_select_related):
+    """ Walk the spec and return the queryset operations needed to fetch it """
+    relations = get_model_index(model).relations
+    steps = []  # type: List[tuple]
 
     for each in serialization_spec:
         if isinstance(each, dict):
             for key, childspec in each.items():
                 if isinstance(childspec, SerializationSpecPlugin):
-                    childspec.key = key
-                    childspec.request_user = request_user
-                    queryset = childspec.modify_queryset(queryset)
+                    steps.append(('plugin', key, childspec, '__'.join(prefixes)))
 
                 else:
-                    filters, to_attr = None, None
+                    filters, to_attr, limited = None, None, None
+                    if isinstance(childspec, Limited):
+                        limited = childspec
                     if isinstance(childspec, Filtered):
                         if not childspec.serialization_spec:
                             continue
@@ -180,46 +716,122 @@ def prefetch_related(request_user, queryset, model, prefixes, serialization_spec
 
                     relation = relations[key]
                     related_model = relation.related_model
+                    if limited and not relation.to_many:
+                        # checked here too as a joined relation never reaches `apply_limit()`
+                        raise ImproperlyConfigured('Limited can only be used on a to-many relation')
 
                     key_path = '__'.join(prefixes + [key])
 
-                    if (relation.model_field and relation.model_field.one_to_one) or (use_select_related and not relation.to_many) and not has_plugin(childspec):
-                        # no way to .only() on a select_related field
-                        queryset = queryset.select_related(key_path)
-                        queryset = prefetch_related(request_user, queryset, related_model, prefixes + [key], childspec, use_select_related)
+                    joined = (relation.model_field and relation.model_field.one_to_one) or (use_select_related and not relation.to_many)
+                    if joined and not has_unjoinable_plugin(childspec):
+                        steps.append(('select_related', key_path))
+                        steps.append(('extend_only', get_joined_only_fields(relation, key_path, childspec)))
+                        steps += plan_prefetch(related_model, prefixes + [key], childspec, use_select_related)
                     else:
                         only_fields = get_only_fields(related_model, childspec)
-                        if relation.reverse and not relation.has_through_model:
+                        if relation.reverse_fk:
                             # need to include the reverse FK to allow prefetch to stitch results together
-                            # Unfortunately that info is in the model._meta but is not in the RelationInfo tuple
-                            reverse_fk = next(
-                                rel.field.name
-                                for rel in model._meta.related_objects
-                                if rel.get_accessor_name() == key
-                            )
-                            has_reverse_fk = any(field.name == reverse_fk for field in relation.related_model._meta.fields)
-                            if has_reverse_fk:
-                                only_fields += ['%s_id' % reverse_fk]
-                        inner_queryset = prefetch_related(request_user, related_model.objects.only(*only_fields), related_model, [], childspec, use_select_related)
+                            only_fields += ['%s_id' % relation.reverse_fk]
+                        inner_queryset = prefetch_related(with_identity_map(related_model.objects.only(*only_fields)), related_model, [], childspec, use_select_related)
                         if filters:
-                            inner_queryset = inner_queryset.filter(filters).distinct()
-                        queryset = queryset.prefetch_related(Prefetch(
+                            inner_queryset = apply_filters(inner_queryset, filters)
+                        if limited:
+                            inner_queryset = apply_limit(inner_queryset, relation, limited)
+                        steps.append(('prefetch', Prefetch(
                             key_path,
                             queryset=inner_queryset,
                             **({'to_attr': to_attr} if to_attr else {})
-                        ))
+                        )))
+
+    return steps
+
+
+def get_joined_only_fields(relation, key_path, serialization_spec):
+    """ The `.only()` entries for a relation joined with `select_related(key_path)` """
+    opts = relation.related_model._meta
+    fields = [opts.pk.name] + get_only_fields(relation.related_model, serialization_spec)
+    if relation.reverse_fk:
+        # the one to one back to the joined-from model
+        fields.append(relation.reverse_fk)
+    fields = [opts.pk.name if field == 'pk' else field for field in fields]
+    return ['%s__%s' % (key_path, field) for field in OrderedDict.fromkeys(fields)]
+
+
+def apply_steps(queryset, steps):
+    for step in steps:
+        if step[0] == 'only':
+            queryset = queryset.only(*step[1])
+        elif step[0] == 'extend_only':
+            # `.only()` replaces the fields it was given before
+            queryset = queryset.all()
+            extend_queryset(queryset, step[1])
+        elif step[0] == 'select_related':
+            queryset = queryset.select_related(step[1])
+        elif step[0] == 'prefetch':
+            queryset = queryset.prefetch_related(step[1])
+        else:
+            _, key, plugin, path = step
+            if not path:
+                queryset = plugin.modify_queryset(queryset)
+                continue
+            queryset = plugin.modify_joined_queryset(queryset, path)
+            if queryset._iterable_class in (ModelIterable, IdentityMapIterable):
+                queryset._iterable_class = JoinedValuesIterable
 
     return queryset
 
 
+def prefetch_related(queryset, model, prefixes, serialization_spec, use_select_related):
+    return apply_steps(queryset, plan_prefetch(model, prefixes, serialization_spec, use_select_related))
+
+
+def get_related_instances(instances, key):
+    related_instances = []
+    for instance in instances:
+        try:
+            related = getattr(instance, key)
+        except ObjectDoesNotExist:
+            continue
+        if isinstance(related, Manager):
+            related_instances += related.all()
+        elif isinstance(related, list):
+            related_instances += related
+        elif related is not None:
+            related_instances.append(related)
+    return related_instances
+
+
+def prefetch_plugins(instances, serialization_spec):
+    """
+    Call `prefetch()` then `get_values()` on the plugins at each level of a compiled spec with the
+    instances fetched for that level
+    """
+    if not instances:
+        return
+
+    for each in get_childspecs(serialization_spec):
+        for key, childspec in each.items():
+            if isinstance(childspec, SerializationSpecPlugin):
+                childspec.prefetch(instances)
+                store_batched_values(childspec, instances)
+            else:
+                if isinstance(childspec, Filtered):
+                    childspec = childspec.serialization_spec
+                if childspec:
+                    prefetch_plugins(get_related_instances(instances, key), childspec)
+
+
 def get_serialization_spec(view_or_plugin, request_user=None):
     if hasattr(view_or_plugin, 'get_serialization_spec'):
-        view_or_plugin.request_user = request_user
+        if not isinstance(view_or_plugin, SerializationSpecPlugin):
+            # a plugin reads its user from `binding_request_user()`
+            view_or_plugin.request_user = request_user
         return view_or_plugin.get_serialization_spec()
     return getattr(view_or_plugin, 'serialization_spec', None)
 
 
-def expand_nested_specs(serialization_spec, request_user):
+def expand_nested_specs(serialization_spec):
+    """ Merge the specs of plugins into the spec around them, without modifying either """
     expanded_serialization_spec = []
 
     for each in serialization_spec:
@@ -229,20 +841,19 @@ def expand_nested_specs(serialization_spec, request_user):
             expanded_dict = {}
             for key, childspec in each.items():
                 if isinstance(childspec, SerializationSpecPlugin):
-                    serialization_spec = get_serialization_spec(childspec, request_user)
+                    # plugins within a plugin's own spec have not been bound by `bind_spec()`
+                    childspec = bind_plugin(childspec, key)
+                    serialization_spec = get_serialization_spec(childspec)
                     if serialization_spec is not None:
-                        plugin_copy = copy.deepcopy(childspec)
-                        plugin_copy.serialization_spec = expand_nested_specs(plugin_copy.serialization_spec, request_user)
-                        expanded_serialization_spec += plugin_copy.serialization_spec
-                        expanded_dict[key] = plugin_copy
-                    else:
-                        expanded_dict[key] = childspec
+                        expanded_serialization_spec += expand_nested_specs(serialization_spec)
+                    expanded_dict[key] = childspec
                 elif isinstance(childspec, Filtered):
                     if childspec.serialization_spec:
-                        childspec.serialization_spec = expand_nested_specs(childspec.serialization_spec, request_user)
+                        childspec = copy.copy(childspec)
+                        childspec.serialization_spec = expand_nested_specs(childspec.serialization_spec)
                     expanded_dict[key] = childspec
                 else:
-                    expanded_dict[key] = expand_nested_specs(childspec, request_user)
+                    expanded_dict[key] = expand_nested_specs(childspec)
             expanded_serialization_spec.append(expanded_dict)
 
     return expanded_serialization_spec
@@ -283,50 +894,416 @@ def normalise_spec(serialization_spec):
     return combine(normalised_spec)
 
 
-def expand_many2many_id_fields(model, serialization_spec):
-    # Convert raw M2M fields to ManyToManyIDsPlugin
-    many_related_models = {
-        field_name: relation.related_model
-        for field_name, relation in model_meta.get_field_info(model).relations.items()
-        if relation.to_many
-    }
-
-    for idx, each in enumerate(serialization_spec):
-        if not isinstance(each, dict):
-            if each in many_related_models:
-                serialization_spec[idx] = {each: ManyToManyIDsPlugin(many_related_models[each], each)}
+def parse_projection(value):
+    """ Parse eg. 'id,name,class_set.name' into {'id': None, 'name': None, 'class_set': {'name': None}} """
+    tree = {}  # type: Dict[str, Any]
+    for path in value.split(','):
+        node = tree
+        keys = [key.strip() for key in path.split('.')]
+        if not all(keys):
+            continue
+        for key in keys[:-1]:
+            if key in node and node[key] is None:
+                break  # the whole of this key is already selected
+            node = node.setdefault(key, {})
         else:
+            node[keys[-1]] = None
+    return tree
+
+
+def canonical_projection(tree):
+    """ A projection tree as a hashable value, the same whichever order its keys were given in """
+    return tuple(sorted((key, None if node is None else canonical_projection(node)) for key, node in tree.items()))
+
+
+def narrow_childspec(childspec, tree, prune, path):
+    if isinstance(childspec, list):
+        narrowed = prune(childspec, tree, path)
+        narrowed_spec = narrowed
+    elif isinstance(childspec, Filtered) and childspec.serialization_spec:
+        narrowed = copy.copy(childspec)
+        narrowed.serialization_spec = narrowed_spec = prune(childspec.serialization_spec, tree, path)
+    else:
+        raise ValueError('Cannot select fields within %s' % path.rstrip('.'))
+
+    if not narrowed_spec:
+        # the relation would still be serialized, with nothing fetched for it
+        raise ValueError('No fields left within %s, leave it out instead' % path.rstrip('.'))
+    return narrowed
+
+
+def select_fields(serialization_spec, tree, path=''):
+    """ Narrow a spec to only the keys in a projection tree """
+    selected = []  # type: List[Any]
+    found = set()
+    for each in serialization_spec:
+        if isinstance(each, dict):
+            selected_dict = {}
+            for key, childspec in each.items():
+                if key in tree:
+                    found.add(key)
+                    selected_dict[key] = childspec if tree[key] is None else narrow_childspec(childspec, tree[key], select_fields, path + key + '.')
+            if selected_dict:
+                selected.append(selected_dict)
+        elif each in tree:
+            found.add(each)
+            if tree[each] is not None:
+                raise ValueError('Cannot select fields within %s%s' % (path, each))
+            selected.append(each)
+
+    unknown = sorted(set(tree) - found)
+    if unknown:
+        raise ValueError('Unknown field %s%s' % (path, unknown[0]))
+    return selected
+
+
+def exclude_fields(serialization_spec, tree, path=''):
+    """ Remove the keys in a projection tree from a spec """
+    remaining = []  # type: List[Any]
+    found = set()
+    for each in serialization_spec:
+        if isinstance(each, dict):
+            remaining_dict = {}
             for key, childspec in each.items():
-                if key in many_related_models:
-                    expand_many2many_id_fields(many_related_models[key], each[key])
+                if key not in tree:
+                    remaining_dict[key] = childspec
+                    continue
+                found.add(key)
+                if tree[key] is not None:
+                    remaining_dict[key] = narrow_childspec(childspec, tree[key], exclude_fields, path + key + '.')
+            if remaining_dict:
+                remaining.append(remaining_dict)
+        elif each in tree:
+            found.add(each)
+            if tree[each] is not None:
+                raise ValueError('Cannot exclude fields within %s%s' % (path, each))
+        else:
+            remaining.append(each)
+
+    unknown = sorted(set(tree) - found)
+    if unknown:
+        raise ValueError('Unknown field %s%s' % (path, unknown[0]))
+    return remaining
+
+
+def project_spec(serialization_spec, fields=None, exclude=None):
+    """
+    Narrow a spec by a client's `fields` and `exclude` projections, eg. 'id,class_set.name',
+    raising ValueError if they refer to keys which are not in the spec
+    """
+    if fields:
+        serialization_spec = select_fields(serialization_spec, parse_projection(fields))
+    if exclude:
+        serialization_spec = exclude_fields(serialization_spec, parse_projection(exclude))
+    return serialization_spec
+
+
+class CompiledSpec:
+    """
+    The planned `.only()`, `.select_related()`, `Prefetch` and plugin operations for a
+    serialization spec, so that they can be computed once and cheaply applied per request
+    """
+
+    def __init__(self, model, serialization_spec, steps, reads_request_user=False):
+        self.model = model
+        self.serialization_spec = serialization_spec
+        self.steps = steps
+        # whether planning looked up the user, such as for a plugin's queryset beneath a prefetch
+        self.reads_request_user = reads_request_user
+
+    def apply(self, queryset, user=None):
+        with binding_request_user(lambda: user):
+            return with_identity_map(apply_steps(queryset, self.steps))
+
+
+def compile_spec(model, serialization_spec, user=None, use_select_related=False):
+    serialization_spec = bind_spec(model, serialization_spec)
+    reads = []  # type: List[bool]
+
+    def get_user():
+        reads.append(True)
+        return user
+
+    with binding_request_user(get_user):
+        serialization_spec = normalise_spec(expand_nested_specs(serialization_spec))
+        steps = [('only', get_only_fields(model, serialization_spec))]
+        steps += plan_prefetch(model, [], serialization_spec, use_select_related)
+    return CompiledSpec(model, serialization_spec, steps, reads_request_user=bool(reads))
 
 
 def prefetch_queryset(queryset, serialization_spec, user=None, use_select_related=False):
-    expand_many2many_id_fields(queryset.model, serialization_spec)
-    serialization_spec = expand_nested_specs(serialization_spec, user)
-    serialization_spec = normalise_spec(serialization_spec)
-    queryset = queryset.only(*get_only_fields(queryset.model, serialization_spec))
-    return prefetch_related(user, queryset, queryset.model, [], serialization_spec, use_select_related)
+    return compile_spec(queryset.model, serialization_spec, user, use_select_related).apply(queryset, user)
+
+
+COMPILED_SPEC_CACHE_SIZE = 512
+
+compiled_spec_cache = LRUCache(COMPILED_SPEC_CACHE_SIZE)
+
+# kept apart, so that however many projections clients ask for, the views' own plans are not evicted
+projected_spec_cache = LRUCache(COMPILED_SPEC_CACHE_SIZE)
+projected_compiled_spec_cache = LRUCache(COMPILED_SPEC_CACHE_SIZE)
+
+
+def invalidate_compiled_specs(view_class=None):
+    """ Discard cached compiled specs, either for one view class or for all of them """
+    for cache in [compiled_spec_cache, projected_spec_cache, projected_compiled_spec_cache]:
+        if view_class is None:
+            cache.clear()
+        else:
+            cache.discard(lambda key: key[0] is view_class)
+
+
+class TimedSerializerMixin:
+    @property
+    def data(self):
+        with self.timer.stage('serialize'):
+            return super().data
+
+
+def timed_serializer(serializer, timer):
+    serializer.__class__ = type(
+        serializer.__class__.__name__,
+        (TimedSerializerMixin, serializer.__class__),
+        {},
+    )
+    serializer.timer = timer
+    return serializer
 
 
 class SerializationSpecMixin(QueriesDisabledViewMixin):
 
     serialization_spec = None  # type: SerializationSpec
+    use_compiled_serializer = False
+    record_timings = False
+    fields_query_param = None  # type: Optional[str]
+    exclude_query_param = None  # type: Optional[str]
+    prefetch_concurrency = 1
+    use_identity_map = False
+    max_queries = None  # type: Optional[int]
+
+    timer = NULL_TIMER
+    deferred_prefetches = ()  # type: tuple
+    spec_resolved = False
+    spec_projected = False
+    compiled_spec = None  # type: Optional[tuple]
+    identity_map = None  # type: Optional[IdentityMap]
+
+    def dispatch(self, request, *args, **kwargs):
+        with self.binding_request_user():
+            return super().dispatch(request, *args, **kwargs)
+
+    def binding_request_user(self):
+        """ Make the user of this request the `request_user` of the spec's plugins """
+        return binding_request_user(lambda: self.request.user)
+
+    def initial(self, request, *args, **kwargs):
+        if self.record_timings:
+            self.timer = StageTimer()
+        if self.use_identity_map:
+            self.identity_map = IdentityMap()
+        super().initial(request, *args, **kwargs)
 
     def get_object(self):
         self.use_select_related = True
-        return super().get_object()
+        with self.timer.stage('fetch'), using_identity_map(self.identity_map):
+            return super().get_object()
+
+    def paginate_queryset(self, queryset):
+        with self.timer.stage('fetch'), using_identity_map(self.identity_map):
+            return super().paginate_queryset(queryset)
 
     def get_queryset(self):
+        with self.timer.stage('plan'):
+            self.resolve_serialization_spec()
+            queryset = self.get_compiled_spec().apply(self.queryset, self.request.user)
+
+        if self.timer or self.prefetch_concurrency > 1 or self.max_queries is not None:
+            # run the prefetches separately in `fetch_instances()` so that each can be timed, counted, or run concurrently
+            self.deferred_prefetches = queryset._prefetch_related_lookups
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+    def resolve_serialization_spec(self):
+        """ Settle the spec for this request: the view's own or `get_serialization_spec()`'s, narrowed by the client """
+        if self.spec_resolved:
+            return
         self.serialization_spec = get_serialization_spec(self)
         if self.serialization_spec is None:
             raise ImproperlyConfigured('SerializationSpecMixin requires serialization_spec or get_serialization_spec')
 
-        return prefetch_queryset(self.queryset, self.serialization_spec, self.request.user, getattr(self, 'use_select_related', False))
+        self.serialization_spec = bind_spec(self.queryset.model, self.get_projected_spec())
+        self.spec_resolved = True
+
+    def get_projected_spec(self):
+        """
+        Narrow the spec by the fields the client asked for, reusing the same narrowed spec, bound apart
+        from the declared ones, for the same projection however its keys are ordered
+        """
+        fields = self.request.query_params.get(self.fields_query_param) if self.fields_query_param else None
+        exclude = self.request.query_params.get(self.exclude_query_param) if self.exclude_query_param else None
+        if not (fields or exclude):
+            return self.serialization_spec
+
+        self.spec_projected = True
+        projection = [canonical_projection(parse_projection(value)) if value else None for value in (fields, exclude)]
+        key = (type(self), id(self.serialization_spec), tuple(projection))
+        cached = projected_spec_cache.get(key)
+        if cached is not None and cached[0] is self.serialization_spec:
+            return cached[1]
+
+        projected = self.serialization_spec
+        for param, projection in [(self.fields_query_param, {'fields': fields}), (self.exclude_query_param, {'exclude': exclude})]:
+            try:
+                projected = project_spec(projected, **projection)
+            except ValueError as e:
+                raise ValidationError({param: [str(e)]})
+        projected = build_bound_spec(self.queryset.model, projected)
+        projected_spec_cache.set(key, (self.serialization_spec, projected))
+        return projected
+
+    def get_serialization_spec_variant(self):
+        """
+        Override to return a hashable value identifying how the fetched data depends
+        on the request, eg. the user, when a spec or its plugins' querysets vary with it
+        """
+        return None
+
+    def get_compiled_spec(self):
+        use_select_related = getattr(self, 'use_select_related', False)
+        # kept for the rest of the request, as it may not have been cached for the next one
+        if self.compiled_spec is None or self.compiled_spec[0] != use_select_related:
+            self.compiled_spec = (use_select_related, self.compile_serialization_spec(use_select_related, self.request.user))
+        return self.compiled_spec[1]
+
+    def compile_serialization_spec(self, use_select_related, user=None):
+        variant = self.get_serialization_spec_variant()
+        cache = projected_compiled_spec_cache if self.spec_projected else compiled_spec_cache
+        key = (type(self), id(self.serialization_spec), use_select_related, variant)
+        cached = cache.get(key)
+        # the spec itself is held by the entry so its id() cannot be reused while cached
+        if cached is not None and cached[0] is self.serialization_spec:
+            return cached[1]
+
+        compiled = compile_spec(self.queryset.model, self.serialization_spec, user, use_select_related)
+        if self.max_queries is not None:
+            self.check_planned_queries(compiled, user)
+        if compiled.reads_request_user and variant is None:
+            # planned for this user, and nothing says which other requests it would also be right for
+            return compiled
+        cache.set(key, (self.serialization_spec, compiled))
+        return compiled
+
+    def get_view_label(self):
+        return '%s.%s' % (type(self).__module__, type(self).__qualname__)
+
+    def check_planned_queries(self, compiled, user=None):
+        from .explain import explain_compiled_spec, get_query_paths
+
+        paths = get_query_paths(explain_compiled_spec(self.queryset.all(), compiled, user))
+        enforce_query_budget(self.get_view_label(), [path or ROOT_PATH for path in paths], self.max_queries, planned=True)
+
+    def fetch_instances(self, instance, many):
+        """ Evaluate what is about to be serialized, running any prefetches deferred by `get_queryset()` """
+        counter = QueryCounter()
+        if self.max_queries is None:
+            return self.run_fetches(instance, many, counter)
+
+        fetched_root = isinstance(instance, QuerySet)
+        with connections[self.queryset.db].execute_wrapper(counter):
+            instance = self.run_fetches(instance, many, counter)
+        # the root query has already been made by `get_object()` or `paginate_queryset()`, unless counted here
+        paths = ([] if fetched_root else [ROOT_PATH]) + counter.paths
+        enforce_query_budget(self.get_view_label(), paths, self.max_queries)
+        return instance
+
+    def run_fetches(self, instance, many, counter):
+        with using_identity_map(self.identity_map):
+            if isinstance(instance, QuerySet):
+                with self.timer.stage('fetch'), counter.fetching(ROOT_PATH):
+                    instance = list(instance)
+
+            instances = instance if many else [instance]
+            if self.identity_map is not None:
+                self.identity_map.resolve(instances, self.deferred_prefetches)
+
+            if self.prefetch_concurrency > 1:
+                # made on other threads, so not counted against `max_queries` as they are made
+                with self.timer.stage('prefetch'):
+                    prefetch_concurrently(instances, self.deferred_prefetches, self.prefetch_concurrency)
+            else:
+                for lookup in self.deferred_prefetches:
+                    path = getattr(lookup, 'prefetch_through', lookup)
+                    with self.timer.stage('prefetch.%s' % path), counter.fetching(path):
+                        prefetch_related_objects(instances, lookup)
+
+            with counter.fetching(PLUGINS_PATH):
+                prefetch_plugins(instances, self.get_compiled_spec().serialization_spec)
+        return instance
 
     def get_serializer_class(self):
         return make_serializer_class(self.queryset.model, self.serialization_spec)
 
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method != 'GET':
+            return super().get_serializer(*args, **kwargs)
+
+        many = kwargs.get('many', False)
+        if args:
+            args = (self.fetch_instances(args[0], many),) + args[1:]
+
+        if self.renders_encoded_output():
+            from .rendering import EncodedSerializer, compile_encoder
+
+            serializer = EncodedSerializer(
+                compile_encoder(self.queryset.model, self.serialization_spec),
+                args[0] if args else kwargs.get('instance'),
+                many=many
+            )
+        elif self.use_compiled_serializer:
+            serializer = CompiledSerializer(
+                compile_serializer(self.queryset.model, self.serialization_spec),
+                args[0] if args else kwargs.get('instance'),
+                many=many
+            )
+        else:
+            serializer = super().get_serializer(*args, **kwargs)
+
+        return timed_serializer(serializer, self.timer) if self.timer else serializer
+
+    def renders_encoded_output(self):
+        """ Whether the output goes to a `SpecJSONRenderer` which can take it already encoded as JSON """
+        from .rendering import SpecJSONRenderer
+
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return isinstance(renderer, SpecJSONRenderer) and renderer.can_encode(
+            self.request.accepted_media_type, self.get_renderer_context()
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.timer:
+            if hasattr(response, 'render') and not response.is_rendered:
+                with self.timer.stage('render'):
+                    response.render()
+            response['Server-Timing'] = self.timer.server_timing()
+            self.timings_recorded({
+                'view': self.get_view_label(),
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'stages': self.timer.as_milliseconds(),
+            })
+        return response
+
+    def timings_recorded(self, record):
+        """
+        Called with the timings for each request when `record_timings` is set. By default this
+        passes them to the function named by the `SERIALIZATION_SPEC_TIMINGS_HOOK` setting, if any
+        """
+        hook = getattr(settings, 'SERIALIZATION_SPEC_TIMINGS_HOOK', None)
+        if hook:
+            import_string(hook)(record)
+
 
 """
 serialization_spec type should be
@@ -0,0 +1,55 @@
+from itertools import islice
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .rendering import SpecJSONRenderer
+from .serialization import SerializationSpecMixin
+
+
+def iterate_chunks(queryset, chunk_size):
+    """
+    Yield lists of at most `chunk_size` instances, running the queryset's prefetches for each chunk
+    in turn, so only one chunk's worth of instances needs to be held in memory at a time
+    """
+    lookups = queryset._prefetch_related_lookups
+    iterator = queryset.prefetch_related(None).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, *lookups)
+        yield chunk
+        del chunk
+
+
+class StreamingSerializationSpecMixin(SerializationSpecMixin):
+    """
+    Streams an unpaginated list as a JSON array, fetching and serializing `stream_chunk_size`
+    root instances at a time. Use with `ListAPIView`.
+    """
+
+    stream_chunk_size = 1000
+    stream_renderer_class = JSONRenderer
+
+    def renders_encoded_output(self):
+        return issubclass(self.stream_renderer_class, SpecJSONRenderer) and self.stream_renderer_class().can_encode()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        renderer = self.stream_renderer_class()
+        return StreamingHttpResponse(self.stream(queryset, renderer), content_type=renderer.media_type)
+
+    def stream(self, queryset, renderer):
+        yield b'['
+        separator = b''
+        for chunk in iterate_chunks(queryset, self.stream_chunk_size):
+            # streamed after `dispatch()` has returned, so bound to the request again for each chunk
+            with self.binding_request_user():
+                # strip the brackets from each rendered chunk so they join into one array
+                content = renderer.render(self.get_serializer(chunk, many=True).data)[1:-1]
+            # release the chunk's instances before the next one is fetched
+            del chunk
+            yield separator + content
+            separator = b','
+        yield b']'
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class StageTimer:
+    """
+    Accumulates wall time per named stage. Stages may be nested, in which case the
+    outer stage is only charged for the time not spent in the inner ones.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()  # type: OrderedDict
+        self._stack = []  # type: list
+
+    @contextmanager
+    def stage(self, name):
+        start = perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            nested = self._stack.pop()
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - nested
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def as_milliseconds(self):
+        return OrderedDict((name, seconds * 1000) for name, seconds in self.stages.items())
+
+    def server_timing(self):
+        """ The value for a `Server-Timing` response header """
+        return ', '.join('%s;dur=%.3f' % (name, ms) for name, ms in self.as_milliseconds().items())
+
+
+class NullTimer:
+    """ Stands in for a `StageTimer` when timings are not being recorded """
+
+    def stage(self, name):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def __bool__(self):
+        return False
+
+
+NULL_TIMER = NullTimer()
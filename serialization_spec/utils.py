@@ -4,3 +4,18 @@ def extend_queryset(queryset, fields):
     existing_set = set(existing)
     existing_set.update(fields)
     queryset.query.deferred_loading = (frozenset(existing_set), defer)
+
+
+def prefixed(path, name):
+    return '%s__%s' % (path, name) if path else name
+
+
+def extend_joined_queryset(queryset, path, fields):
+    """
+    Extend an already-`.only()`d queryset with more fields of the model it joins with `select_related(path)`.
+    Unless `.only()` names some of that model's own fields, it loads all of them already.
+    """
+    prefix = path + '__'
+    existing = queryset.query.deferred_loading[0]
+    if any(name.startswith(prefix) and '__' not in name[len(prefix):] for name in existing):
+        extend_queryset(queryset, {prefix + field for field in fields})
@@ -0,0 +1,255 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from rest_framework import fields
+from rest_framework.relations import RelatedField
+
+from .plugins import SerializationSpecPluginModel
+from .relations import get_model_index
+from .serialization import (
+    Filtered, Limited, ManyToManyIDsPlugin, SerializationSpecMixin, SerializationSpecPlugin, apply_filters, bind_plugin,
+    binding_request_user, compiled_spec_cache, get_limit_ordering, get_serialization_spec, limit_per_parent,
+    make_serializer_class,
+)
+
+"""
+Fetch a serialization spec with `.values()` queries, stitching the nested dicts together
+without ever instantiating model objects:
+
+1. the root query selects the root's columns, plus those of to-one relations which can be joined
+2. every other relation is fetched by a query per level, keyed by the parent's id
+3. raw to-many fields become lists of ids, as with `ManyToManyIDsPlugin`
+4. each column is represented as the serializer's field for it would, eg. decimals as strings
+
+Only annotation plugins (`CountOf`, `Exists` and other `SerializationSpecPluginModel`s) can be
+used, as other plugins need model instances to derive their values from.
+"""
+
+PARENT = '_parent'
+
+
+# the database already gives values which these leave as they are
+PLAIN_REPRESENTATIONS = {
+    fields.CharField.to_representation,
+    fields.IntegerField.to_representation,
+    fields.BooleanField.to_representation,
+    fields.ReadOnlyField.to_representation,
+}
+
+
+def get_representation(model, field_name):
+    """ The `to_representation()` of the field a serializer of `model` has for `field_name`, or None if it is not needed """
+    field = make_serializer_class(model, [field_name])().fields[field_name]
+    if isinstance(field, RelatedField) or type(field).to_representation in PLAIN_REPRESENTATIONS:
+        # a related field is represented by the primary key, which is what values() gives
+        return None
+    return field.to_representation
+
+
+class Row:
+    """ Lets plugins read a values() row as they would an instance """
+
+    def __init__(self, row):
+        self.__dict__.update(row)
+
+
+def is_joinable(relations, field_name, serialization_spec):
+    if relations[field_name].to_many or not isinstance(serialization_spec, list):
+        return False
+    related_relations = get_model_index(relations[field_name].related_model).relations
+    for each in serialization_spec:
+        if isinstance(each, dict):
+            for key, childspec in each.items():
+                if isinstance(childspec, SerializationSpecPlugin):
+                    return False
+                if isinstance(childspec, Filtered):
+                    if childspec.filters is not None:
+                        return False
+                    key, childspec = childspec.field_name or key, childspec.serialization_spec
+                if childspec is not None and not is_joinable(related_relations, key, childspec):
+                    return False
+        elif each in related_relations and related_relations[each].to_many:
+            return False
+    return True
+
+
+class ValuesLevel:
+    """ One `.values()` query, and how to turn its rows into output dicts """
+
+    def __init__(self, model, serialization_spec, filters=None, link=None, many=True, limited=None):
+        self.model = model
+        self.filters = filters
+        self.limited = limited
+        self.link = link
+        self.many = many
+        self.columns = ['pk']
+        self.plugins = []  # type: list
+        self.children = []  # type: list
+        self.readers = self.plan(model, '', serialization_spec)
+
+    def plan(self, model, prefix, serialization_spec):
+        relations = get_model_index(model).relations
+        readers = []
+
+        for each in serialization_spec:
+            if not isinstance(each, dict):
+                if each in relations and relations[each].to_many:
+                    readers.append((each, self.add_ids(model, prefix, each)))
+                else:
+                    readers.append((each, self.add_column(prefix + each, get_representation(model, each))))
+                continue
+
+            for key, childspec in each.items():
+                if isinstance(childspec, ManyToManyIDsPlugin):
+                    # a raw to-many field which has already been bound by `bind_spec()`
+                    readers.append((key, self.add_ids(model, prefix, key)))
+                    continue
+
+                if isinstance(childspec, SerializationSpecPlugin):
+                    if prefix or not isinstance(childspec, SerializationSpecPluginModel):
+                        raise ImproperlyConfigured('%s cannot be fetched with values()' % childspec.__class__.__name__)
+                    plugin = bind_plugin(childspec, key)
+                    self.plugins.append(plugin)
+                    self.add_column(plugin.get_name())
+                    readers.append((key, self.read_plugin(plugin)))
+                    continue
+
+                field_name, filters, limited = key, None, None
+                if isinstance(childspec, Limited):
+                    limited = childspec
+                if isinstance(childspec, Filtered):
+                    field_name, filters = childspec.field_name or key, childspec.filters
+                    childspec = childspec.serialization_spec
+                    if childspec is None:
+                        readers.append((key, self.add_column(prefix + field_name)))
+                        continue
+
+                relation = relations[field_name]
+                if limited is not None and not relation.reverse_fk:
+                    raise ImproperlyConfigured('Limited can only be fetched with values() on a reverse foreign key')
+                if filters is None and limited is None and is_joinable(relations, field_name, childspec):
+                    joined_prefix = prefix + field_name + '__'
+                    self.add_column(joined_prefix + 'pk')
+                    readers.append((key, self.read_joined(joined_prefix + 'pk', self.plan(relation.related_model, joined_prefix, childspec))))
+                elif relation.to_many or relation.reverse:
+                    child = ValuesLevel(relation.related_model, childspec, filters, link=relation.remote_name, many=relation.to_many, limited=limited)
+                    readers.append((key, self.add_child(child, prefix + 'pk')))
+                else:
+                    child = ValuesLevel(relation.related_model, childspec, filters, link='pk', many=False)
+                    readers.append((key, self.add_child(child, prefix + field_name)))
+
+        return readers
+
+    def add_column(self, column, represent=None):
+        if column not in self.columns:
+            self.columns.append(column)
+        if represent is None:
+            return lambda row, children: row[column]
+
+        def read(row, children):
+            value = row[column]
+            return None if value is None else represent(value)
+        return read
+
+    def add_child(self, child, parent_column, ids=False):
+        self.add_column(parent_column)
+        self.children.append((child, parent_column, ids))
+        index = len(self.children) - 1
+        empty = [] if child.many else None
+        return lambda row, children: children[index].get(row[parent_column], empty)
+
+    def add_ids(self, model, prefix, field_name):
+        relation = get_model_index(model).relations[field_name]
+        child = ValuesLevel(relation.related_model, ['pk'], link=relation.remote_name)
+        return self.add_child(child, prefix + 'pk', ids=True)
+
+    def read_plugin(self, plugin):
+        return lambda row, children: plugin.get_value(Row(row))
+
+    def read_joined(self, pk_column, readers):
+        def read(row, children):
+            if row[pk_column] is None:
+                return None
+            return {key: reader(row, children) for key, reader in readers}
+        return read
+
+    def values_queryset(self, queryset, user=None):
+        with binding_request_user(lambda: user):
+            for plugin in self.plugins:
+                queryset = plugin.modify_queryset(queryset)
+        if self.link is not None:
+            return queryset.values(*self.columns, **{PARENT: F(self.link)})
+        return queryset.values(*self.columns)
+
+    def fetch(self, parent_ids, user=None):
+        queryset = self.model._default_manager.all()
+        if self.filters:
+            queryset = apply_filters(queryset, self.filters)
+        if self.limited is not None:
+            ordering = get_limit_ordering(self.model, self.limited.ordering)
+            queryset = limit_per_parent(queryset, self.link, ordering, self.limited.limit)
+        queryset = queryset.filter(**{'%s__in' % self.link: parent_ids})
+        return list(self.values_queryset(queryset, user))
+
+    def stitch(self, rows, user=None):
+        children = []
+        for child, parent_column, ids in self.children:
+            parent_ids = {row[parent_column] for row in rows} - {None}
+            child_rows = child.fetch(parent_ids, user) if parent_ids else []
+            if ids:
+                outputs = [str(row['pk']) for row in child_rows]
+            else:
+                outputs = child.stitch(child_rows, user)
+
+            by_parent = {}  # type: dict
+            for row, output in zip(child_rows, outputs):
+                if child.many:
+                    by_parent.setdefault(row[PARENT], []).append(output)
+                else:
+                    by_parent[row[PARENT]] = output
+            children.append(by_parent)
+
+        return [
+            {key: reader(row, children) for key, reader in self.readers}
+            for row in rows
+        ]
+
+
+def fetch_values(queryset, serialization_spec, user=None):
+    """ Fetch the data for a spec as a list of dicts, without instantiating any models """
+    level = ValuesLevel(queryset.model, serialization_spec)
+    with binding_request_user(lambda: user):
+        return level.stitch(list(level.values_queryset(queryset, user)), user)
+
+
+class ValuesResult:
+    """ Stands in for a serializer instance, as the data has already been built """
+
+    def __init__(self, data):
+        self.data = data
+
+
+class ValuesSerializationSpecMixin(SerializationSpecMixin):
+    """ Fetches with `fetch_values()` instead of prefetching model instances, for read-only views """
+
+    def get_values_level(self):
+        key = (type(self), id(self.serialization_spec), 'values', self.get_serialization_spec_variant())
+        cached = compiled_spec_cache.get(key)
+        if cached is not None and cached[0] is self.serialization_spec:
+            return cached[1]
+
+        level = ValuesLevel(self.queryset.model, self.serialization_spec)
+        compiled_spec_cache.set(key, (self.serialization_spec, level))
+        return level
+
+    def get_queryset(self):
+        self.serialization_spec = get_serialization_spec(self)
+        if self.serialization_spec is None:
+            raise ImproperlyConfigured('SerializationSpecMixin requires serialization_spec or get_serialization_spec')
+
+        return self.get_values_level().values_queryset(self.queryset, self.request.user)
+
+    def get_serializer(self, *args, **kwargs):
+        instance = args[0] if args else kwargs.get('instance')
+        many = kwargs.get('many', False)
+        data = self.get_values_level().stitch(list(instance) if many else [instance], self.request.user)
+        return ValuesResult(data if many else data[0])
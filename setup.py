@@ -19,7 +19,9 @@ download_url = 'https://github.com/dabapps/django-rest-framework-serialization-s
 install_requires = [
     'Django>=1.11',
     'djangorestframework>=3.5.3',
-    'django-zen-queries>=1.0.0'
+    'django-zen-queries>=1.0.0',
+    'asgiref>=3.2.10',
+    'contextvars>=2.4;python_version<"3.7"',
 ]
 
 def get_version(package):
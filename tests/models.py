@@ -76,3 +76,11 @@ class Student(Entity):
 
     def __str__(self):
         return self.name
+
+
+class Fee(Entity):
+    name = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+
+    def __str__(self):
+        return self.name
@@ -1,5 +1,5 @@
-import django
 import json
+import re
 from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase
 from rest_framework.test import APIClient
@@ -17,6 +17,8 @@ def django_version_compat(captured_queries):
             query["sql"] = query["sql"].replace(" LIMIT 21", "")
         if "  LIMIT" in query["sql"]:
             query["sql"] = query["sql"].replace("  LIMIT", " LIMIT")
+        # Before Django 3.0 the outer column of a correlated subquery is parenthesised
+        query["sql"] = re.sub(r'= \(("\w+"\."\w+")\)', r'= \1', query["sql"])
         return query
     return [fix_query(query) for query in captured_queries]
 
@@ -91,7 +93,7 @@ class DetailViewTestCase(SerializationSpecTestCase):
             sorted(query['sql'] for query in django_version_compat(capture.captured_queries)),
             [
                 """SELECT "tests_class"."id", "tests_class"."name", "tests_class"."teacher_id" FROM "tests_class" WHERE "tests_class"."teacher_id" IN ('00000000000000000000000000000002') ORDER BY "tests_class"."id" ASC""",
-                """SELECT "tests_teacher"."id", "tests_teacher"."name", "tests_teacher"."school_id", "tests_school"."id", "tests_school"."created", "tests_school"."modified", "tests_school"."name", "tests_school"."lea_id" FROM "tests_teacher" INNER JOIN "tests_school" ON ("tests_teacher"."school_id" = "tests_school"."id") WHERE "tests_teacher"."id" = '00000000000000000000000000000002'""",
+                """SELECT "tests_teacher"."id", "tests_teacher"."name", "tests_teacher"."school_id", "tests_school"."id", "tests_school"."name" FROM "tests_teacher" INNER JOIN "tests_school" ON ("tests_teacher"."school_id" = "tests_school"."id") WHERE "tests_teacher"."id" = '00000000000000000000000000000002'""",
             ]
         )
 
@@ -150,7 +152,7 @@ class DetailViewTestCase(SerializationSpecTestCase):
         self.assertJsonEqual(
             sorted(query['sql'] for query in django_version_compat(capture.captured_queries)),
             [
-                """SELECT "tests_class"."id", "tests_class"."name", "tests_class"."teacher_id", "tests_teacher"."id", "tests_teacher"."created", "tests_teacher"."modified", "tests_teacher"."name", "tests_teacher"."school_id", "tests_school"."id", "tests_school"."created", "tests_school"."modified", "tests_school"."name", "tests_school"."lea_id" FROM "tests_class" INNER JOIN "tests_teacher" ON ("tests_class"."teacher_id" = "tests_teacher"."id") INNER JOIN "tests_school" ON ("tests_teacher"."school_id" = "tests_school"."id") WHERE "tests_class"."id" = '00000000000000000000000000000006'""",
+                """SELECT "tests_class"."id", "tests_class"."name", "tests_class"."teacher_id", "tests_teacher"."id", "tests_teacher"."name", "tests_teacher"."school_id", "tests_school"."id", "tests_school"."name" FROM "tests_class" INNER JOIN "tests_teacher" ON ("tests_class"."teacher_id" = "tests_teacher"."id") INNER JOIN "tests_school" ON ("tests_teacher"."school_id" = "tests_school"."id") WHERE "tests_class"."id" = '00000000000000000000000000000006'""",
                 """SELECT ("tests_student_classes"."class_id") AS "_prefetch_related_val_class_id", "tests_student"."id", "tests_student"."name" FROM "tests_student" INNER JOIN "tests_student_classes" ON ("tests_student"."id" = "tests_student_classes"."student_id") WHERE "tests_student_classes"."class_id" IN ('00000000000000000000000000000006') ORDER BY "tests_student"."id" ASC"""
             ]
         )
@@ -179,7 +181,7 @@ class DetailViewTestCase(SerializationSpecTestCase):
         self.assertJsonEqual(
             sorted(query['sql'] for query in django_version_compat(capture.captured_queries)),
             [
-                """SELECT "tests_class"."id", "tests_class"."subject_id", "tests_class"."name", "tests_class"."teacher_id", "tests_teacher"."id", "tests_teacher"."created", "tests_teacher"."modified", "tests_teacher"."name", "tests_teacher"."school_id" FROM "tests_class" INNER JOIN "tests_teacher" ON ("tests_class"."teacher_id" = "tests_teacher"."id") WHERE "tests_class"."subject_id" IN ('00000000000000000000000000000004') ORDER BY "tests_class"."id" ASC""",
+                """SELECT "tests_class"."id", "tests_class"."subject_id", "tests_class"."name", "tests_class"."teacher_id", "tests_teacher"."id", "tests_teacher"."name" FROM "tests_class" INNER JOIN "tests_teacher" ON ("tests_class"."teacher_id" = "tests_teacher"."id") WHERE "tests_class"."subject_id" IN ('00000000000000000000000000000004') ORDER BY "tests_class"."id" ASC""",
                 """SELECT "tests_subject"."id", "tests_subject"."name" FROM "tests_subject" WHERE "tests_subject"."id" = '00000000000000000000000000000004'""",
             ]
         )
@@ -208,7 +210,7 @@ class DetailViewTestCase(SerializationSpecTestCase):
             sorted(query['sql'] for query in django_version_compat(capture.captured_queries)),
             [
                 """SELECT "tests_school"."id", "tests_school"."name", "tests_school"."lea_id" FROM "tests_school" WHERE "tests_school"."lea_id" IN ('00000000000000000000000000000000') ORDER BY "tests_school"."id" ASC""",
-                """SELECT "tests_school"."id", "tests_school"."name", "tests_school"."lea_id", "tests_lea"."id", "tests_lea"."created", "tests_lea"."modified", "tests_lea"."name" FROM "tests_school" INNER JOIN "tests_lea" ON ("tests_school"."lea_id" = "tests_lea"."id") WHERE "tests_school"."id" = '00000000000000000000000000000001'""",
+                """SELECT "tests_school"."id", "tests_school"."name", "tests_school"."lea_id", "tests_lea"."id", "tests_lea"."name" FROM "tests_school" INNER JOIN "tests_lea" ON ("tests_school"."lea_id" = "tests_lea"."id") WHERE "tests_school"."id" = '00000000000000000000000000000001'""",
             ]
         )
 
@@ -239,7 +241,7 @@ class DetailViewTestCase(SerializationSpecTestCase):
         self.assertJsonEqual(
             sorted(query['sql'] for query in django_version_compat(capture.captured_queries)),
             [
-                """SELECT "tests_assignmentstudent"."id", "tests_assignmentstudent"."is_complete", "tests_assignmentstudent"."assignment_id", "tests_assignmentstudent"."student_id", "tests_assignment"."id", "tests_assignment"."created", "tests_assignment"."modified", "tests_assignment"."name", "tests_assignment"."clasz_id" FROM "tests_assignmentstudent" INNER JOIN "tests_assignment" ON ("tests_assignmentstudent"."assignment_id" = "tests_assignment"."id") WHERE "tests_assignmentstudent"."student_id" IN ('00000000000000000000000000000015') ORDER BY "tests_assignmentstudent"."id" ASC""",
+                """SELECT "tests_assignmentstudent"."id", "tests_assignmentstudent"."is_complete", "tests_assignmentstudent"."assignment_id", "tests_assignmentstudent"."student_id", "tests_assignment"."id", "tests_assignment"."name" FROM "tests_assignmentstudent" INNER JOIN "tests_assignment" ON ("tests_assignmentstudent"."assignment_id" = "tests_assignment"."id") WHERE "tests_assignmentstudent"."student_id" IN ('00000000000000000000000000000015') ORDER BY "tests_assignmentstudent"."id" ASC""",
                 """SELECT "tests_student"."id", "tests_student"."name" FROM "tests_student" WHERE "tests_student"."id" = '00000000000000000000000000000015'""",
                 """SELECT ("tests_assignmentstudent"."student_id") AS "_prefetch_related_val_student_id", "tests_assignment"."id", "tests_assignment"."name" FROM "tests_assignment" INNER JOIN "tests_assignmentstudent" ON ("tests_assignment"."id" = "tests_assignmentstudent"."assignment_id") WHERE "tests_assignmentstudent"."student_id" IN ('00000000000000000000000000000015') ORDER BY "tests_assignment"."id" ASC""",
             ]
@@ -269,26 +271,14 @@ class DetailViewTestCase(SerializationSpecTestCase):
             url = reverse('assignment-detail', kwargs={'id': str(self.assignment.id)})
             response = self.client.get(url)
 
-        if django.VERSION >= (3, 1, 0):
-            self.assertJsonEqual(
-                sorted(query['sql'] for query in django_version_compat(capture.captured_queries)),
-                [
-                    """SELECT "tests_assignment"."id", "tests_assignment"."name", "tests_assignment"."clasz_id" FROM "tests_assignment" WHERE "tests_assignment"."id" = '00000000000000000000000000000020'""",
-                    """SELECT "tests_class"."id", "tests_class"."name", "tests_class"."teacher_id", COUNT(DISTINCT "tests_student_classes"."student_id") AS "student_count", "tests_teacher"."id", "tests_teacher"."created", "tests_teacher"."modified", "tests_teacher"."name", "tests_teacher"."school_id" FROM "tests_class" LEFT OUTER JOIN "tests_student_classes" ON ("tests_class"."id" = "tests_student_classes"."class_id") INNER JOIN "tests_teacher" ON ("tests_class"."teacher_id" = "tests_teacher"."id") WHERE "tests_class"."id" IN ('00000000000000000000000000000006') GROUP BY "tests_class"."id", "tests_class"."name", "tests_class"."teacher_id", "tests_teacher"."id", "tests_teacher"."created", "tests_teacher"."modified", "tests_teacher"."name", "tests_teacher"."school_id\"""",
-                    """SELECT ("tests_assignmentstudent"."assignment_id") AS "_prefetch_related_val_assignment_id", "tests_student"."id", "tests_student"."name", COUNT(DISTINCT "tests_student_classes"."class_id") AS "classes_count" FROM "tests_student" LEFT OUTER JOIN "tests_student_classes" ON ("tests_student"."id" = "tests_student_classes"."student_id") INNER JOIN "tests_assignmentstudent" ON ("tests_student"."id" = "tests_assignmentstudent"."student_id") WHERE "tests_assignmentstudent"."assignment_id" IN ('00000000000000000000000000000020') GROUP BY ("tests_assignmentstudent"."assignment_id"), "tests_student"."id", "tests_student"."name\"""",
-                    """SELECT ("tests_student_classes"."student_id") AS "_prefetch_related_val_student_id", "tests_class"."id" FROM "tests_class" INNER JOIN "tests_student_classes" ON ("tests_class"."id" = "tests_student_classes"."class_id") WHERE "tests_student_classes"."student_id" IN ('00000000000000000000000000000015') ORDER BY "tests_class"."id" ASC""",
-                ]
-            )
-        else:
-            self.assertJsonEqual(
-                sorted(query['sql'] for query in django_version_compat(capture.captured_queries)),
-                [
-                    """SELECT "tests_assignment"."id", "tests_assignment"."name", "tests_assignment"."clasz_id" FROM "tests_assignment" WHERE "tests_assignment"."id" = '00000000000000000000000000000020'""",
-                    """SELECT "tests_class"."id", "tests_class"."name", "tests_class"."teacher_id", COUNT(DISTINCT "tests_student_classes"."student_id") AS "student_count", "tests_teacher"."id", "tests_teacher"."created", "tests_teacher"."modified", "tests_teacher"."name", "tests_teacher"."school_id" FROM "tests_class" LEFT OUTER JOIN "tests_student_classes" ON ("tests_class"."id" = "tests_student_classes"."class_id") INNER JOIN "tests_teacher" ON ("tests_class"."teacher_id" = "tests_teacher"."id") WHERE "tests_class"."id" IN ('00000000000000000000000000000006') GROUP BY "tests_class"."id", "tests_class"."name", "tests_class"."teacher_id", "tests_teacher"."id", "tests_teacher"."created", "tests_teacher"."modified", "tests_teacher"."name", "tests_teacher"."school_id" ORDER BY "tests_class"."id" ASC""",
-                    """SELECT ("tests_assignmentstudent"."assignment_id") AS "_prefetch_related_val_assignment_id", "tests_student"."id", "tests_student"."name", COUNT(DISTINCT "tests_student_classes"."class_id") AS "classes_count" FROM "tests_student" LEFT OUTER JOIN "tests_student_classes" ON ("tests_student"."id" = "tests_student_classes"."student_id") INNER JOIN "tests_assignmentstudent" ON ("tests_student"."id" = "tests_assignmentstudent"."student_id") WHERE "tests_assignmentstudent"."assignment_id" IN ('00000000000000000000000000000020') GROUP BY ("tests_assignmentstudent"."assignment_id"), "tests_student"."id", "tests_student"."name" ORDER BY "tests_student"."id" ASC""",
-                    """SELECT ("tests_student_classes"."student_id") AS "_prefetch_related_val_student_id", "tests_class"."id" FROM "tests_class" INNER JOIN "tests_student_classes" ON ("tests_class"."id" = "tests_student_classes"."class_id") WHERE "tests_student_classes"."student_id" IN ('00000000000000000000000000000015') ORDER BY "tests_class"."id" ASC""",
-                ]
-            )
+        self.assertJsonEqual(
+            sorted(query['sql'] for query in django_version_compat(capture.captured_queries)),
+            [
+                """SELECT "tests_assignment"."id", "tests_assignment"."name", "tests_assignment"."clasz_id", COALESCE((SELECT COUNT(DISTINCT U0."student_id") AS "student_count" FROM "tests_student_classes" U0 WHERE U0."class_id" = "tests_assignment"."clasz_id" GROUP BY U0."class_id"), 0) AS "clasz__student_count", "tests_class"."id", "tests_class"."name", "tests_class"."teacher_id", "tests_teacher"."id", "tests_teacher"."name" FROM "tests_assignment" INNER JOIN "tests_class" ON ("tests_assignment"."clasz_id" = "tests_class"."id") INNER JOIN "tests_teacher" ON ("tests_class"."teacher_id" = "tests_teacher"."id") WHERE "tests_assignment"."id" = '00000000000000000000000000000020'""",
+                """SELECT "tests_student_classes"."student_id", "tests_student_classes"."class_id" FROM "tests_student_classes" WHERE "tests_student_classes"."student_id" IN ('00000000000000000000000000000015') ORDER BY "tests_student_classes"."class_id" ASC""",
+                """SELECT ("tests_assignmentstudent"."assignment_id") AS "_prefetch_related_val_assignment_id", "tests_student"."id", "tests_student"."name", COALESCE((SELECT COUNT(DISTINCT U0."class_id") AS "classes_count" FROM "tests_student_classes" U0 WHERE U0."student_id" = "tests_student"."id" GROUP BY U0."student_id"), 0) AS "classes_count" FROM "tests_student" INNER JOIN "tests_assignmentstudent" ON ("tests_student"."id" = "tests_assignmentstudent"."student_id") WHERE "tests_assignmentstudent"."assignment_id" IN ('00000000000000000000000000000020') ORDER BY "tests_student"."id" ASC""",
+            ]
+        )
 
         self.assertJsonEqual(response.data, {
             "id": uuid("20"),
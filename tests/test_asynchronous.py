@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from unittest import skipUnless
+
+from asgiref.sync import sync_to_async
+import django
+from django.test import override_settings
+from rest_framework import generics
+
+from serialization_spec.asynchronous import AsyncSerializationSpecMixin
+from serialization_spec.budget import QueryBudgetExceeded
+from serialization_spec.serialization import SerializationSpecPlugin
+from .test_api import SerializationSpecTestCase, uuid
+from .models import AssignmentStudent, Student, Teacher
+from . import views
+
+try:
+    from django.test import AsyncRequestFactory
+except ImportError:  # Django < 3.1
+    AsyncRequestFactory = None
+
+
+def make_async(view_class, **attrs):
+    return type('Async%s' % view_class.__name__, (AsyncSerializationSpecMixin, view_class), attrs)
+
+
+class ThreadName(SerializationSpecPlugin):
+    def get_value(self, instance):
+        return threading.current_thread().name
+
+
+class StudentTotal(SerializationSpecPlugin):
+    """ Makes a query of its own, which is not in the plan """
+
+    def get_values(self, instances):
+        total = Student.objects.count()
+        return [total for instance in instances]
+
+
+@skipUnless(django.VERSION >= (3, 1), 'async views and AsyncRequestFactory need Django 3.1')
+class AsyncViewTestCase(SerializationSpecTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+
+    async def test_views_are_coroutines(self):
+        view = make_async(views.TeacherDetailView).as_view()
+
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        self.assertTrue(view.csrf_exempt)
+
+    async def test_detail(self):
+        view = make_async(views.ClassDetailView).as_view()
+        response = await view(self.factory.get('/'), id=str(self.math_class.id))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertJsonEqual(response.data, {
+            'id': uuid('6'),
+            'name': 'Math B',
+            'teacher': {'id': uuid('2'), 'name': 'Mr Cat', 'school': {'id': uuid('1'), 'name': 'Kitteh High'}},
+            'student_set': [{'name': 'Student %d' % idx} for idx in range(3, 10)],
+        })
+
+    async def test_detail_not_found(self):
+        view = make_async(views.ClassDetailView).as_view()
+        response = await view(self.factory.get('/'), id=str(uuid('99')))
+
+        self.assertEqual(response.status_code, 404)
+
+    async def test_paginated_list(self):
+        view = make_async(views.TeacherListView).as_view()
+        response = await view(self.factory.get('/'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([teacher['name'] for teacher in response.data['results']], ['Mr Cat', 'Ms Dog'])
+        self.assertEqual([each['name'] for each in response.data['results'][0]['class_set']], ['French A', 'Math B'])
+
+    async def test_unpaginated_list_with_raw_ids(self):
+        view = make_async(generics.ListAPIView, queryset=Teacher.objects.order_by('name'), pagination_class=None, serialization_spec=[
+            'name',
+            'class_set',
+        ]).as_view()
+        response = await view(self.factory.get('/'))
+
+        self.assertJsonEqual(response.data, [
+            {'name': 'Mr Cat', 'class_set': [uuid('5'), uuid('6')]},
+            {'name': 'Ms Dog', 'class_set': []},
+        ])
+
+    async def test_serializes_off_the_event_loop(self):
+        view = make_async(views.TeacherDetailView, serialization_spec=['name', {'thread': ThreadName()}]).as_view()
+        response = await view(self.factory.get('/'), id=str(self.teacher.id))
+
+        self.assertNotEqual(response.data['thread'], threading.current_thread().name)
+        self.assertTrue(response.is_rendered)
+
+    async def test_timings(self):
+        view = make_async(views.ClassDetailView, record_timings=True).as_view()
+        response = await view(self.factory.get('/'), id=str(self.math_class.id))
+
+        stages = [each.split(';')[0] for each in response['Server-Timing'].split(', ')]
+        self.assertEqual(stages, ['plan', 'fetch', 'prefetch.student_set', 'serialize', 'render'])
+
+    async def test_identity_map(self):
+        view = make_async(
+            generics.ListAPIView,
+            queryset=Student.objects.all(),
+            pagination_class=None,
+            serialization_spec=views.StudentWithAssignmentsDetailView.serialization_spec,
+            use_identity_map=True,
+        ).as_view()
+        response = await view(self.factory.get('/'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.renderer_context['view'].identity_map.resolved, await sync_to_async(AssignmentStudent.objects.count)())
+
+    @override_settings(SERIALIZATION_SPEC_STRICT_QUERY_BUDGET=True)
+    async def test_queries_made_over_budget(self):
+        view = make_async(generics.ListAPIView, queryset=Teacher.objects.order_by('name'), pagination_class=None, max_queries=2, serialization_spec=[
+            'name',
+            {'class_set': ['name', {'total': StudentTotal()}]},
+        ]).as_view()
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'made 3 queries, over its max_queries of 2: the 3rd is for (plugins)'):
+            await view(self.factory.get('/'))
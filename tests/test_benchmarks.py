@@ -0,0 +1,16 @@
+from django.test import TestCase
+
+from benchmarks.run import run
+
+
+class BenchmarkSmokeTestCase(TestCase):
+
+    def test_runs_scenarios(self):
+        results = run([1], repeat=1, only='TeacherListView')
+
+        [result] = results
+        self.assertEqual(result['scenario'], 'TeacherListView')
+        self.assertEqual(result['rows'], result['dataset']['teachers'])
+        self.assertEqual(result['queries'], 3)
+        self.assertEqual(set(result['timings']), {'plan', 'fetch', 'serialize', 'render', 'total', 'direct_render'})
+        self.assertGreater(result['peak_memory_kb'], 0)
@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import CharField, Value
+from django.test import TransactionTestCase
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from serialization_spec.rendering import SpecJSONRenderer
+from serialization_spec.serialization import (
+    BoundSpec, ManyToManyIDsPlugin, SerializationSpecMixin, SerializationSpecPlugin, bind_spec, compile_spec,
+)
+from .test_api import SerializationSpecTestCase
+from .models import Class, Teacher
+
+
+class AnnotatedViewer(SerializationSpecPlugin):
+    """ Annotates the user onto the queryset when the spec is applied to it """
+
+    def modify_queryset(self, queryset):
+        return queryset.annotate(**{'%s_username' % self.key: Value(self.request_user.username, output_field=CharField())})
+
+    def get_value(self, instance):
+        return getattr(instance, '%s_username' % self.key)
+
+
+class Viewer(SerializationSpecPlugin):
+    def get_value(self, instance):
+        return self.request_user.username
+
+
+annotated_viewer = AnnotatedViewer()
+viewer = Viewer()
+
+
+class ClassViewerListView(SerializationSpecMixin, generics.ListAPIView):
+    queryset = Class.objects.order_by('name')
+    pagination_class = None
+    prefetch_concurrency = 2
+    serialization_spec = [
+        'name',
+        'student_set',
+        {'annotated_viewer': annotated_viewer},
+        {'teacher': [
+            'name',
+            {'viewer': viewer},
+            # applied to the prefetch queryset, which is planned when the spec is compiled
+            {'annotated_viewer': annotated_viewer},
+        ]},
+    ]
+
+
+class BindSpecTestCase(SerializationSpecTestCase):
+
+    def test_leaves_declared_spec_alone(self):
+        spec = ['name', 'class_set', {'viewer': viewer}, {'school': ['name', {'viewer': viewer}]}]
+
+        bound = bind_spec(Teacher, spec)
+        compile_spec(Teacher, spec)
+
+        self.assertEqual(spec, ['name', 'class_set', {'viewer': viewer}, {'school': ['name', {'viewer': viewer}]}])
+        self.assertFalse(hasattr(viewer, 'key'))
+        self.assertIsInstance(bound, BoundSpec)
+        self.assertIs(bind_spec(Teacher, spec), bound)
+        self.assertIs(bind_spec(Teacher, bound), bound)
+        self.assertIsInstance(bound[1]['class_set'], ManyToManyIDsPlugin)
+        self.assertEqual(bound[2]['viewer'].key, 'viewer')
+        self.assertIsNot(bound[2]['viewer'], viewer)
+
+
+class ConcurrentRequestsTestCase(TransactionTestCase):
+
+    setUp = SerializationSpecTestCase.setUp
+
+    def get(self, view_class, user):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=user)
+        try:
+            response = view_class.as_view()(request)
+            response.render()
+            self.assertEqual(response.status_code, 200)
+            return user.username, json.loads(response.content.decode())
+        finally:
+            # each worker thread has its own connections, which are not closed at the end of the request
+            connections.close_all()
+
+    def test_each_request_sees_its_own_user(self):
+        users = [User.objects.create(username='user%d' % i) for i in range(8)]
+        view_classes = [
+            ClassViewerListView,
+            type('CompiledClassViewerListView', (ClassViewerListView,), {'use_compiled_serializer': True}),
+            type('EncodedClassViewerListView', (ClassViewerListView,), {'renderer_classes': [SpecJSONRenderer]}),
+        ]
+        declared = list(ClassViewerListView.serialization_spec)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [
+                executor.submit(self.get, view_class, user)
+                for _ in range(4) for view_class in view_classes for user in users
+            ]
+            results = [future.result() for future in futures]
+
+        self.assertEqual(len(results), 96)
+        for username, data in results:
+            self.assertEqual(len(data), 2)
+            for each in data:
+                self.assertEqual(each['annotated_viewer'], username)
+                self.assertEqual(each['teacher']['viewer'], username)
+                self.assertEqual(each['teacher']['annotated_viewer'], username)
+                self.assertEqual(len(each['student_set']), 7)
+
+        self.assertEqual(ClassViewerListView.serialization_spec, declared)
+        self.assertEqual(declared[1], 'student_set')
+        self.assertEqual(vars(annotated_viewer), {})
+        self.assertEqual(vars(viewer), {})
@@ -0,0 +1,79 @@
+from django.test import override_settings
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory
+
+from serialization_spec.budget import QueryBudgetExceeded
+from serialization_spec.serialization import SerializationSpecMixin, SerializationSpecPlugin
+from .test_api import SerializationSpecTestCase
+from .models import Student, Teacher
+
+
+class StudentTotal(SerializationSpecPlugin):
+    """ Makes a query of its own, which is not in the plan """
+
+    def get_values(self, instances):
+        total = Student.objects.count()
+        return [total for instance in instances]
+
+
+def make_view(spec, max_queries):
+    return type('TeacherBudgetListView', (SerializationSpecMixin, generics.ListAPIView), {
+        'queryset': Teacher.objects.order_by('name'),
+        'pagination_class': None,
+        'serialization_spec': spec,
+        'max_queries': max_queries,
+    })
+
+
+SPEC = ['name', {'school': ['name']}, {'class_set': ['name']}]
+
+
+@override_settings(SERIALIZATION_SPEC_STRICT_QUERY_BUDGET=True)
+class QueryBudgetTestCase(SerializationSpecTestCase):
+
+    def get(self, view):
+        return view.as_view()(APIRequestFactory().get('/'))
+
+    def test_within_budget(self):
+        with self.assertNumQueries(3):
+            response = self.get(make_view(SPEC, 3))
+
+        self.assertEqual([teacher['name'] for teacher in response.data], ['Mr Cat', 'Ms Dog'])
+
+    def test_planned_queries_over_budget(self):
+        with self.assertRaisesMessage(
+            QueryBudgetExceeded,
+            'tests.test_budget.TeacherBudgetListView plans 3 queries, over its max_queries of 2: the 3rd is for class_set',
+        ):
+            self.get(make_view(SPEC, 2))
+
+    def test_queries_made_over_budget(self):
+        view = make_view(['name', {'class_set': ['name', {'total': StudentTotal()}]}], 2)
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'made 3 queries, over its max_queries of 2: the 3rd is for (plugins)'):
+            self.get(view)
+
+    @override_settings(SERIALIZATION_SPEC_STRICT_QUERY_BUDGET=False)
+    def test_logged_in_production(self):
+        with self.assertLogs('serialization_spec', 'WARNING') as logs:
+            response = self.get(make_view(SPEC, 1))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn('plans 3 queries, over its max_queries of 1: the 2nd is for school', logs.output[0])
+        self.assertIn('made 3 queries, over its max_queries of 1: the 2nd is for school', logs.output[1])
+
+    def test_detail_view(self):
+        def make_detail_view(max_queries):
+            return type('TeacherBudgetDetailView', (SerializationSpecMixin, generics.RetrieveAPIView), {
+                'queryset': Teacher.objects.all(),
+                'serialization_spec': SPEC,
+                'max_queries': max_queries,
+            })
+
+        # school is joined rather than prefetched
+        response = make_detail_view(2).as_view()(APIRequestFactory().get('/'), pk=self.teacher.pk)
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'plans 2 queries, over its max_queries of 1: the 2nd is for class_set'):
+            make_detail_view(1).as_view()(APIRequestFactory().get('/'), pk=self.teacher.pk)
@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import CharField, Value
+from django.test import SimpleTestCase, override_settings
+from django.urls import include, re_path, reverse
+from rest_framework import generics
+
+from serialization_spec.checks import check_serialization_specs, warm_up_views
+from serialization_spec.serialization import SerializationSpecMixin, SerializationSpecPlugin, invalidate_compiled_specs
+from .models import Teacher
+from .test_api import SerializationSpecTestCase
+from .views import TeacherDetailView
+
+
+class UnknownRelationView(SerializationSpecMixin, generics.ListAPIView):
+    queryset = Teacher.objects.all()
+    serialization_spec = ['name', {'clases': ['name']}]
+
+
+class UnknownFieldView(SerializationSpecMixin, generics.RetrieveAPIView):
+    queryset = Teacher.objects.all()
+    serialization_spec = ['nmae']
+
+
+class ViewerEmail(SerializationSpecPlugin):
+    """ Needs a signed in user, as an anonymous one has no email """
+
+    def modify_queryset(self, queryset):
+        return queryset.annotate(viewer_email=Value(self.request_user.email, output_field=CharField()))
+
+    def get_value(self, instance):
+        return instance.viewer_email
+
+
+class ViewerEmailView(SerializationSpecMixin, generics.ListAPIView):
+    queryset = Teacher.objects.all()
+    serialization_spec = ['name', {'viewer_email': ViewerEmail()}]
+
+
+def get_check_user():
+    return User(username='check', email='check@example.com')
+
+
+urlpatterns = [
+    re_path(r'^nested/', include([
+        re_path(r'^teachers/$', UnknownRelationView.as_view()),
+        re_path(r'^teachers/(?P<pk>[0-9a-f-]+)/$', UnknownFieldView.as_view()),
+    ])),
+    re_path(r'^teachers/(?P<id>[0-9a-f-]+)/$', TeacherDetailView.as_view()),
+    re_path(r'^viewers/$', ViewerEmailView.as_view()),
+]
+
+
+class CheckTestCase(SimpleTestCase):
+
+    def test_urlconf_specs_are_valid(self):
+        self.assertEqual(check_serialization_specs(), [])
+
+    @override_settings(ROOT_URLCONF='tests.test_checks')
+    def test_broken_specs(self):
+        errors = check_serialization_specs()
+
+        self.assertEqual([error.obj for error in errors], [UnknownRelationView, UnknownFieldView, ViewerEmailView])
+        self.assertEqual({error.id for error in errors}, {'serialization_spec.E001'})
+        self.assertIn('UnknownRelationView (^nested/^teachers/$)', errors[0].msg)
+        self.assertIn("KeyError: 'clases'", errors[0].msg)
+        self.assertIn('nmae', errors[1].msg)
+        self.assertIn('SERIALIZATION_SPEC_CHECK_USER', errors[2].hint)
+
+    @override_settings(ROOT_URLCONF='tests.test_checks', SERIALIZATION_SPEC_CHECK_USER='tests.test_checks.get_check_user')
+    def test_specs_checked_for_configured_user(self):
+        errors = check_serialization_specs()
+
+        self.assertEqual([error.obj for error in errors], [UnknownRelationView, UnknownFieldView])
+        self.assertEqual([error.hint for error in errors], [None, None])
+
+    @override_settings(ROOT_URLCONF='tests.test_checks')
+    def test_warm_up_raises(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'UnknownRelationView'):
+            warm_up_views()
+
+
+class WarmUpTestCase(SerializationSpecTestCase):
+
+    def test_first_request_is_already_planned(self):
+        invalidate_compiled_specs()
+        with self.assertLogs('serialization_spec', 'INFO') as logs:
+            warm_up_views()
+
+        self.assertIn('INFO:serialization_spec:tests.views.TeacherDetailView (^teachers/(?P<id>[0-9a-f-]+)/$) retrieve will make 2 queries', logs.output)
+        with mock.patch('serialization_spec.serialization.compile_spec') as compile_spec:
+            response = self.client.get(reverse('teacher-detail', kwargs={'id': str(self.teacher.id)}))
+
+        self.assertEqual(response.status_code, 200)
+        compile_spec.assert_not_called()
@@ -0,0 +1,83 @@
+from django.db import connection
+from django.db.models.query import Q
+from django.test.utils import CaptureQueriesContext
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory
+
+from serialization_spec.plugins import CountOf, Exists, MethodCall
+from serialization_spec.serialization import SerializationSpecMixin, Filtered, Aliased
+from .test_api import SerializationSpecTestCase
+from .models import Teacher, Assignment
+from . import views
+
+
+def compiled(view_class):
+    return type('Compiled%s' % view_class.__name__, (view_class,), {'use_compiled_serializer': True})
+
+
+class CompiledSerializerParityTestCase(SerializationSpecTestCase):
+
+    def render(self, view_class, **kwargs):
+        response = view_class.as_view()(APIRequestFactory().get('/'), **kwargs)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assertParity(self, view_class, **kwargs):
+        with CaptureQueriesContext(connection) as capture:
+            expected = self.render(view_class, **kwargs)
+        with self.assertNumQueries(len(capture.captured_queries)):
+            actual = self.render(compiled(view_class), **kwargs)
+        self.assertEqual(expected, actual)
+
+    def test_detail_views(self):
+        for view_class, obj in [
+            (views.TeacherDetailView, self.teacher),
+            (views.StudentDetailView, self.student),
+            (views.ClassDetailView, self.math_class),
+            (views.SubjectDetailView, self.math),
+            (views.SchoolDetailView, self.school),
+            (views.StudentWithAssignmentsDetailView, self.student),
+            (views.AssignmentDetailView, self.assignment),
+            (views.StudentWithClassesAndAssignmentsDetailView, self.student),
+        ]:
+            with self.subTest(view=view_class.__name__):
+                self.assertParity(view_class, id=str(obj.id))
+
+    def test_list_view(self):
+        self.assertParity(views.TeacherListView)
+
+    def test_plugins_filters_and_aliases(self):
+        class TeacherView(SerializationSpecMixin, generics.RetrieveAPIView):
+            queryset = Teacher.objects.all()
+            serialization_spec = [
+                'id',
+                'created',
+                'school',
+                {'title': Aliased('name')},
+                {'num_classes': CountOf('class')},
+                {'has_classes': Exists('class')},
+                {'label': MethodCall('__str__', ['name'])},
+                {'school': [
+                    'name',
+                    {'teacher_set': Filtered(Q(name__icontains='cat'), [
+                        'name'
+                    ])},
+                ]},
+            ]
+
+        self.assertParity(TeacherView, pk=str(self.teacher.id))
+
+    def test_list_of_nullable_results(self):
+        class AssignmentListView(SerializationSpecMixin, generics.ListAPIView):
+            queryset = Assignment.objects.order_by('name')
+            serialization_spec = [
+                'name',
+                'clasz',
+                {'clasz': [
+                    'name',
+                    {'teacher': ['name']},
+                ]},
+            ]
+
+        self.assertParity(AssignmentListView)
@@ -0,0 +1,221 @@
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.db.models import CharField, Value
+from django.urls import reverse
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from serialization_spec import serialization
+from serialization_spec.cache import LRUCache
+from serialization_spec.plugins import CountOf
+from serialization_spec.serialization import (
+    SerializationSpecMixin, SerializationSpecPlugin, bind_spec, compiled_spec_cache, invalidate_compiled_specs, make_serializer_class,
+    serializer_class_cache,
+)
+from .test_api import SerializationSpecTestCase, uuid
+from .models import School, Teacher
+from . import views
+
+
+class LRUCacheTestCase(SerializationSpecTestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('one', 1)
+        cache.set('two', 2)
+        cache.get('one')
+        cache.set('three', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('one'), 1)
+        self.assertIsNone(cache.get('two'))
+        self.assertEqual(cache.get('three'), 3)
+
+
+class ViewerName(SerializationSpecPlugin):
+    """ Puts the user's name on its queryset, which is a prefetch's when it is beneath a relation """
+
+    def modify_queryset(self, queryset):
+        return queryset.annotate(viewer_name=Value(self.request_user.username, output_field=CharField()))
+
+    def get_value(self, instance):
+        return instance.viewer_name
+
+
+class TeacherClassesViewerView(SerializationSpecMixin, generics.ListAPIView):
+    queryset = Teacher.objects.order_by('name')
+    pagination_class = None
+    serialization_spec = ['name', {'class_set': ['name', {'viewer': ViewerName()}]}]
+
+
+class CompiledSpecCacheTestCase(SerializationSpecTestCase):
+
+    def setUp(self):
+        super().setUp()
+        invalidate_compiled_specs()
+
+    def test_spec_is_compiled_once(self):
+        url = reverse('teacher-detail', kwargs={'id': str(self.teacher.id)})
+        with patch.object(serialization, 'compile_spec', wraps=serialization.compile_spec) as compile_spec:
+            first = self.client.get(url)
+            second = self.client.get(url)
+
+        self.assertEqual(compile_spec.call_count, 1)
+        self.assertJsonEqual(first.data, second.data)
+        self.assertEqual(second.data['classes'][0]['id'], uuid('5'))
+
+    def test_cached_spec_uses_same_number_of_queries(self):
+        url = reverse('class-detail', kwargs={'id': str(self.math_class.id)})
+        self.client.get(url)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        self.assertEqual(len(response.data['student_set']), 7)
+
+    def test_detail_and_list_are_compiled_separately(self):
+        self.client.get(reverse('teacher-list'))
+        self.client.get(reverse('teacher-detail', kwargs={'id': str(self.teacher.id)}))
+
+        self.assertEqual(len(compiled_spec_cache), 2)
+
+    def test_invalidate_view_class(self):
+        self.client.get(reverse('teacher-list'))
+        self.client.get(reverse('student-detail', kwargs={'id': str(self.student.id)}))
+
+        invalidate_compiled_specs(views.TeacherListView)
+
+        self.assertEqual(len(compiled_spec_cache), 1)
+
+    def test_variant_key_compiles_per_variant(self):
+        class VariantView(SerializationSpecMixin, generics.ListAPIView):
+            queryset = Teacher.objects.all()
+            serialization_spec = ['id', 'name']
+
+            def get_serialization_spec_variant(self):
+                return self.request.query_params.get('variant')
+
+        view = VariantView.as_view()
+        with patch.object(serialization, 'compile_spec', wraps=serialization.compile_spec) as compile_spec:
+            for variant in ['a', 'b', 'a']:
+                view(APIRequestFactory().get('/', {'variant': variant}))
+
+        self.assertEqual(compile_spec.call_count, 2)
+
+    def get_as(self, view_class, username):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=User(username=username))
+        return view_class.as_view()(request).data
+
+    def test_nested_plugin_queryset_is_planned_for_each_user(self):
+        with patch.object(serialization, 'compile_spec', wraps=serialization.compile_spec) as compile_spec:
+            viewers = [
+                {each['viewer'] for teacher in self.get_as(TeacherClassesViewerView, username) for each in teacher['class_set']}
+                for username in ['alice', 'bob']
+            ]
+
+        self.assertEqual(viewers, [{'alice'}, {'bob'}])
+        self.assertEqual(compile_spec.call_count, 2)
+
+    def test_nested_plugin_queryset_is_cached_per_variant(self):
+        view_class = type('VariantTeacherClassesViewerView', (TeacherClassesViewerView,), {
+            'get_serialization_spec_variant': lambda self: self.request.user.username,
+        })
+
+        with patch.object(serialization, 'compile_spec', wraps=serialization.compile_spec) as compile_spec:
+            viewers = [
+                self.get_as(view_class, username)[0]['class_set'][0]['viewer']
+                for username in ['alice', 'bob', 'alice']
+            ]
+
+        self.assertEqual(viewers, ['alice', 'bob', 'alice'])
+        self.assertEqual(compile_spec.call_count, 2)
+
+
+class AtSchool(SerializationSpecPlugin):
+    """ Holds arguments which are not plain data, so has no identity """
+
+    def __init__(self, schools):
+        self.schools = schools
+
+    def get_value(self, instance):
+        return any(str(school.pk) == str(instance.school_id) for school in self.schools)
+
+
+class SerializerClassCacheTestCase(SerializationSpecTestCase):
+
+    def setUp(self):
+        super().setUp()
+        serializer_class_cache.clear()
+
+    def test_same_spec_reuses_class(self):
+        spec = ['id', {'school': ['id', 'name']}]
+
+        first = make_serializer_class(Teacher, spec)
+        second = make_serializer_class(Teacher, ['id', {'school': ['id', 'name']}])
+
+        self.assertIs(first, second)
+        self.assertEqual(first.__name__, 'TeacherSerializer')
+        self.assertEqual(first._declared_fields['school'].__class__.__name__, 'SchoolSerializer')
+
+    def test_different_spec_builds_new_class(self):
+        first = make_serializer_class(Teacher, ['id', {'school': ['id']}])
+        second = make_serializer_class(Teacher, ['id', {'school': ['name']}])
+
+        self.assertIsNot(first, second)
+
+    def test_equal_plugins_reuse_class(self):
+        first = make_serializer_class(Teacher, [{'count': CountOf('class')}])
+        second = make_serializer_class(Teacher, [{'count': CountOf('class')}])
+        third = make_serializer_class(Teacher, [{'count': CountOf('school')}])
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, third)
+
+    def test_plugins_without_identity_are_not_merged(self):
+        with self.assertNumQueries(0):
+            bind_spec(Teacher, [{'at_school': AtSchool(School.objects.all())}])
+
+        # the same str(), but different schools
+        kitteh, other = School(id=self.school.id, name='A school'), School(id=uuid('99'), name='A school')
+        teacher = Teacher.objects.get(id=self.teacher.id)
+        data = [
+            make_serializer_class(Teacher, bind_spec(Teacher, [{'at_school': AtSchool([school])}]))(teacher).data
+            for school in [kitteh, other]
+        ]
+
+        self.assertEqual(data, [{'at_school': True}, {'at_school': False}])
+
+    def test_same_plugin_binds_once(self):
+        plugin = AtSchool([])
+
+        first = bind_spec(Teacher, [{'at_school': plugin}])
+        second = bind_spec(Teacher, [{'at_school': plugin}])
+
+        self.assertIsNot(first, second)
+        self.assertIs(first[0]['at_school'], second[0]['at_school'])
+        self.assertIs(make_serializer_class(Teacher, first), make_serializer_class(Teacher, second))
+
+    def test_spec_from_each_request_reuses_class(self):
+        class DynamicTeacherView(SerializationSpecMixin, generics.RetrieveAPIView):
+            queryset = Teacher.objects.all()
+
+            def get_serialization_spec(self):
+                return ['name', 'class_set', {'num_classes': CountOf('class')}]
+
+        view = DynamicTeacherView.as_view()
+        with patch.object(serialization, 'build_serializer_class', wraps=serialization.build_serializer_class) as build_serializer_class:
+            responses = [view(APIRequestFactory().get('/'), pk=str(self.teacher.id)) for _ in range(2)]
+
+        self.assertEqual(build_serializer_class.call_count, 1)
+        self.assertEqual(responses[1].data['num_classes'], 2)
+        self.assertEqual(len(responses[1].data['class_set']), 2)
+
+    def test_view_reuses_serializer_class(self):
+        url = reverse('teacher-detail', kwargs={'id': str(self.teacher.id)})
+        with patch.object(serialization, 'build_serializer_class', wraps=serialization.build_serializer_class) as build_serializer_class:
+            self.client.get(url)
+            response = self.client.get(url)
+
+        self.assertEqual(build_serializer_class.call_count, 3)
+        self.assertEqual(response.data['school']['name'], 'Kitteh High')
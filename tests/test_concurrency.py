@@ -0,0 +1,111 @@
+import threading
+from unittest.mock import patch
+
+from django.db import transaction
+from django.test import TransactionTestCase
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory
+
+from serialization_spec import concurrency
+from serialization_spec.concurrency import group_lookups
+from serialization_spec.serialization import Aliased, SerializationSpecMixin
+from .test_api import SerializationSpecTestCase
+from .models import Teacher
+from . import views
+
+
+class ConcurrentTeacherDetailView(views.TeacherDetailView):
+    prefetch_concurrency = 4
+    serialization_spec = [
+        'name',
+        {'school': [
+            'name',
+            {'student_set': ['name']},
+        ]},
+        {'classes': Aliased('class_set', [
+            'name',
+            {'student_set': ['name']},
+        ])},
+        {'assignments': Aliased('class_set', [
+            {'assignment_set': ['name']},
+        ])},
+    ]
+
+
+class ConcurrentTeacherListView(views.TeacherListView):
+    prefetch_concurrency = 4
+
+
+class GroupLookupsTestCase(SerializationSpecTestCase):
+
+    def test_groups_by_first_relation(self):
+        self.assertEqual(group_lookups(['school', 'class_set', 'school__student_set', 'class_set__student_set', 'lea']), [
+            ['school', 'school__student_set'],
+            ['class_set', 'class_set__student_set'],
+            ['lea'],
+        ])
+
+
+class ConcurrentPrefetchTestCase(TransactionTestCase):
+
+    setUp = SerializationSpecTestCase.setUp
+    assertJsonEqual = SerializationSpecTestCase.assertJsonEqual
+
+    def get(self, view_class, **kwargs):
+        response = view_class.as_view()(APIRequestFactory().get('/'), **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def record_threads(self):
+        threads = []
+        prefetch_related_objects = concurrency.prefetch_related_objects
+
+        def record(instances, *lookups):
+            threads.append(threading.current_thread())
+            return prefetch_related_objects(instances, *lookups)
+
+        return threads, patch.object(concurrency, 'prefetch_related_objects', record)
+
+    def test_sibling_branches_run_on_threads(self):
+        threads, recording = self.record_threads()
+        serial_view = type('SerialTeacherDetailView', (ConcurrentTeacherDetailView,), {'prefetch_concurrency': 1})
+        kwargs = {'id': str(self.teacher.id)}
+
+        with recording:
+            data = self.get(ConcurrentTeacherDetailView, **kwargs)
+
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertJsonEqual(data, self.get(serial_view, **kwargs))
+        self.assertEqual([each['name'] for each in data['classes']], ['French A', 'Math B'])
+        self.assertEqual(len(data['school']['student_set']), 10)
+
+    def test_list_view(self):
+        threads, recording = self.record_threads()
+
+        with recording:
+            data = self.get(ConcurrentTeacherListView)
+
+        self.assertEqual(len(threads), 2)
+        self.assertJsonEqual(data, self.get(views.TeacherListView))
+
+    def test_serial_in_transaction(self):
+        threads, recording = self.record_threads()
+
+        with transaction.atomic(), recording:
+            self.get(ConcurrentTeacherDetailView, id=str(self.teacher.id))
+
+        self.assertEqual(threads, [threading.current_thread()])
+
+    def test_single_branch_is_serial(self):
+        threads, recording = self.record_threads()
+        view_class = type('TeacherClassesListView', (SerializationSpecMixin, generics.ListAPIView), {
+            'queryset': Teacher.objects.all(),
+            'prefetch_concurrency': 4,
+            'serialization_spec': ['name', {'class_set': ['name']}],
+        })
+
+        with recording:
+            self.get(view_class)
+
+        self.assertEqual(threads, [threading.current_thread()])
@@ -0,0 +1,73 @@
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from serialization_spec.explain import explain_spec
+from serialization_spec.plugins import CountOf
+from serialization_spec.serialization import Filtered
+from .test_api import SerializationSpecTestCase
+from .models import Class, Student, Teacher
+from . import views
+
+
+class ExplainSpecTestCase(SerializationSpecTestCase):
+
+    def test_plan_tree(self):
+        with self.assertNumQueries(0):
+            plan = explain_spec(Class, views.ClassDetailView.serialization_spec, use_select_related=True)
+
+        self.assertEqual(plan['model'], 'tests.Class')
+        self.assertEqual(plan['only'], [
+            'id', 'name', 'teacher', 'teacher__id', 'teacher__name', 'teacher__school', 'teacher__school__id', 'teacher__school__name',
+        ])
+        self.assertEqual(plan['select_related'], ['teacher', 'teacher__school'])
+        self.assertEqual(plan['queries'], 2)
+        self.assertIn('INNER JOIN "tests_school"', plan['sql'])
+
+        [prefetch] = plan['prefetches']
+        self.assertEqual(prefetch['lookup'], 'student_set')
+        self.assertEqual(prefetch['model'], 'tests.Student')
+        self.assertEqual(prefetch['only'], ['name'])
+        self.assertEqual(prefetch['prefetches'], [])
+
+    def test_filters_and_annotations(self):
+        plan = explain_spec(Teacher.objects.order_by('name'), [
+            'name',
+            {'num_classes': CountOf('class')},
+            {'french_classes': Filtered('class_set', Q(name__startswith='French'), [
+                'name',
+            ])},
+        ])
+
+        self.assertEqual(plan['annotations'], ['class_count'])
+        self.assertIn('ORDER BY "tests_teacher"."name"', plan['sql'])
+        [prefetch] = plan['prefetches']
+        self.assertEqual(prefetch['lookup'], 'class_set')
+        self.assertEqual(prefetch['to_attr'], 'french_classes')
+        self.assertIn('LIKE', prefetch['sql'])
+
+    def test_id_fetches(self):
+        plan = explain_spec(Student, ['name', 'classes', {'assignmentstudent_set': ['assignment']}])
+
+        self.assertEqual(
+            [(fetch['lookup'], fetch['model']) for fetch in plan['id_fetches']],
+            [('classes', 'tests.Student_classes')],
+        )
+        self.assertEqual(plan['queries'], 3)
+
+    def test_query_count_matches_view(self):
+        for view_class, url in [
+            (views.TeacherDetailView, reverse('teacher-detail', kwargs={'id': str(self.teacher.id)})),
+            (views.ClassDetailView, reverse('class-detail', kwargs={'id': str(self.math_class.id)})),
+            (views.SchoolDetailView, reverse('school-detail', kwargs={'id': str(self.school.id)})),
+            (views.StudentWithAssignmentsDetailView, reverse('student-with-assignments-detail', kwargs={'id': str(self.student.id)})),
+            (views.AssignmentDetailView, reverse('assignment-detail', kwargs={'id': str(self.assignment.id)})),
+            (views.StudentWithClassesAndAssignmentsDetailView, reverse('student-with-classes-and-assignments-detail', kwargs={'id': str(self.student.id)})),
+        ]:
+            with self.subTest(view=view_class.__name__):
+                with CaptureQueriesContext(connection) as capture:
+                    self.client.get(url)
+
+                plan = explain_spec(view_class.queryset, view_class.serialization_spec, use_select_related=True)
+                self.assertEqual(plan['queries'], len(capture.captured_queries))
@@ -0,0 +1,131 @@
+from unittest.mock import patch
+from rest_framework.test import APIRequestFactory
+
+from serialization_spec import serialization
+from serialization_spec.cache import LRUCache
+from serialization_spec.serialization import Aliased, parse_projection, project_spec
+from .test_api import SerializationSpecTestCase, uuid
+from . import views
+
+
+class ProjectedTeacherDetailView(views.TeacherDetailView):
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+
+
+class ProjectedTeacherListView(views.TeacherListView):
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+
+
+class ProjectSpecTestCase(SerializationSpecTestCase):
+
+    spec = [
+        'id',
+        'name',
+        {'school': [
+            'id',
+            'name',
+        ]},
+        {'classes': Aliased('class_set', [
+            'id',
+            'name',
+        ])},
+    ]
+
+    def test_parse(self):
+        self.assertEqual(parse_projection('id, school.name,school.id,classes,classes.name'), {
+            'id': None,
+            'school': {'name': None, 'id': None},
+            'classes': None,
+        })
+
+    def test_select(self):
+        projected = project_spec(self.spec, fields='name,classes.name')
+
+        self.assertEqual(projected[0], 'name')
+        self.assertEqual(projected[1]['classes'].field_name, 'class_set')
+        self.assertEqual(projected[1]['classes'].serialization_spec, ['name'])
+        # the declared spec is untouched
+        self.assertEqual(self.spec[3]['classes'].serialization_spec, ['id', 'name'])
+
+    def test_exclude(self):
+        self.assertEqual(project_spec(self.spec[:3], exclude='id,school.id'), [
+            'name',
+            {'school': ['name']},
+        ])
+
+    def test_exclude_every_field_of_relation(self):
+        for exclude in ['school.id,school.name', 'classes.id,classes.name']:
+            with self.subTest(exclude=exclude):
+                with self.assertRaises(ValueError):
+                    project_spec(self.spec, exclude=exclude)
+
+    def test_unknown_fields(self):
+        for fields in ['age', 'school.age', 'name.first']:
+            with self.subTest(fields=fields):
+                with self.assertRaises(ValueError):
+                    project_spec(self.spec, fields=fields)
+
+
+class SparseFieldsetViewTestCase(SerializationSpecTestCase):
+
+    def test_fields_prune_fetch(self):
+        with self.assertNumQueries(2):
+            response = ProjectedTeacherListView.as_view()(APIRequestFactory().get('/', {'fields': 'id,name'}))
+
+        self.assertJsonEqual(response.data['results'][0], {'id': uuid('2'), 'name': 'Mr Cat'})
+
+    def test_nested_fields(self):
+        response = ProjectedTeacherDetailView.as_view()(
+            APIRequestFactory().get('/', {'fields': 'name,classes.name'}), id=str(self.teacher.id)
+        )
+
+        self.assertJsonEqual(response.data, {
+            'name': 'Mr Cat',
+            'classes': [{'name': 'French A'}, {'name': 'Math B'}],
+        })
+
+    def test_exclude(self):
+        with self.assertNumQueries(3):
+            response = ProjectedTeacherListView.as_view()(APIRequestFactory().get('/', {'exclude': 'class_set,school.id'}))
+
+        self.assertJsonEqual(response.data['results'][1], {
+            'id': uuid('7'),
+            'name': 'Ms Dog',
+            'school': {'name': 'Kitteh High'},
+        })
+
+    def test_cannot_widen_spec(self):
+        response = ProjectedTeacherListView.as_view()(APIRequestFactory().get('/', {'fields': 'id,school.lea'}))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'fields': ['Unknown field school.lea']})
+
+    def test_cannot_exclude_every_field_of_relation(self):
+        response = ProjectedTeacherDetailView.as_view()(
+            APIRequestFactory().get('/', {'exclude': 'classes.id,classes.name'}), id=str(self.teacher.id)
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'exclude': ['No fields left within classes, leave it out instead']})
+
+    def test_projection_is_compiled_once(self):
+        view = ProjectedTeacherListView.as_view()
+        with patch.object(serialization, 'compile_spec', wraps=serialization.compile_spec) as compile_spec:
+            for fields in ['id,school', 'name', 'id,school', 'school,id', 'school.id,school,id']:
+                view(APIRequestFactory().get('/', {'fields': fields}))
+
+        self.assertEqual(compile_spec.call_count, 2)
+
+    def test_projections_do_not_evict_declared_plans(self):
+        serialization.invalidate_compiled_specs()
+        view = ProjectedTeacherListView.as_view()
+        view(APIRequestFactory().get('/'))
+        with patch.object(serialization, 'compiled_spec_cache', LRUCache(1)), patch.object(serialization, 'compile_spec', wraps=serialization.compile_spec) as compile_spec:
+            view(APIRequestFactory().get('/'))
+            for fields in ['id', 'name', 'id,name']:
+                view(APIRequestFactory().get('/', {'fields': fields}))
+            view(APIRequestFactory().get('/'))
+
+        self.assertEqual(compile_spec.call_count, 4)
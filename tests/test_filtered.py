@@ -0,0 +1,86 @@
+from unittest import skipIf
+
+import django
+from django.db import connection
+from django.db.models import Exists, OuterRef, Prefetch, Q
+from django.test.utils import CaptureQueriesContext
+
+from serialization_spec.serialization import Filtered, apply_filters, compile_spec, filters_span_to_many
+from .test_api import SerializationSpecTestCase
+from .models import School, Teacher, Class, Student
+
+
+class FilteredTestCase(SerializationSpecTestCase):
+
+    def test_spans_to_many(self):
+        for filters, expected in [
+            (Q(name='Math B'), False),
+            (Q(teacher__school__name='Kitteh High'), False),
+            (Q(student__name='Student 3'), True),
+            (Q(name='Math B') | Q(assignment__name__startswith='Math'), True),
+            (Q(teacher__class__name='French A'), True),
+        ]:
+            with self.subTest(filters=filters):
+                self.assertEqual(filters_span_to_many(Class, filters), expected)
+
+    def fetch(self, spec, queryset):
+        with CaptureQueriesContext(connection) as capture:
+            instances = list(compile_spec(queryset.model, spec).apply(queryset))
+        return instances, [query['sql'] for query in capture.captured_queries]
+
+    def assertSameAsDistinct(self, model, key, field_name, filters, to_attr):
+        """ Compare a `Filtered` relation with the same prefetch filtered then made distinct """
+        related_model = getattr(model.objects.first(), field_name).model
+        instances, queries = self.fetch(
+            [{to_attr: Filtered(field_name, filters, ['name'])}],
+            model.objects.order_by('pk'),
+        )
+        expected = model.objects.order_by('pk').prefetch_related(Prefetch(
+            field_name,
+            queryset=related_model.objects.filter(filters).distinct(),
+            to_attr=to_attr,
+        ))
+
+        self.assertEqual(
+            [[each.name for each in getattr(instance, to_attr)] for instance in instances],
+            [[each.name for each in getattr(instance, to_attr)] for instance in expected],
+        )
+        for sql in queries:
+            self.assertNotIn('DISTINCT', sql)
+        return instances, queries
+
+    def test_local_filter_has_no_subquery(self):
+        instances, queries = self.assertSameAsDistinct(Teacher, 'classes', 'class_set', Q(name__startswith='French'), 'french_classes')
+
+        self.assertEqual(queries[1].count('SELECT'), 1)
+        self.assertEqual([len(each.french_classes) for each in instances], [1, 0])
+
+    def test_to_many_filter_in_subquery(self):
+        # every student of Math B matches, which would repeat the class for each of them if joined
+        instances, queries = self.assertSameAsDistinct(Teacher, 'classes', 'class_set', Q(student__name__startswith='Student'), 'taught')
+
+        self.assertIn('IN (SELECT', queries[1])
+        self.assertEqual([[each.name for each in instance.taught] for instance in instances], [['French A', 'Math B'], []])
+
+    def test_many_to_many_relation(self):
+        self.assertSameAsDistinct(Student, 'classes', 'classes', Q(name='Math B') | Q(assignment__name__contains='French'), 'some_classes')
+
+    def test_reverse_many_to_many_relation(self):
+        self.assertSameAsDistinct(Class, 'students', 'student_set', Q(assignments__name__contains='Math'), 'math_students')
+
+    @skipIf(django.VERSION < (3, 0), 'filtering on an expression needs Django 3.0')
+    def test_expression_filter(self):
+        filters = Exists(Student.objects.filter(classes=OuterRef('pk'), name='Student 9'))
+
+        self.assertTrue(filters_span_to_many(Class, filters))
+        instances, queries = self.assertSameAsDistinct(Teacher, 'classes', 'class_set', filters, 'with_student_9')
+        self.assertEqual([[each.name for each in instance.with_student_9] for instance in instances], [['Math B'], []])
+
+    def test_apply_filters_without_prefetch(self):
+        filters = Q(class__student__name__in=['Student 3', 'Student 4'])
+
+        self.assertEqual(
+            list(apply_filters(School.objects.all(), Q(teacher__class__name='French A'))),
+            list(School.objects.filter(teacher__class__name='French A').distinct()),
+        )
+        self.assertEqual(apply_filters(Teacher.objects.all(), filters).count(), 1)
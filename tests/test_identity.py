@@ -0,0 +1,80 @@
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory
+
+from serialization_spec.identity import IdentityMap, using_identity_map
+from serialization_spec.serialization import SerializationSpecMixin, compile_spec
+from .test_api import SerializationSpecTestCase
+from .models import AssignmentStudent, School, Student
+from . import views
+
+
+class StudentAssignmentsListView(SerializationSpecMixin, generics.ListAPIView):
+    queryset = Student.objects.all()
+    pagination_class = None
+    serialization_spec = views.StudentWithAssignmentsDetailView.serialization_spec
+
+
+def with_identity_map(view_class, **attrs):
+    return type('Shared%s' % view_class.__name__, (view_class,), dict(attrs, use_identity_map=True))
+
+
+class IdentityMapTestCase(SerializationSpecTestCase):
+
+    def get(self, view_class, instance):
+        view = view_class.as_view()
+        response = view(APIRequestFactory().get('/'), id=str(instance.id))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def list(self, view_class):
+        response = view_class.as_view()(APIRequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_skips_foreign_keys_already_fetched(self):
+        with self.assertNumQueries(4):
+            expected = self.list(StudentAssignmentsListView).data
+        with self.assertNumQueries(3):
+            response = self.list(with_identity_map(StudentAssignmentsListView))
+
+        self.assertJsonEqual(response.data, expected)
+        self.assertEqual(response.renderer_context['view'].identity_map.resolved, AssignmentStudent.objects.count())
+
+    def test_only_reuses_instances_with_enough_fields(self):
+        view_class = with_identity_map(StudentAssignmentsListView, serialization_spec=[
+            'name',
+            {'assignments': ['id']},
+            {'assignmentstudent_set': [
+                {'assignment': ['name']},
+            ]},
+        ])
+
+        with self.assertNumQueries(4):
+            response = self.list(view_class)
+
+        self.assertEqual(
+            [each['assignment']['name'] for each in response.data[5]['assignmentstudent_set']],
+            ['Math B Assignment', 'French A Assignment'],
+        )
+
+    def test_shares_instances_between_branches(self):
+        response = self.get(with_identity_map(views.SchoolDetailView), self.school)
+        view = response.renderer_context['view']
+
+        self.assertEqual(view.identity_map.reused, 1)
+        self.assertJsonEqual(response.data, self.get(views.SchoolDetailView, self.school).data)
+
+    def test_shared_instance_is_the_same_object(self):
+        spec = ['name', {'lea': ['name', {'school_set': ['name', 'lea']}]}]
+        queryset = compile_spec(School, spec, use_select_related=True).apply(School.objects.all())
+
+        with using_identity_map(IdentityMap()):
+            school = queryset.get(id=self.school.id)
+
+        self.assertIn(school, school.lea.school_set.all())
+        self.assertTrue(any(each is school for each in school.lea.school_set.all()))
+
+    def test_inactive_without_a_map(self):
+        queryset = compile_spec(Student, ['name']).apply(Student.objects.filter(id=self.student.id))
+
+        self.assertIsNot(queryset.get(), queryset.get())
@@ -0,0 +1,68 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from serialization_spec.serialization import Limited, compile_spec
+from serialization_spec.values import fetch_values
+from .test_api import SerializationSpecTestCase
+from .models import Class, School, Teacher
+
+
+class LimitedTestCase(SerializationSpecTestCase):
+
+    def fetch(self, queryset, spec):
+        with CaptureQueriesContext(connection) as capture:
+            instances = list(compile_spec(queryset.model, spec).apply(queryset))
+        return instances, capture.captured_queries
+
+    def test_limit_per_parent(self):
+        schools, queries = self.fetch(School.objects.order_by('name'), [
+            'name',
+            {'latest_students': Limited('student_set', 3, ['name'], ordering=['-name'])},
+        ])
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(
+            [(school.name, [student.name for student in school.latest_students]) for school in schools],
+            [('Hove High', []), ('Kitteh High', ['Student 9', 'Student 8', 'Student 7'])],
+        )
+
+    def test_default_ordering(self):
+        Class.objects.create(name='Art C', subject=self.french, teacher=self.teacher)
+        teachers, _ = self.fetch(Teacher.objects.order_by('name'), [
+            {'class_set': Limited(2, ['name'])},
+        ])
+
+        # ordered by id, as the related model is
+        self.assertEqual([[each.name for each in teacher.class_set.all()] for teacher in teachers], [['French A', 'Math B'], []])
+
+    def test_filters_apply_before_limit(self):
+        schools, _ = self.fetch(School.objects.filter(pk=self.school.pk), [
+            {'students': Limited('student_set', 2, ['name'], filters=Q(classes=self.math_class))},
+        ])
+
+        self.assertEqual([student.name for student in schools[0].students], ['Student 3', 'Student 4'])
+
+    def test_many_to_many_unsupported(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compile_spec(Class, [{'student_set': Limited(2, ['name'])}])
+
+    def test_to_one_unsupported(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compile_spec(Class, [{'subject': Limited(2, ['name'])}])
+
+    def test_to_one_joined_unsupported(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compile_spec(Class, [{'teacher': Limited(2, ['name'])}], use_select_related=True)
+
+    def test_values(self):
+        data = fetch_values(School.objects.order_by('name'), [
+            'name',
+            {'latest_students': Limited('student_set', 2, ['name'], ordering=['-name'])},
+        ])
+
+        self.assertJsonEqual(data, [
+            {'name': 'Hove High', 'latest_students': []},
+            {'name': 'Kitteh High', 'latest_students': [{'name': 'Student 9'}, {'name': 'Student 8'}]},
+        ])
@@ -0,0 +1,285 @@
+import json
+from unittest.mock import patch
+from django.db import connection
+from django.db.models import Count, Manager
+from django.db.models.signals import post_init
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import generics
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from serialization_spec.plugins import CountOf, Exists, MethodCall
+from serialization_spec.serialization import SerializationSpecMixin, SerializationSpecPlugin, compile_spec, make_serializer_class
+from .test_api import SerializationSpecTestCase, uuid
+from .models import School, Teacher, Class, Student, Assignment, AssignmentStudent
+
+
+class SubqueryPluginTestCase(SerializationSpecTestCase):
+
+    def fetch(self, model, spec):
+        queryset = compile_spec(model, spec).apply(model.objects.order_by('pk'), None)
+        with CaptureQueriesContext(connection) as capture:
+            values = [
+                [plugin.get_value(instance) for each in spec for plugin in each.values()]
+                for instance in queryset
+            ]
+        [query] = capture.captured_queries
+        return values, query['sql']
+
+    def assertSameAsJoined(self, model, make_spec):
+        joined, joined_sql = self.fetch(model, make_spec(use_subquery=False))
+        subquery, subquery_sql = self.fetch(model, make_spec(use_subquery=None))
+
+        self.assertEqual(joined, subquery)
+        self.assertIn('GROUP BY "%s"' % model._meta.db_table, joined_sql)
+        self.assertNotIn('JOIN', subquery_sql.split('FROM "%s"' % model._meta.db_table)[-1])
+        return subquery
+
+    def test_reverse_fk_and_m2m(self):
+        Class.objects.create(name='Empty', subject=self.math, teacher=self.teacher)
+
+        values = self.assertSameAsJoined(Class, lambda **kwargs: [
+            {'num_students': CountOf('student', **kwargs)},
+            {'has_students': Exists('student', **kwargs)},
+            {'num_assignments': CountOf('assignment', **kwargs)},
+        ])
+
+        self.assertEqual(sorted(values), [[0, False, 0], [7, True, 1], [7, True, 1]])
+
+    def test_forward_m2m_with_empty_relations(self):
+        Student.objects.create(name='New Student', school=self.school)
+
+        values = self.assertSameAsJoined(Student, lambda **kwargs: [
+            {'num_classes': CountOf('classes', **kwargs)},
+            {'num_assignments': CountOf('assignments', **kwargs)},
+            {'has_assignments': Exists('assignments', **kwargs)},
+        ])
+
+        self.assertIn([0, 0, False], values)
+
+    def test_multiple_hops(self):
+        values = self.assertSameAsJoined(School, lambda **kwargs: [
+            {'num_classes': CountOf('teacher__class', **kwargs)},
+            {'has_classes': Exists('teacher__class', **kwargs)},
+        ])
+
+        self.assertEqual(values, [[2, True], [0, False]])
+
+    def test_teacher_counts(self):
+        self.assertSameAsJoined(Teacher, lambda **kwargs: [
+            {'num_classes': CountOf('class', **kwargs)},
+            {'num_students': CountOf('class__student', **kwargs)},
+        ])
+
+
+class StudentIdsListView(SerializationSpecMixin, generics.ListAPIView):
+    queryset = Student.objects.all()
+    pagination_class = None
+    serialization_spec = [
+        'name',
+        'classes',
+        'assignments',
+    ]
+
+
+class ManyToManyIDsTestCase(SerializationSpecTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.related_instances = 0
+        post_init.connect(self.count_instance)
+
+    def tearDown(self):
+        post_init.disconnect(self.count_instance)
+        super().tearDown()
+
+    def count_instance(self, sender, **kwargs):
+        if sender in (Class, Assignment, AssignmentStudent):
+            self.related_instances += 1
+
+    def test_ids_read_from_through_tables(self):
+        with CaptureQueriesContext(connection) as capture:
+            response = self.client.get(reverse('student-with-classes-and-assignments-detail', kwargs={'id': str(self.student.id)}))
+
+        self.assertEqual(self.related_instances, 0)
+        self.assertJsonEqual(response.data, {
+            'id': uuid('15'),
+            'name': 'Student 5',
+            'assignments': [uuid('20'), uuid('21')],
+            'classes': [uuid('5'), uuid('6')],
+        })
+        for query in capture.captured_queries[1:]:
+            self.assertNotIn('JOIN', query['sql'])
+
+    def test_one_query_per_relation(self):
+        Student.objects.create(name='Student X', school=self.school)
+
+        with self.assertNumQueries(3):
+            response = StudentIdsListView.as_view()(APIRequestFactory().get('/'))
+
+        self.assertEqual(self.related_instances, 0)
+        self.assertEqual(len(response.data), Student.objects.count())
+        self.assertIn({'name': 'Student X', 'classes': [], 'assignments': []}, json.loads(JSONRenderer().render(response.data)))
+
+    def test_reverse_fk_ids(self):
+        view = type('TeacherIdsListView', (SerializationSpecMixin, generics.ListAPIView), {
+            'queryset': Teacher.objects.order_by('name'),
+            'pagination_class': None,
+            'serialization_spec': ['name', 'class_set'],
+        })
+
+        with self.assertNumQueries(2):
+            response = view.as_view()(APIRequestFactory().get('/'))
+
+        self.assertJsonEqual(response.data, [
+            {'name': 'Mr Cat', 'class_set': [uuid('5'), uuid('6')]},
+            {'name': 'Ms Dog', 'class_set': []},
+        ])
+
+    def test_related_default_manager_is_respected(self):
+        class CurrentClassManager(Manager):
+            def get_queryset(self):
+                return super().get_queryset().exclude(name='Math B')
+
+        manager = CurrentClassManager()
+        manager.model = Class
+        with patch.object(Class._meta, 'default_manager', manager):
+            student = make_serializer_class(Student, ['classes'])
+            teacher = make_serializer_class(Teacher, ['class_set'])
+            data = [
+                student(compile_spec(Student, ['classes']).apply(Student.objects.all()).get(id=self.student.id)).data,
+                teacher(compile_spec(Teacher, ['class_set']).apply(Teacher.objects.all()).get(id=self.teacher.id)).data,
+            ]
+
+        self.assertEqual(data, [{'classes': [uuid('5')]}, {'class_set': [uuid('5')]}])
+
+    def test_fetches_lazily_outside_views(self):
+        spec = ['classes']
+        student = compile_spec(Student, spec).apply(Student.objects.all()).get(id=self.student.id)
+
+        self.assertEqual(make_serializer_class(Student, spec)(student).data, {'classes': [uuid('5'), uuid('6')]})
+
+
+class StudentCount(SerializationSpecPlugin):
+    """ Counts the students of a page of classes in one query """
+
+    def __init__(self):
+        # shared with the copies bound into specs
+        self.batches = []
+
+    def get_values(self, instances):
+        self.batches.append(len(instances))
+        counts = dict(
+            Student.objects.filter(classes__in=instances).values_list('classes').annotate(count=Count('pk')).order_by()
+        )
+        return [counts.get(instance.pk, 0) for instance in instances]
+
+
+class BatchedPluginTestCase(SerializationSpecTestCase):
+
+    def get_view(self, plugin, **attrs):
+        return type('TeacherClassesListView', (SerializationSpecMixin, generics.ListAPIView), {
+            'queryset': Teacher.objects.order_by('name'),
+            'pagination_class': None,
+            'serialization_spec': ['name', {'class_set': ['name', {'num_students': plugin}]}],
+            **attrs
+        })
+
+    def test_one_batch_per_level(self):
+        Class.objects.create(name='Art C', subject=self.french, teacher=self.teacher)
+        plugin = StudentCount()
+
+        for use_compiled_serializer in [False, True]:
+            with self.subTest(use_compiled_serializer=use_compiled_serializer):
+                view = self.get_view(plugin, use_compiled_serializer=use_compiled_serializer)
+
+                with self.assertNumQueries(3):
+                    response = view.as_view()(APIRequestFactory().get('/'))
+
+                self.assertJsonEqual(response.data, [
+                    {'name': 'Mr Cat', 'class_set': [
+                        {'name': 'French A', 'num_students': 7},
+                        {'name': 'Math B', 'num_students': 7},
+                        {'name': 'Art C', 'num_students': 0},
+                    ]},
+                    {'name': 'Ms Dog', 'class_set': []},
+                ])
+
+        self.assertEqual(plugin.batches, [3, 3])
+
+    def test_get_value_outside_views(self):
+        spec = ['name', {'num_students': StudentCount()}]
+        instance = compile_spec(Class, spec).apply(Class.objects.all()).get(id=self.math_class.id)
+
+        self.assertEqual(make_serializer_class(Class, spec)(instance).data, {'name': 'Math B', 'num_students': 7})
+
+
+class AnnotatedClassCount(SerializationSpecPlugin):
+    """ Annotates onto its own queryset, so cannot be joined """
+
+    def modify_queryset(self, queryset):
+        return queryset.annotate(class_count=Count('class'))
+
+    def get_value(self, instance):
+        return instance.class_count
+
+
+class JoinedPluginTestCase(SerializationSpecTestCase):
+
+    def get_view(self, teacher_spec):
+        return type('ClassDetailView', (SerializationSpecMixin, generics.RetrieveAPIView), {
+            'queryset': Class.objects.all(),
+            'serialization_spec': ['name', {'teacher': teacher_spec}],
+        })
+
+    def retrieve(self, view, queries):
+        with self.assertNumQueries(queries):
+            response = view.as_view()(APIRequestFactory().get('/'), pk=str(self.math_class.id))
+        return response.data
+
+    def test_plugins_stay_in_root_query(self):
+        view = self.get_view([
+            'name',
+            {'num_classes': CountOf('class')},
+            {'has_classes': Exists('class', use_subquery=False)},
+            {'label': MethodCall('__str__', ['name'])},
+            {'school': [
+                'name',
+                {'num_teachers': CountOf('teacher', use_subquery=False)},
+            ]},
+        ])
+
+        self.assertJsonEqual(self.retrieve(view, 1), {
+            'name': 'Math B',
+            'teacher': {
+                'name': 'Mr Cat',
+                'num_classes': 2,
+                'has_classes': True,
+                'label': str(self.teacher),
+                'school': {'name': 'Kitteh High', 'num_teachers': 2},
+            },
+        })
+
+    def test_values_are_moved_to_joined_instances(self):
+        spec = ['name', {'teacher': ['name', {'num_classes': CountOf('class')}]}]
+        instance = compile_spec(Class, spec, use_select_related=True).apply(Class.objects.all()).get(id=self.math_class.id)
+
+        self.assertEqual(instance.teacher.class_count, 2)
+        self.assertFalse(hasattr(instance, 'teacher__class_count'))
+
+    def test_unjoinable_plugin_is_prefetched(self):
+        view = self.get_view(['name', {'num_classes': AnnotatedClassCount()}])
+
+        self.assertJsonEqual(self.retrieve(view, 2), {
+            'name': 'Math B',
+            'teacher': {'name': 'Mr Cat', 'num_classes': 2},
+        })
+
+    def test_required_fields_are_loaded_on_joined_path(self):
+        view = self.get_view([{'label': MethodCall('__str__', ['name'])}])
+
+        self.assertJsonEqual(self.retrieve(view, 1), {
+            'name': 'Math B',
+            'teacher': {'label': str(self.teacher)},
+        })
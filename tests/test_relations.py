@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from serialization_spec.relations import get_model_index, model_indexes
+from serialization_spec.serialization import compile_spec
+from .models import Assignment, AssignmentStudent, Class, School, Student, Teacher
+
+
+class ModelIndexTestCase(SimpleTestCase):
+
+    def test_built_when_app_is_ready(self):
+        for model in [School, Teacher, Class, Student, Assignment, AssignmentStudent]:
+            self.assertIn(model, model_indexes)
+
+    def test_fields(self):
+        index = get_model_index(Class)
+
+        self.assertEqual(index.fields, {'pk', 'id', 'created', 'modified', 'name', 'subject', 'teacher'})
+        self.assertEqual(list(index.to_many), ['assignment_set', 'student_set'])
+
+    def test_forward_foreign_key(self):
+        relation = get_model_index(Class).relations['teacher']
+
+        self.assertIs(relation.related_model, Teacher)
+        self.assertFalse(relation.reverse)
+        self.assertEqual((relation.query_name, relation.remote_name, relation.reverse_fk), ('teacher', 'class', None))
+
+    def test_reverse_foreign_key(self):
+        relation = get_model_index(Teacher).relations['class_set']
+
+        self.assertIs(relation.related_model, Class)
+        self.assertTrue(relation.to_many)
+        self.assertIsNone(relation.through_model)
+        self.assertEqual((relation.query_name, relation.remote_name, relation.reverse_fk), ('class', 'teacher', 'teacher'))
+
+    def test_many_to_many(self):
+        forward = get_model_index(Student).relations['assignments']
+        reverse = get_model_index(Assignment).relations['assignees']
+
+        self.assertIs(forward.through_model, AssignmentStudent)
+        self.assertIs(reverse.through_model, AssignmentStudent)
+        self.assertEqual((forward.query_name, forward.remote_name, forward.reverse_fk), ('assignments', 'assignees', None))
+        self.assertEqual((reverse.query_name, reverse.remote_name, reverse.reverse_fk), ('assignees', 'assignments', None))
+
+    def test_planning_does_not_inspect_models(self):
+        spec = ['name', {'class_set': ['name', 'student_set', {'subject': ['name']}]}, {'school': ['name']}]
+
+        with mock.patch('rest_framework.utils.model_meta.get_field_info') as get_field_info:
+            compile_spec(Teacher, spec)
+
+        get_field_info.assert_not_called()
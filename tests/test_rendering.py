@@ -0,0 +1,186 @@
+from decimal import Decimal
+import datetime
+
+from django.db import connection
+from django.db.models.query import Q
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import generics
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from serialization_spec.plugins import CountOf, Exists, MethodCall
+from serialization_spec.rendering import EncodedSerializer, RawJSON, SpecJSONRenderer, get_fast_format
+from serialization_spec.serialization import SerializationSpecMixin, SerializationSpecPlugin, Filtered, Aliased
+from serialization_spec.streaming import StreamingSerializationSpecMixin
+from .test_api import SerializationSpecTestCase, uuid
+from .models import Teacher, Assignment, Fee, Student
+from . import views
+
+
+def encoded(view_class):
+    return type('Encoded%s' % view_class.__name__, (view_class,), {'renderer_classes': [SpecJSONRenderer]})
+
+
+class Label(SerializationSpecPlugin):
+    serialization_spec = ['name']
+
+    def get_value(self, instance):
+        return {'name': instance.name, 'line break': [Decimal('1.50'), datetime.date(2020, 1, 2), (1, None)]}
+
+
+class EncodeValueTestCase(SimpleTestCase):
+
+    def test_matches_json_renderer(self):
+        data = {
+            'text': 'caf\xe9 "quoted" \\ \n  ',
+            'numbers': [0, -1, 2 ** 70, 1.5, 1e100, Decimal('3.14')],
+            'flags': [True, False, None],
+            'uuid': uuid('1'),
+            'dates': [datetime.datetime(2020, 1, 2, 3, 4, 5, 6), datetime.date(2020, 1, 2), datetime.time(3, 4)],
+            'aware': datetime.datetime(2020, 1, 2, tzinfo=datetime.timezone.utc),
+            'nested': {'tuple': (1, 2), 1: 'int key'},
+        }
+
+        self.assertEqual(SpecJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_rejects_nan(self):
+        with self.assertRaises(ValueError):
+            SpecJSONRenderer().render({'value': float('nan')})
+
+    def test_falls_back_for_indent(self):
+        data = {'raw': RawJSON('{"a":[1,2]}')}
+
+        self.assertEqual(
+            SpecJSONRenderer().render(data, renderer_context={'indent': 2}),
+            JSONRenderer().render({'raw': {'a': [1, 2]}}, renderer_context={'indent': 2}),
+        )
+
+
+class RenderingParityTestCase(SerializationSpecTestCase):
+
+    def render(self, view_class, **kwargs):
+        response = view_class.as_view()(APIRequestFactory().get('/'), **kwargs)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertParity(self, view_class, **kwargs):
+        with CaptureQueriesContext(connection) as capture:
+            expected = self.render(view_class, **kwargs).content
+        with self.assertNumQueries(len(capture.captured_queries)):
+            response = self.render(encoded(view_class), **kwargs)
+        self.assertEqual(expected, response.content)
+        return response
+
+    def test_detail_views(self):
+        for view_class, obj in [
+            (views.TeacherDetailView, self.teacher),
+            (views.StudentDetailView, self.student),
+            (views.ClassDetailView, self.math_class),
+            (views.SubjectDetailView, self.math),
+            (views.SchoolDetailView, self.school),
+            (views.StudentWithAssignmentsDetailView, self.student),
+            (views.AssignmentDetailView, self.assignment),
+            (views.StudentWithClassesAndAssignmentsDetailView, self.student),
+        ]:
+            with self.subTest(view=view_class.__name__):
+                response = self.assertParity(view_class, id=str(obj.id))
+                self.assertIsInstance(response.data, RawJSON)
+
+    def test_paginated_list_view(self):
+        response = self.assertParity(views.TeacherListView)
+
+        self.assertIsInstance(response.data['results'], RawJSON)
+
+    def test_plugins_filters_and_aliases(self):
+        class TeacherView(SerializationSpecMixin, generics.RetrieveAPIView):
+            queryset = Teacher.objects.all()
+            serialization_spec = [
+                'id',
+                'created',
+                'modified',
+                'school',
+                {'title': Aliased('name')},
+                {'num_classes': CountOf('class')},
+                {'has_classes': Exists('class')},
+                {'label': MethodCall('__str__', ['name'])},
+                {'details': Label()},
+                {'school': [
+                    'name',
+                    {'teacher_set': Filtered(Q(name__icontains='cat'), [
+                        'name'
+                    ])},
+                ]},
+            ]
+
+        self.assertParity(TeacherView, pk=str(self.teacher.id))
+
+    @override_settings(USE_TZ=True, TIME_ZONE='Europe/London')
+    def test_aware_datetimes(self):
+        class TeacherView(SerializationSpecMixin, generics.RetrieveAPIView):
+            queryset = Teacher.objects.all()
+            serialization_spec = ['created', {'class_set': ['modified']}]
+
+        self.assertParity(TeacherView, pk=str(self.teacher.id))
+
+    def test_decimals(self):
+        Fee.objects.create(name='Trip', amount=Decimal('12.5'))
+        Fee.objects.create(name='Lunch', amount=Decimal('3'))
+
+        class FeeListView(SerializationSpecMixin, generics.ListAPIView):
+            queryset = Fee.objects.order_by('name')
+            pagination_class = None
+            serialization_spec = ['name', 'amount']
+
+        self.assertParity(FeeListView)
+        self.assertIsNotNone(get_fast_format(FeeListView().get_serializer_class()().fields['amount']))
+        with override_settings(REST_FRAMEWORK={'COERCE_DECIMAL_TO_STRING': False}):
+            self.assertParity(FeeListView)
+
+    def test_list_of_nullable_results(self):
+        class AssignmentListView(SerializationSpecMixin, generics.ListAPIView):
+            queryset = Assignment.objects.order_by('name')
+            serialization_spec = [
+                'name',
+                {'clasz': [
+                    'name',
+                    {'teacher': ['name']},
+                ]},
+            ]
+
+        self.assertParity(AssignmentListView)
+
+    def test_compiled_serializer_is_not_used(self):
+        view_class = type('CompiledTeacherListView', (views.TeacherListView,), {
+            'use_compiled_serializer': True, 'pagination_class': None,
+        })
+        view = view_class()
+        view.setup(APIRequestFactory().get('/'))
+        view.request = view.initialize_request(view.request)
+        view.request.accepted_renderer, view.request.accepted_media_type = SpecJSONRenderer(), 'application/json'
+        view.format_kwarg = None
+
+        serializer = view.get_serializer(view.get_queryset(), many=True)
+
+        self.assertIsInstance(serializer, EncodedSerializer)
+        self.assertEqual(
+            SpecJSONRenderer().render(serializer.data),
+            self.render(views.TeacherListView).content[len(b'{"count":3,"next":null,"previous":null,"results":'):-1],
+        )
+
+
+class StudentStreamView(StreamingSerializationSpecMixin, generics.ListAPIView):
+    queryset = Student.objects.order_by('name')
+    stream_chunk_size = 3
+    serialization_spec = ['id', 'name', 'created', {'classes': ['name']}]
+
+
+class StreamingRenderingTestCase(SerializationSpecTestCase):
+
+    def test_streams_encoded_output(self):
+        expected = StudentStreamView.as_view()(APIRequestFactory().get('/'))
+        view_class = type('EncodedStudentStreamView', (StudentStreamView,), {'stream_renderer_class': SpecJSONRenderer})
+        response = view_class.as_view()(APIRequestFactory().get('/'))
+
+        self.assertEqual(b''.join(response.streaming_content), b''.join(expected.streaming_content))
@@ -0,0 +1,158 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from serialization_spec.plugins import CountOf
+from serialization_spec.response_cache import (
+    CachedSerializationSpecMixin, DjangoResponseCache, LocalResponseCache, SpecDependencies,
+)
+from serialization_spec.serialization import SerializationSpecPlugin, compile_spec
+from .test_api import SerializationSpecTestCase, uuid
+from .models import Teacher, School, Class, Student, Subject, AssignmentStudent
+from . import views
+
+
+class CachedClassDetailView(CachedSerializationSpecMixin, views.ClassDetailView):
+    response_cache = LocalResponseCache()
+
+
+class CachedStudentDetailView(CachedSerializationSpecMixin, views.StudentWithClassesAndAssignmentsDetailView):
+    response_cache = LocalResponseCache()
+
+
+class StaffOnlyClassDetailView(CachedClassDetailView):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return queryset if self.request.user.is_staff else queryset.none()
+
+
+class Viewer(SerializationSpecPlugin):
+    def get_value(self, instance):
+        return self.request_user.username
+
+
+class ClassViewerDetailView(CachedClassDetailView):
+    response_cache = LocalResponseCache()
+    serialization_spec = ['name', {'teacher': ['name', {'viewer': Viewer()}]}]
+
+
+class ResponseCacheTestCase(SerializationSpecTestCase):
+
+    def get(self, view_class, instance, user=None):
+        request = APIRequestFactory().get('/')
+        if user is not None:
+            force_authenticate(request, user=user)
+        response = view_class.as_view()(request, id=str(instance.id))
+        return response.status_code, response.data
+
+    def test_dependencies(self):
+        compiled = compile_spec(Class, views.ClassDetailView.serialization_spec + [
+            {'num_assignments': CountOf('assignment')},
+        ])
+        dependencies = SpecDependencies(compiled.model, compiled.serialization_spec)
+
+        self.assertEqual(dependencies.lookups, [
+            ('teacher', Teacher),
+            ('teacher__school', School),
+            ('student', Student),
+            ('assignment', dependencies.lookups[3][1]),
+        ])
+        self.assertEqual(dependencies.models[:4], [Class, Teacher, School, Student.classes.through])
+
+    def test_second_request_is_cached(self):
+        with self.assertNumQueries(3):
+            first = self.get(CachedClassDetailView, self.math_class)
+        with self.assertNumQueries(1):
+            second = self.get(CachedClassDetailView, self.math_class)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, self.get(views.ClassDetailView, self.math_class))
+
+    def test_save_invalidates(self):
+        self.get(CachedClassDetailView, self.math_class)
+        self.teacher.name = 'Dr Cat'
+        self.teacher.save()
+
+        with self.assertNumQueries(3):
+            status, data = self.get(CachedClassDetailView, self.math_class)
+        self.assertEqual(data['teacher']['name'], 'Dr Cat')
+
+    def test_delete_and_many_to_many_changes_invalidate(self):
+        self.get(CachedClassDetailView, self.math_class)
+        new_student = Student.objects.create(name='New Student', school=self.school)
+        new_student.classes.add(self.math_class)
+        self.assertIn({'name': 'New Student'}, self.get(CachedClassDetailView, self.math_class)[1]['student_set'])
+
+        new_student.delete()
+        self.assertNotIn({'name': 'New Student'}, self.get(CachedClassDetailView, self.math_class)[1]['student_set'])
+
+    def test_custom_through_model(self):
+        self.get(CachedStudentDetailView, self.student)
+        AssignmentStudent.objects.filter(student=self.student).delete()
+
+        self.assertEqual(self.get(CachedStudentDetailView, self.student)[1]['assignments'], [])
+
+    def test_updates_without_signals_change_version(self):
+        self.get(CachedClassDetailView, self.math_class)
+        Teacher.objects.filter(id=self.teacher.id).update(name='Dr Cat', modified=timezone.now())
+
+        self.assertEqual(self.get(CachedClassDetailView, self.math_class)[1]['teacher']['name'], 'Dr Cat')
+
+    def test_unrelated_changes_keep_cache(self):
+        self.get(CachedClassDetailView, self.math_class)
+        Subject.objects.create(name='Art')
+
+        with self.assertNumQueries(1):
+            self.get(CachedClassDetailView, self.math_class)
+
+    def test_missing_object(self):
+        status, data = self.get(CachedClassDetailView, Class(id=uuid('99')))
+
+        self.assertEqual(status, 404)
+
+    def test_rows_left_out_by_get_queryset_are_not_found(self):
+        alice = User.objects.create(username='alice', is_staff=True)
+        bob = User.objects.create(username='bob')
+
+        self.assertEqual(self.get(StaffOnlyClassDetailView, self.math_class, alice)[0], 200)
+        self.assertEqual(self.get(StaffOnlyClassDetailView, self.math_class, bob), (404, {'detail': 'Not found.'}))
+
+    def test_cached_for_each_user(self):
+        alice = User.objects.create(username='alice')
+        bob = User.objects.create(username='bob')
+
+        self.assertEqual(self.get(ClassViewerDetailView, self.math_class, alice)[1]['teacher']['viewer'], 'alice')
+        self.assertEqual(self.get(ClassViewerDetailView, self.math_class, bob)[1]['teacher']['viewer'], 'bob')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(ClassViewerDetailView, self.math_class, alice)[1]['teacher']['viewer'], 'alice')
+
+    def test_shared_by_declared_variant(self):
+        view_class = type('SharedClassDetailView', (CachedClassDetailView,), {
+            'response_cache': LocalResponseCache(),
+            'get_serialization_spec_variant': lambda self: 'everyone',
+        })
+
+        alice = User.objects.create(username='alice')
+        bob = User.objects.create(username='bob')
+
+        first = self.get(view_class, self.math_class, alice)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(view_class, self.math_class, bob), first)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_django_cache_backend(self):
+        view_class = type('DjangoCachedClassDetailView', (CachedClassDetailView,), {'response_cache': DjangoResponseCache()})
+
+        first = self.get(view_class, self.math_class)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(view_class, self.math_class), first)
+
+        self.math_class.name = 'Maths B'
+        self.math_class.save()
+        self.assertEqual(self.get(view_class, self.math_class)[1]['name'], 'Maths B')
+
+    def test_url_routed_view(self):
+        url = reverse('class-detail', kwargs={'id': str(self.math_class.id)})
+        self.assertEqual(self.client.get(url).data, self.get(CachedClassDetailView, self.math_class)[1])
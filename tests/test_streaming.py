@@ -0,0 +1,72 @@
+import gc
+import json
+import weakref
+from django.db.models.signals import post_init
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory
+
+from serialization_spec.streaming import StreamingSerializationSpecMixin
+from .test_api import SerializationSpecTestCase, uuid
+from .models import Student
+
+
+class StudentStreamView(StreamingSerializationSpecMixin, generics.ListAPIView):
+    queryset = Student.objects.order_by('name')
+    stream_chunk_size = 3
+
+    serialization_spec = [
+        'id',
+        'name',
+        {'classes': [
+            'name',
+        ]},
+    ]
+
+
+class StreamingTestCase(SerializationSpecTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.live_instances = weakref.WeakSet()
+        post_init.connect(self.track_instance)
+
+    def tearDown(self):
+        post_init.disconnect(self.track_instance)
+        super().tearDown()
+
+    def track_instance(self, instance, **kwargs):
+        self.live_instances.add(instance)
+
+    def test_streams_json_array(self):
+        response = StudentStreamView.as_view()(APIRequestFactory().get('/'))
+        data = json.loads(b''.join(response.streaming_content))
+
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data[0], {
+            'id': uuid('10'),
+            'name': 'Student 0',
+            'classes': [{'name': 'French A'}],
+        })
+        self.assertEqual(data[5]['classes'], [{'name': 'French A'}, {'name': 'Math B'}])
+
+    def test_prefetches_per_chunk(self):
+        response = StudentStreamView.as_view()(APIRequestFactory().get('/'))
+
+        # the root query, then a prefetch for each of the 4 chunks
+        with self.assertNumQueries(5):
+            b''.join(response.streaming_content)
+
+    def test_releases_each_chunk(self):
+        response = StudentStreamView.as_view()(APIRequestFactory().get('/'))
+        max_live = 0
+        for _ in response.streaming_content:
+            gc.collect()
+            max_live = max(max_live, len(self.live_instances))
+
+        # at most one chunk of 3 students, with 2 classes each
+        self.assertLessEqual(max_live, 9)
+
+    def test_empty(self):
+        Student.objects.all().delete()
+        response = StudentStreamView.as_view()(APIRequestFactory().get('/'))
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
@@ -0,0 +1,78 @@
+from typing import List
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from serialization_spec.timing import StageTimer
+from .test_api import SerializationSpecTestCase
+from . import views
+
+recorded = []  # type: List[dict]
+
+
+def record(timings):
+    recorded.append(timings)
+
+
+class TimedClassDetailView(views.ClassDetailView):
+    record_timings = True
+
+
+class TimedTeacherListView(views.TeacherListView):
+    record_timings = True
+
+
+def get_stages(response):
+    return [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+
+
+class StageTimerTestCase(SimpleTestCase):
+
+    def test_nested_stages_are_exclusive(self):
+        timer = StageTimer()
+        with timer.stage('outer'):
+            with timer.stage('inner'):
+                sum(range(100000))
+
+        self.assertGreater(timer.stages['inner'], timer.stages['outer'])
+        self.assertRegex(timer.server_timing(), r'^inner;dur=\d+\.\d{3}, outer;dur=\d+\.\d{3}$')
+
+
+class TimingsTestCase(SerializationSpecTestCase):
+
+    def setUp(self):
+        super().setUp()
+        recorded.clear()
+
+    def test_detail_server_timing(self):
+        response = TimedClassDetailView.as_view()(APIRequestFactory().get('/'), id=str(self.math_class.id))
+
+        self.assertEqual(get_stages(response), ['plan', 'fetch', 'prefetch.student_set', 'serialize', 'render'])
+        self.assertEqual(len(response.data['student_set']), 7)
+
+    def test_list_server_timing(self):
+        response = TimedTeacherListView.as_view()(APIRequestFactory().get('/'))
+
+        self.assertEqual(get_stages(response), ['plan', 'fetch', 'prefetch.school', 'prefetch.class_set', 'serialize', 'render'])
+
+    def test_timed_response_is_unchanged(self):
+        timed = TimedTeacherListView.as_view()(APIRequestFactory().get('/'))
+        untimed = views.TeacherListView.as_view()(APIRequestFactory().get('/'))
+        untimed.render()
+
+        self.assertEqual(timed.content, untimed.content)
+        self.assertNotIn('Server-Timing', untimed)
+
+    def test_prefetches_do_not_add_queries(self):
+        with self.assertNumQueries(2):
+            TimedClassDetailView.as_view()(APIRequestFactory().get('/'), id=str(self.math_class.id))
+
+    @override_settings(SERIALIZATION_SPEC_TIMINGS_HOOK='tests.test_timing.record')
+    def test_hook_receives_record(self):
+        TimedClassDetailView.as_view()(APIRequestFactory().get('/classes/'), id=str(self.math_class.id))
+
+        [timings] = recorded
+        self.assertEqual(timings['view'], 'tests.test_timing.TimedClassDetailView')
+        self.assertEqual(timings['method'], 'GET')
+        self.assertEqual(timings['path'], '/classes/')
+        self.assertEqual(timings['status'], 200)
+        self.assertEqual(list(timings['stages']), ['plan', 'fetch', 'prefetch.student_set', 'serialize', 'render'])
@@ -0,0 +1,121 @@
+from decimal import Decimal
+import json
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.query import Q
+from django.db.models.signals import post_init
+from django.test import override_settings
+from rest_framework import generics
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from serialization_spec.plugins import CountOf, Exists
+from serialization_spec.serialization import SerializationSpecMixin, Filtered, Aliased
+from serialization_spec.values import ValuesSerializationSpecMixin, fetch_values
+from .test_api import SerializationSpecTestCase, uuid
+from .models import Teacher, Student, Class, Fee
+from . import views
+
+
+def with_values(view_class):
+    return type('Values%s' % view_class.__name__, (ValuesSerializationSpecMixin, view_class), {})
+
+
+class ValuesTestCase(SerializationSpecTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.instances_created = 0
+        post_init.connect(self.count_instance)
+
+    def tearDown(self):
+        post_init.disconnect(self.count_instance)
+        super().tearDown()
+
+    def count_instance(self, **kwargs):
+        self.instances_created += 1
+
+    def render(self, view_class, **kwargs):
+        response = view_class.as_view()(APIRequestFactory().get('/'), **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(JSONRenderer().render(response.data))
+
+    def assertSameAsPrefetched(self, view_class, **kwargs):
+        expected = self.render(view_class, **kwargs)
+        self.instances_created = 0
+        actual = self.render(with_values(view_class), **kwargs)
+        self.assertEqual(expected, actual)
+        self.assertEqual(self.instances_created, 0)
+
+    def test_detail_views(self):
+        for view_class, obj in [
+            (views.TeacherDetailView, self.teacher),
+            (views.StudentDetailView, self.student),
+            (views.ClassDetailView, self.math_class),
+            (views.SubjectDetailView, self.math),
+            (views.SchoolDetailView, self.school),
+            (views.StudentWithAssignmentsDetailView, self.student),
+            (views.StudentWithClassesAndAssignmentsDetailView, self.student),
+        ]:
+            with self.subTest(view=view_class.__name__):
+                self.assertSameAsPrefetched(view_class, id=str(obj.id))
+
+    def test_list_view(self):
+        self.assertSameAsPrefetched(views.TeacherListView)
+
+    def test_filters_aliases_and_annotations(self):
+        class ClassListView(SerializationSpecMixin, generics.ListAPIView):
+            queryset = Class.objects.order_by('name')
+            serialization_spec = [
+                'id',
+                {'title': Aliased('name')},
+                {'num_students': CountOf('student')},
+                {'has_assignments': Exists('assignment')},
+                'student_set',
+                {'teacher': [
+                    'name',
+                    {'school': ['name']},
+                ]},
+                {'students': Filtered('student_set', Q(name__in=['Student 3', 'Student 9']), [
+                    'name',
+                ])},
+            ]
+
+        self.assertSameAsPrefetched(ClassListView)
+
+    def test_fields_are_represented_as_serialized(self):
+        Fee.objects.create(name='Trip', amount=Decimal('12.50'))
+
+        class FeeListView(SerializationSpecMixin, generics.ListAPIView):
+            queryset = Fee.objects.order_by('name')
+            serialization_spec = ['id', 'name', 'amount', 'created']
+
+        for settings in [{'USE_TZ': True, 'TIME_ZONE': 'Asia/Tokyo'}, {'REST_FRAMEWORK': {'COERCE_DECIMAL_TO_STRING': False}}]:
+            with self.subTest(settings=settings), override_settings(**settings):
+                self.assertSameAsPrefetched(FeeListView)
+
+        self.assertEqual(fetch_values(Fee.objects.all(), ['amount']), [{'amount': '12.50'}])
+
+    def test_queries_per_level(self):
+        with self.assertNumQueries(3):
+            data = fetch_values(Teacher.objects.order_by('name'), [
+                'name',
+                {'school': ['name']},
+                {'class_set': [
+                    'name',
+                    'student_set',
+                ]},
+            ])
+
+        self.assertEqual(data[0], {
+            'name': 'Mr Cat',
+            'school': {'name': 'Kitteh High'},
+            'class_set': [
+                {'name': 'French A', 'student_set': [uuid('1%d' % idx) for idx in range(7)]},
+                {'name': 'Math B', 'student_set': [uuid('1%d' % idx) for idx in range(3, 10)]},
+            ],
+        })
+        self.assertEqual(data[1], {'name': 'Ms Dog', 'school': {'name': 'Kitteh High'}, 'class_set': []})
+
+    def test_instance_plugins_are_not_supported(self):
+        with self.assertRaises(ImproperlyConfigured):
+            fetch_values(Student.objects.all(), [{'assignment_name': views.ClassName()}])
@@ -166,7 +166,8 @@ class PluginsTestCase(SerializationSpecTestCase):
             {'school_name_upper': SchoolNameUpper()},
         ]
 
-        with self.assertNumQueries(2):
+        # the plugins need no queries of their own, so the school and its LEA are joined
+        with self.assertNumQueries(1):
             response = self.detail_view.retrieve(self.request)
 
         self.assertJsonEqual(response.data, {